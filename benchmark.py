@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""离线基准测试脚本
+
+核心: 用 utils/synthetic.py 按指定规模生成合成数据集, 逐个工具执行典型命令, 汇总耗时、吞吐 (images/s, boxes/s) 与峰值内存
+扩展: --repeat 多次取最快; --cases 只跑部分用例; --json 保存结果; --baseline 与历史结果对比, 超出 --tolerance 即判为回退 (退出状态 1)
+默认: 每个用例在独立的子进程 (spawn) 中执行, 模块与第三方库导入不计入耗时, 峰值内存为该子进程的 ru_maxrss;
+      工具输出 (含 logs/) 写入工作目录, 结束后删除工作目录 (--keep 保留); 无需联网
+使用示例:
+    python benchmark.py --images 5000 --json bench/before.json
+    python benchmark.py --images 5000 --baseline bench/before.json --json bench/after.json
+    python benchmark.py --cases analyze split yolo2coco --repeat 3
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, span
+
+# 结果文件格式版本
+BENCH_VERSION = 1
+# 耗时差小于该值 (秒) 时不判为回退, 避免极短用例的计时噪声
+_MIN_DELTA_SECONDS = 0.05
+# 预先导入的第三方库 (不计入用例耗时)
+_WARM_IMPORTS = ('numpy', 'cv2', 'tqdm', 'prettytable', 'yaml', 'pandas')
+
+
+
+def _pipeline_argv(src: str, out: str) -> list[str]:
+    """在用例运行目录写出完整准备流程的流水线配置 (与 README 推荐工作流相同的阶段)."""
+    spec = os.path.join(os.path.dirname(out), 'pipeline.yaml')
+    stages = [
+        {'analyze': {'stats': True, 'validate': True}},
+        {'classes': {'min_samples': 1}},
+        {'split': {'ratios': [0.8, 0.1, 0.1], 'stratify': True}},
+        {'write': {'output': os.path.join(out, 'yolo'), 'format': 1}},
+        {'yolo2coco': {}},
+        {'coco-split': {'ratios': [0.8, 0.1, 0.1], 'output': os.path.join(out, 'coco')}},
+        {'coco-analyze': {'stats': True}},
+    ]
+    with open(spec, 'w', encoding='utf-8') as f:
+        json.dump({'input': src, 'stages': stages}, f, ensure_ascii=False)
+    return ['-c', spec]
+
+
+# 用例 -> (输入数据格式, medds 子命令, 参数生成函数(输入目录, 输出目录), 说明); 按此顺序执行
+CASES = {
+    'analyze': ('format1', 'analyze',
+                lambda src, out: ['--dataset_dir', src, '--stats', '--geometry', '--no-cache',
+                                  '--cache-dir', os.path.join(out, 'cache')],
+                '统计 + 几何分析'),
+    'analyze-check': ('format1', 'analyze',
+                      lambda src, out: ['--dataset_dir', src, '--validate', '--check-images', '--no-cache',
+                                        '--cache-dir', os.path.join(out, 'cache')],
+                      '标签校验 + 图片完整性'),
+    'split': ('standard', 'split',
+              lambda src, out: ['--input_dir', src, '--output_dir', out, '--stratify'],
+              '分层划分'),
+    'split-group': ('standard', 'split',
+                    lambda src, out: ['--input_dir', src, '--output_dir', out, '--group-regex', r'^(case\d+)_'],
+                    '按 case 分组划分'),
+    'split-hash': ('standard', 'split',
+                   lambda src, out: ['--input_dir', src, '--output_dir', out, '--hash-split'],
+                   '哈希流式划分'),
+    'classes': ('standard', 'classes',
+                lambda src, out: ['--dataset_dir', src, 'info'],
+                '类别统计'),
+    'convert': ('format1', 'convert',
+                lambda src, out: ['-d', src, '-o', out, '--to', '2'],
+                'format1 -> format2 (复制)'),
+    'yolo2coco': ('format1', 'yolo2coco',
+                  lambda src, out: ['-d', src, '-o', out],
+                  'YOLO -> COCO'),
+    'coco-analyze': ('coco', 'coco-analyze',
+                     lambda src, out: ['--dataset_dir', src, '--stats', '--geometry'],
+                     'COCO 统计 + 几何分析'),
+    'coco-split': ('coco', 'coco-split',
+                   lambda src, out: ['-i', src, '-o', out],
+                   'COCO 划分'),
+    'voc2yolo': ('voc', 'voc2yolo',
+                 lambda src, out: ['-i', src, '-o', out],
+                 'VOC -> YOLO'),
+    'voc2coco': ('voc', 'voc2coco',
+                 lambda src, out: ['-i', src, '-o', out],
+                 'VOC -> COCO'),
+    'mha2yolo': ('mha', 'mha2yolo',
+                 lambda src, out: ['--input_dir', src, '--output_dir', out,
+                                   '--metadata_file', os.path.join(src, 'metadata.csv')],
+                 'MHA -> YOLO (需要 SimpleITK)'),
+    'view-export': ('standard', 'view',
+                    lambda src, out: ['-d', src, '--export', out],
+                    '拼图导出'),
+    'pipeline': ('standard', 'pipeline', _pipeline_argv,
+                 '流水线: 分析 -> 类别 -> 分层划分 -> 写出 -> COCO -> COCO 划分 -> 分析'),
+}
+# 需要可选依赖的用例 -> 依赖模块名; 未安装时跳过
+_OPTIONAL_DEPS = {'mha2yolo': 'SimpleITK'}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="在合成数据集上对各工具做离线基准测试 (耗时 / 吞吐 / 峰值内存), 可与历史结果对比",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    p.add_argument("--cases", nargs="+", default=None, choices=list(CASES), help="只运行这些用例 (默认全部)")
+    p.add_argument("--images", type=int, default=2000, help="合成数据集图片数")
+    p.add_argument("--boxes", type=float, default=3.0, help="每张有标注图片的平均框数")
+    p.add_argument("--classes", type=int, default=10, help="类别数")
+    p.add_argument("--image-size", type=int, default=64, help="占位图边长 (像素)")
+    p.add_argument("--seed", type=int, default=0, help="合成数据随机种子")
+    p.add_argument("--repeat", type=int, default=1, help="每个用例执行次数, 取最快一次 (同时记录中位数)")
+    p.add_argument("--work-dir", default=None,
+                   help="工作目录 (合成数据与工具输出); 默认临时目录. 目录中已有相同参数生成的数据时直接复用")
+    p.add_argument("--keep", action="store_true", help="结束后保留工作目录 (默认删除临时工作目录)")
+    p.add_argument("--json", default=None, metavar="OUT", help="把结果写入该 JSON 文件")
+    p.add_argument("--baseline", default=None, metavar="JSON", help="与该结果文件 (--json 输出) 对比")
+    p.add_argument("--tolerance", type=float, default=0.25,
+                   help="耗时或峰值内存超过基线的比例上限, 超出即判为回退")
+    p.add_argument("--verbose", action="store_true", help="显示各工具自身的输出 (默认静默)")
+    add_profile_args(p)
+    return p.parse_args(argv)
+
+
+def data_params(args: argparse.Namespace) -> dict:
+    """决定合成数据内容的参数; 与基线不一致时结果不可直接比较."""
+    return {'images': args.images, 'boxes': args.boxes, 'classes': args.classes,
+            'image_size': args.image_size, 'seed': args.seed}
+
+
+def prepare_data(data_root: Path, formats: list[str], params: dict) -> dict:
+    """生成 (或复用) 所需格式的合成数据集, 返回 {格式: 目录} 及标注统计."""
+    from utils.synthetic import generate, plan_dataset
+
+    params_file = data_root / 'params.json'
+    reuse = False
+    if params_file.exists():
+        try:
+            reuse = json.loads(params_file.read_text(encoding='utf-8')) == params
+        except (OSError, ValueError):
+            reuse = False
+    if not reuse and data_root.exists():
+        shutil.rmtree(data_root)
+    data_root.mkdir(parents=True, exist_ok=True)
+
+    with span('plan'):
+        plan = plan_dataset(params['images'], params['boxes'], params['classes'], seed=params['seed'])
+    paths = {}
+    for fmt in formats:
+        out_dir = data_root / fmt
+        if reuse and out_dir.exists():
+            log_info(f"复用已有合成数据: {out_dir}")
+        else:
+            log_info(f"生成合成数据 ({fmt}): {out_dir}")
+            if out_dir.exists():
+                shutil.rmtree(out_dir)
+            with span('generate'):
+                generate(out_dir, fmt, plan, params['image_size'], seed=params['seed'])
+        paths[fmt] = str(out_dir)
+    params_file.write_text(json.dumps(params), encoding='utf-8')
+    return {'paths': paths, 'images': len(plan.names), 'boxes': len(plan.classes)}
+
+
+def _case_worker(cmd: str, argv: list[str], cwd: str, verbose: bool, conn) -> None:
+    """子进程入口: 导入模块后计时执行 medds.run_stage, 通过管道回传结果."""
+    import importlib
+    import io
+    import time
+    import traceback
+
+    # 子进程以工作目录为 cwd (logs/ 写在那里), 仍需能导入本仓库的脚本
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(cwd)
+    # 非 verbose 时丢弃 stdout, stderr 留在内存中, 失败时取最后一行 (如 argparse 的参数错误)
+    stderr = None
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+        sys.stderr = stderr = io.StringIO()
+    result = {'seconds': None, 'rss_mb': None, 'error': None}
+    try:
+        import medds
+        from utils.logging_utils import last_error
+        from utils.profiling import peak_rss_mb
+        for name in _WARM_IMPORTS:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+        importlib.import_module(medds.COMMANDS[cmd][0])
+        t0 = time.perf_counter()
+        code = medds.run_stage(cmd, argv)
+        result['seconds'] = time.perf_counter() - t0
+        result['rss_mb'] = peak_rss_mb().get('self')
+        if code != 0:
+            tail = stderr.getvalue().strip().splitlines()[-1:] if stderr is not None else []
+            reason = last_error() or (tail[0] if tail else None)
+            result['error'] = f"退出状态 {code}" + (f": {reason}" if reason else "")
+    except BaseException:
+        result['error'] = traceback.format_exc().strip().splitlines()[-1]
+    conn.send(result)
+    conn.close()
+
+
+def run_case(name: str, src: str, case_dir: Path, repeat: int, verbose: bool) -> dict:
+    """在独立子进程中执行用例 repeat 次; 每次使用全新的输出目录."""
+    import multiprocessing
+
+    _, cmd, make_argv, _ = CASES[name]
+    ctx = multiprocessing.get_context('spawn')
+    seconds, rss = [], []
+    for i in range(repeat):
+        run_dir = case_dir / str(i)
+        if run_dir.exists():
+            shutil.rmtree(run_dir)
+        run_dir.mkdir(parents=True)
+        out_dir = run_dir / 'out'
+        recv, send = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_case_worker,
+                           args=(cmd, make_argv(src, str(out_dir)), str(run_dir), verbose, send))
+        proc.start()
+        send.close()
+        try:
+            result = recv.recv()
+        except EOFError:
+            result = {'error': '子进程异常退出'}
+        proc.join()
+        shutil.rmtree(run_dir, ignore_errors=True)
+        if result.get('error'):
+            return {'error': result['error']}
+        seconds.append(result['seconds'])
+        if result.get('rss_mb') is not None:
+            rss.append(result['rss_mb'])
+    ordered = sorted(seconds)
+    return {'seconds': seconds, 'best': ordered[0], 'median': ordered[len(ordered) // 2],
+            'rss_mb': max(rss) if rss else None}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    """与基线逐用例对比, 返回 {用例: (说明, 是否回退)}."""
+    verdicts = {}
+    for name, res in results.items():
+        base = baseline.get('cases', {}).get(name)
+        if not base or res.get('error') or base.get('error'):
+            continue
+        ratio = res['best'] / base['best'] if base['best'] > 0 else 1.0
+        notes = [f"{(ratio - 1) * 100:+.0f}%"]
+        slower = ratio > 1 + tolerance and res['best'] - base['best'] > _MIN_DELTA_SECONDS
+        bigger = False
+        if res.get('rss_mb') and base.get('rss_mb'):
+            rss_ratio = res['rss_mb'] / base['rss_mb']
+            bigger = rss_ratio > 1 + tolerance
+            if bigger:
+                notes.append(f"内存 {(rss_ratio - 1) * 100:+.0f}%")
+        verdicts[name] = (' '.join(notes), slower or bigger)
+    return verdicts
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
+    from prettytable import PrettyTable
+
+    if args.images <= 0 or args.repeat <= 0:
+        log_error("--images 与 --repeat 须为正数")
+        return 1
+    names = list(CASES) if not args.cases else [c for c in CASES if c in args.cases]
+    skipped = []
+    for name in list(names):
+        dep = _OPTIONAL_DEPS.get(name)
+        if dep:
+            import importlib.util
+            if importlib.util.find_spec(dep) is None:
+                log_warn(f"未安装 {dep}, 跳过用例 {name}")
+                names.remove(name)
+                skipped.append(name)
+    if not names:
+        log_error("没有可运行的用例")
+        return 1
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            log_error(f"无法读取基线文件: {args.baseline}: {e}")
+            return 1
+        if baseline.get('params') != data_params(args):
+            log_warn(f"基线的数据参数 {baseline.get('params')} 与本次 {data_params(args)} 不一致, 对比仅供参考")
+
+    # 子进程会切换到各自的运行目录, 用例参数中的路径必须是绝对路径
+    work_root = Path(args.work_dir).resolve() if args.work_dir else Path(tempfile.mkdtemp(prefix='medds_bench_'))
+    remove_work = not args.keep and not args.work_dir
+    try:
+        formats = list(dict.fromkeys(CASES[name][0] for name in names))
+        data = prepare_data(work_root / 'data', formats, data_params(args))
+        log_info(f"合成数据: {data['images']} 张图片, {data['boxes']} 个框; 工作目录: {work_root}")
+
+        results = {}
+        for name in names:
+            fmt, cmd, _, desc = CASES[name]
+            log_info(f"运行用例 {name} ({desc}) x{args.repeat} ...")
+            with span(name):
+                results[name] = run_case(name, data['paths'][fmt], work_root / 'runs' / name,
+                                         args.repeat, args.verbose)
+            if results[name].get('error'):
+                log_error(f"用例 {name} 失败: {results[name]['error']}")
+    finally:
+        if remove_work:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    verdicts = compare(results, baseline, args.tolerance) if baseline else {}
+    table = PrettyTable()
+    table.field_names = ["用例", "命令", "最快(s)", "中位(s)", "图片/s", "框/s", "峰值内存(MB)"] + (
+        ["对比基线"] if baseline else [])
+    table.align["用例"] = "l"
+    for name, res in results.items():
+        if res.get('error'):
+            row = [name, CASES[name][1], "失败", "-", "-", "-", "-"]
+        else:
+            best = res['best']
+            row = [name, CASES[name][1], f"{best:.3f}", f"{res['median']:.3f}",
+                   f"{data['images'] / best:.0f}" if best > 0 else "-",
+                   f"{data['boxes'] / best:.0f}" if best > 0 else "-",
+                   f"{res['rss_mb']:.1f}" if res.get('rss_mb') is not None else "-"]
+        if baseline:
+            note, regressed = verdicts.get(name, ("-", False))
+            row.append(note + (" 回退" if regressed else ""))
+        table.add_row(row)
+    log_info(f"===== 基准测试结果 ({data['images']} 张图片, {data['boxes']} 个框, 重复 {args.repeat} 次) =====")
+    for line in table.get_string().splitlines():
+        log_info(line)
+    if skipped:
+        log_info(f"跳过的用例: {', '.join(skipped)}")
+
+    if args.json:
+        payload = {
+            'version': BENCH_VERSION,
+            'params': data_params(args),
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'images': data['images'],
+            'boxes': data['boxes'],
+            'cases': results,
+        }
+        out = Path(args.json)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+        log_info(f"结果已保存: {out}")
+
+    failed = [name for name, res in results.items() if res.get('error')]
+    regressed = [name for name, (_, bad) in verdicts.items() if bad]
+    if regressed:
+        log_error(f"相对基线出现回退 (容差 {args.tolerance:.0%}): {', '.join(regressed)}")
+    return 1 if failed or regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""COCO 数据集分析脚本
+
+核心: 流式读取 COCO JSON (不整体载入内存), 统计各分割图片/标注/类别数量与一致性问题
+扩展: --stats 类别分布表 (标注数 + 图片数), --geometry 按类别的像素级框尺寸分位数与 COCO 大/中/小目标占比
+默认: 并行检查 file_name 对应图片是否存在, 并统计目录中未被引用的图片
+支持结构: <d>/annotations.json, <d>/<split>/annotations.json, <d>/annotations/*.json, 或直接指定单个 .json 文件
+"""
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from utils.coco_stream import iter_coco_sections, CocoStreamError
+from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, span, count, count_file
+
+SPLIT_ORDER = ['train', 'val', 'test']
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+# 非检测任务的注释文件, 默认跳过
+SKIP_PREFIXES = ('captions_', 'person_keypoints_')
+# COCO 评估使用的面积划分: small < 32^2 <= medium < 96^2 <= large
+SIZE_BOUNDS = (32 ** 2, 96 ** 2)
+GEOMETRY_QS = (0.05, 0.5, 0.95)
+ANN_BATCH = 100_000
+STAT_CHUNK = 2048
+
+
+def _split_sort_key(name):
+    return (SPLIT_ORDER.index(name) if name in SPLIT_ORDER else len(SPLIT_ORDER), name)
+
+
+def _first_dir(candidates):
+    for c in candidates:
+        if c.is_dir():
+            return c
+    return None
+
+
+def find_coco_splits(dataset_dir):
+    """查找数据集中的 COCO 注释文件, 返回 [(分割名, json路径, 图片目录或None), ...]."""
+    root = Path(dataset_dir)
+    if root.is_file():
+        return [(root.stem, root, _first_dir([root.parent / 'images', root.parent]))]
+
+    found = {}
+    # 1) coco_dataset_split 输出: <d>/<split>/annotations.json + <d>/<split>/images/
+    for sub in sorted(p for p in root.iterdir() if p.is_dir()):
+        ann = sub / 'annotations.json'
+        if ann.is_file():
+            found[sub.name] = (ann, _first_dir([sub / 'images', sub]))
+    # 2) 标准 COCO / yolo2coco 多分割输出: <d>/annotations/<name>.json
+    ann_dir = root / 'annotations'
+    if ann_dir.is_dir():
+        for ann in sorted(ann_dir.glob('*.json')):
+            if ann.name.startswith(SKIP_PREFIXES):
+                log_info(f"跳过非检测注释文件: {ann.name}")
+                continue
+            split = ann.stem[len('instances_'):] if ann.stem.startswith('instances_') else ann.stem
+            # instances_train2017 -> 图片目录 train2017; yolo2coco 的 train.json -> train/images 或 images/train
+            short = split.rstrip('0123456789') or split
+            img_dir = _first_dir([root / split / 'images', root / short / 'images', root / 'images' / split,
+                                  root / 'images' / short, root / split, root / 'images'])
+            found.setdefault(split, (ann, img_dir))
+    # 3) 单一注释文件: <d>/annotations.json + <d>/images/
+    single = root / 'annotations.json'
+    if single.is_file() and not found:
+        found['all'] = (single, _first_dir([root / 'images', root]))
+
+    return [(name, ann, img) for name, (ann, img) in sorted(found.items(), key=lambda kv: _split_sort_key(kv[0]))]
+
+
+def _exists_chunk(task):
+    """线程池任务: 检查一批文件是否存在, 返回缺失的文件名."""
+    images_dir, names = task
+    return [n for n in names if not os.path.isfile(os.path.join(images_dir, n))]
+
+
+def _list_dir_images(images_dir):
+    names = set()
+    for dirpath, _dirs, files in os.walk(images_dir):
+        rel = os.path.relpath(dirpath, images_dir)
+        for f in files:
+            if os.path.splitext(f)[1].lower() in IMAGE_EXTS:
+                names.add(f if rel == '.' else os.path.join(rel, f).replace(os.sep, '/'))
+    return names
+
+
+def analyze_coco_file(ann_path, images_dir=None, check_files=True, geometry=False, workers=None):
+    """流式统计单个 COCO 注释文件, 返回统计 dict.
+
+    图片条目在解析的同时分批提交到线程池检查文件是否存在; 标注按批转为数组后统计,
+    不保留逐条标注. 不依赖 images 与 annotations 在文件中的先后顺序.
+    """
+    return analyze_coco_items(iter_coco_sections(ann_path), images_dir, check_files, geometry, workers)
+
+
+def iter_coco_dict(coco_data):
+    """以 iter_coco_sections 的形式 (顶层键, 元素) 遍历已载入内存的 COCO dict."""
+    for key in ('images', 'annotations', 'categories'):
+        for item in coco_data.get(key, []):
+            yield key, item
+
+
+def analyze_coco_items(items, images_dir=None, check_files=True, geometry=False, workers=None):
+    """统计 (顶层键, 元素) 序列 (来自 iter_coco_sections 或 iter_coco_dict), 返回统计 dict."""
+    import numpy as np
+    from utils.box_stats import ClassQuantileSketch
+    categories = {}
+    image_ids = []
+    referenced = set() if check_files and images_dir else None
+    seen_ids = set()
+    duplicate_image_ids = 0
+
+    ann_img, ann_cat, ann_w, ann_h = [], [], [], []
+    annotations = 0
+    invalid_bbox = 0
+    crowd = 0
+    pair_keys = []          # 每批 (image_id, category_id) 去重后的组合, 最后再整体去重
+    ann_image_ids = []      # 每批有标注的 image_id (去重)
+    cat_counts = {}
+    sketches = {m: ClassQuantileSketch(max_value=1e9) for m in ('width', 'height', 'area', 'aspect')} if geometry else None
+    # 草图与尺寸直方图按稠密行号存储, category_id 可能稀疏或很大 (如 2000000000)
+    cat_rows = {}
+    size_counts = np.zeros((0, 3), dtype=np.int64)
+
+    def flush_annotations():
+        nonlocal invalid_bbox, size_counts
+        if not ann_img:
+            return
+        img = np.array(ann_img, dtype=np.int64)
+        cat = np.array(ann_cat, dtype=np.int64)
+        w = np.array(ann_w, dtype=np.float64)
+        h = np.array(ann_h, dtype=np.float64)
+        ann_img.clear()
+        ann_cat.clear()
+        ann_w.clear()
+        ann_h.clear()
+
+        uniq_cat, cnt = np.unique(cat, return_counts=True)
+        for c, n in zip(uniq_cat.tolist(), cnt.tolist()):
+            cat_counts[c] = cat_counts.get(c, 0) + n
+        ann_image_ids.append(np.unique(img))
+        pair_keys.append(np.unique(np.stack([img, cat], axis=1), axis=0))
+
+        valid = np.isfinite(w) & np.isfinite(h) & (w > 0) & (h > 0)
+        invalid_bbox += int((~valid).sum())
+        valid &= cat >= 0
+        if sketches is not None and valid.any():
+            uniq, inverse = np.unique(cat[valid], return_inverse=True)
+            lookup = np.array([cat_rows.setdefault(c, len(cat_rows)) for c in uniq.tolist()], dtype=np.int64)
+            rows = lookup[inverse]
+            w, h = w[valid], h[valid]
+            area = w * h
+            for name, values in (('width', w), ('height', h), ('area', area), ('aspect', w / h)):
+                sketches[name].add(rows, values)
+            bucket = np.searchsorted(np.array(SIZE_BOUNDS, dtype=np.float64), area, side='right')
+            flat = np.bincount(rows * 3 + bucket, minlength=len(cat_rows) * 3).reshape(-1, 3)
+            size_counts = np.vstack([size_counts, np.zeros((len(cat_rows) - len(size_counts), 3), dtype=np.int64)])
+            size_counts += flat
+
+    pool = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) if referenced is not None else None
+    futures = []
+    pending_names = []
+    try:
+        for key, item in items:
+            if key == 'annotations':
+                annotations += 1
+                bbox = item.get('bbox')
+                if item.get('iscrowd'):
+                    crowd += 1
+                ann_img.append(item.get('image_id', -1))
+                ann_cat.append(item.get('category_id', -1))
+                if isinstance(bbox, (list, tuple)) and len(bbox) == 4:
+                    ann_w.append(bbox[2])
+                    ann_h.append(bbox[3])
+                else:
+                    ann_w.append(float('nan'))
+                    ann_h.append(float('nan'))
+                if len(ann_img) >= ANN_BATCH:
+                    flush_annotations()
+            elif key == 'images':
+                img_id = item.get('id')
+                if img_id in seen_ids:
+                    duplicate_image_ids += 1
+                seen_ids.add(img_id)
+                image_ids.append(img_id)
+                if referenced is not None:
+                    name = item.get('file_name', '')
+                    referenced.add(name)
+                    pending_names.append(name)
+                    if len(pending_names) >= STAT_CHUNK:
+                        futures.append(pool.submit(_exists_chunk, (str(images_dir), pending_names)))
+                        pending_names = []
+            elif key == 'categories':
+                categories[item.get('id')] = item.get('name', str(item.get('id')))
+        flush_annotations()
+        if referenced is not None and pending_names:
+            futures.append(pool.submit(_exists_chunk, (str(images_dir), pending_names)))
+        missing_files = [n for fu in futures for n in fu.result()]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    ids = np.array(image_ids, dtype=np.int64) if image_ids else np.zeros(0, dtype=np.int64)
+    annotated = np.unique(np.concatenate(ann_image_ids)) if ann_image_ids else np.zeros(0, dtype=np.int64)
+    orphan_ids = annotated[~np.isin(annotated, ids)]
+    pairs = np.unique(np.concatenate(pair_keys), axis=0) if pair_keys else np.zeros((0, 2), dtype=np.int64)
+    pairs = pairs[np.isin(pairs[:, 0], ids)]
+    cat_images = {}
+    if len(pairs):
+        uc, cnt = np.unique(pairs[:, 1], return_counts=True)
+        cat_images = dict(zip(uc.tolist(), cnt.tolist()))
+
+    labeled = int(np.isin(annotated, ids).sum())
+    stats = {
+        'images': len(image_ids),
+        'annotations': annotations,
+        'categories': categories,
+        'labeled': labeled,
+        'background': len(seen_ids) - labeled,
+        'cat_counts': cat_counts,
+        'cat_images': cat_images,
+        'duplicate_image_ids': duplicate_image_ids,
+        'orphan_annotation_images': int(len(orphan_ids)),
+        'unknown_categories': sorted(c for c in cat_counts if c not in categories),
+        'invalid_bbox': invalid_bbox,
+        'crowd': crowd,
+        'missing_files': None,
+        'unreferenced_files': None,
+    }
+    if referenced is not None:
+        stats['missing_files'] = missing_files
+        stats['unreferenced_files'] = sorted(_list_dir_images(images_dir) - referenced)
+    if sketches is not None:
+        stats['geometry'] = {
+            c: {
+                'count': sketches['width'].count(row),
+                **{m: sketches[m].quantiles(row, GEOMETRY_QS) for m in sketches},
+                'sizes': size_counts[row].tolist(),
+            }
+            for c, row in sorted(cat_rows.items()) if sketches['width'].count(row)
+        }
+    return stats
+
+
+def _fmt_check(value):
+    return '-' if value is None else len(value)
+
+
+def create_basic_stats_table(all_stats):
+    """创建各分割基本统计与一致性检查表格."""
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["数据集", "图片数", "标注数", "类别数", "有标注图片", "背景图片", "平均标注/图",
+                         "缺失图片文件", "未引用图片", "无效bbox", "孤立标注图片ID"]
+    for split_name, st in all_stats.items():
+        avg = st['annotations'] / st['labeled'] if st['labeled'] else 0
+        table.add_row([split_name, st['images'], st['annotations'], len(st['categories']), st['labeled'],
+                       st['background'], f"{avg:.2f}", _fmt_check(st['missing_files']),
+                       _fmt_check(st['unreferenced_files']), st['invalid_bbox'], st['orphan_annotation_images']])
+    print("")
+    log_info("COCO 数据集基本统计信息:")
+    print(str(table))
+
+
+def create_category_distribution_table(all_stats):
+    """创建类别分布表格: 每个分割的 标注数(百分比) / 图片数."""
+    from prettytable import PrettyTable
+    names = {}
+    for st in all_stats.values():
+        names.update(st['categories'])
+    cat_ids = sorted(set(names) | {c for st in all_stats.values() for c in st['cat_counts']},
+                     key=lambda c: (c is None, c))
+    if not cat_ids:
+        log_warn("没有找到任何类别")
+        return
+
+    table = PrettyTable()
+    table.field_names = ["类别ID", "类别名称"] + [f"{sp}(标注(百分比)/图片)" for sp in all_stats] + ["总标注(百分比)"]
+    totals = {sp: st['annotations'] for sp, st in all_stats.items()}
+    grand = sum(totals.values())
+    for cid in cat_ids:
+        row = [cid, names.get(cid, f"未定义_{cid}")]
+        cat_total = 0
+        for sp, st in all_stats.items():
+            n = st['cat_counts'].get(cid, 0)
+            pct = n / totals[sp] * 100 if totals[sp] else 0
+            row.append(f"{n}({pct:.1f}%)/{st['cat_images'].get(cid, 0)}")
+            cat_total += n
+        row.append(f"{cat_total}({cat_total / grand * 100 if grand else 0:.1f}%)")
+        table.add_row(row)
+    table.add_row(["", "总计"] + [f"{totals[sp]}(100.0%)/{st['labeled']}" for sp, st in all_stats.items()]
+                  + [f"{grand}(100.0%)"])
+    print("")
+    log_info("类别分布统计表:")
+    print(str(table))
+
+
+def create_geometry_table(all_stats):
+    """创建按分割/类别的像素级框尺寸分位数表与 COCO 大/中/小目标占比."""
+    import numpy as np
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["数据集", "类别", "框数", "宽 P5/P50/P95", "高 P5/P50/P95",
+                         "面积 P50", "宽高比 P5/P50/P95", "小/中/大(%)"]
+    any_row = False
+    for sp, st in all_stats.items():
+        for cid, g in st.get('geometry', {}).items():
+            any_row = True
+            sizes = np.array(g['sizes'], dtype=np.float64)
+            pct = sizes / sizes.sum() * 100 if sizes.sum() else sizes
+            table.add_row([sp, st['categories'].get(cid, f"未定义_{cid}"), g['count'],
+                           '/'.join(f"{v:.1f}" for v in g['width']),
+                           '/'.join(f"{v:.1f}" for v in g['height']),
+                           f"{g['area'][1]:.0f}",
+                           '/'.join(f"{v:.2f}" for v in g['aspect']),
+                           '/'.join(f"{v:.0f}" for v in pct)])
+    if not any_row:
+        log_warn("没有可用于几何统计的标注框")
+        return
+    print("")
+    log_info(f"标注框几何分布 (像素; 小/中/大 按面积 {SIZE_BOUNDS[0]}/{SIZE_BOUNDS[1]} 划分):")
+    print(str(table))
+
+
+def generate_report(split_name, stats, max_items=10):
+    """输出单个分割的一致性检查详情."""
+    print("")
+    log_info(f"{'='*20} {split_name} 检查报告 {'='*20}")
+    for key, title in (('missing_files', '缺失图片文件'), ('unreferenced_files', '目录中未被引用的图片')):
+        items = stats[key]
+        if items is None:
+            continue
+        log_info(f"{title}: {len(items)} 个")
+        for n in items[:max_items]:
+            log_info(f"  - {n}")
+        if len(items) > max_items:
+            log_info(f"  ...（还有{len(items) - max_items}个）")
+    if stats['duplicate_image_ids']:
+        log_warn(f"重复的图片ID: {stats['duplicate_image_ids']} 个")
+    if stats['orphan_annotation_images']:
+        log_warn(f"标注引用了不存在的图片ID: {stats['orphan_annotation_images']} 个")
+    if stats['unknown_categories']:
+        log_warn(f"标注使用了未定义的类别ID: {stats['unknown_categories']}")
+    if stats['invalid_bbox']:
+        log_warn(f"缺失或宽高非正的 bbox: {stats['invalid_bbox']} 个")
+    if stats['crowd']:
+        log_info(f"iscrowd=1 的标注: {stats['crowd']} 个")
+
+
+def analyze_dataset(dataset_dir, show_stats=False, geometry=False, check_files=True, workers=None):
+    """分析 COCO 数据集的全部分割, 返回 {split: 统计 dict}."""
+    log_info(f"开始分析COCO数据集: {dataset_dir}")
+    splits = find_coco_splits(dataset_dir)
+    if not splits:
+        log_error("未找到 COCO 注释文件")
+        log_info("支持的结构:")
+        log_info("  1. dataset/annotations.json + dataset/images/")
+        log_info("  2. dataset/train/annotations.json + dataset/train/images/ 等 (coco_dataset_split 输出)")
+        log_info("  3. dataset/annotations/instances_train2017.json + dataset/train2017/ 等")
+        return None
+
+    all_stats = {}
+    for split_name, ann_path, images_dir in splits:
+        if check_files and images_dir is None:
+            log_warn(f"{split_name}: 未找到图片目录, 跳过图片存在性检查")
+        log_info(f"解析 {split_name}: {ann_path} ({os.path.getsize(ann_path) / 1e6:.1f} MB)")
+        try:
+            with span('parse'):
+                all_stats[split_name] = analyze_coco_file(ann_path, images_dir, check_files, geometry, workers)
+                count_file(ann_path)
+                count('boxes', all_stats[split_name]['annotations'])
+        except (CocoStreamError, ValueError) as e:
+            log_error(f"{split_name}: 注释文件解析失败: {e}")
+
+    if not all_stats:
+        return None
+    print_coco_report(all_stats, show_stats, geometry, check_files)
+    return all_stats
+
+
+def print_coco_report(all_stats, show_stats=False, geometry=False, check_files=True):
+    """按固定顺序输出各分割的统计表、一致性检查与总体摘要."""
+    create_basic_stats_table(all_stats)
+    if show_stats:
+        create_category_distribution_table(all_stats)
+    if geometry:
+        create_geometry_table(all_stats)
+
+    # 各分割类别定义是否一致
+    cat_sets = {sp: tuple(sorted(st['categories'].items())) for sp, st in all_stats.items()}
+    if len(set(cat_sets.values())) > 1:
+        log_warn("各分割的 categories 定义不一致, 训练/评估时类别可能错位")
+
+    print("")
+    log_info(f"{'='*30} 总体摘要 {'='*30}")
+    log_info(f"数据集分割数: {len(all_stats)}")
+    log_info(f"总图片数: {sum(st['images'] for st in all_stats.values())}")
+    log_info(f"总标注数: {sum(st['annotations'] for st in all_stats.values())}")
+    if check_files:
+        log_info(f"总缺失图片文件: {sum(len(st['missing_files'] or []) for st in all_stats.values())}")
+    for split_name, st in all_stats.items():
+        generate_report(split_name, st)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="COCO数据集分析工具 - 流式统计多分割 COCO 注释")
+    parser.add_argument('--dataset_dir', '-d', required=True,
+                        help='COCO 数据集根目录或单个注释 .json 文件')
+    parser.add_argument('--stats', '-s', action='store_true',
+                        help='显示类别分布统计 (每类标注数与图片数)')
+    parser.add_argument('--geometry', '-g', action='store_true',
+                        help='按类别统计像素级框宽/高/面积/宽高比分位数与大/中/小目标占比')
+    parser.add_argument('--no-check-files', action='store_true',
+                        help='跳过图片文件存在性检查 (默认检查)')
+    parser.add_argument('--workers', type=int,
+                        help='文件存在性检查的线程数 (默认: min(32, CPU核数*4))')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
+
+    if not os.path.exists(args.dataset_dir):
+        log_error(f"数据集路径不存在: {args.dataset_dir}")
+        return
+    analyze_dataset(args.dataset_dir, show_stats=args.stats, geometry=args.geometry,
+                    check_files=not args.no_check_files, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,17 +4,11 @@
 
 输入: COCO 单一 annotations.json + images/ 目录
 输出: train/val(/test)/annotations.json + 对应 images 软/硬拷贝
-特性: 类别分层随机划分、比例与随机种子控制、类别统计输出
+特性: 多标签迭代分层划分 (稀疏 图像x类别 矩阵, 向量化)、比例与随机种子控制、
+      各类别实际/目标比例对比输出; --group-regex/--group-csv 按患者/体数据分组划分
+扩展: --save-plan/--plan 导出/导入划分方案 (stem->划分 + 指纹), 与 yolo_dataset_split 通用
 """
 
-import os
-import json
-import shutil
-import random
-import argparse
-from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
-_LOG_FILE = tee_stdout_stderr('logs')
-
 import os
 import json
 import shutil
@@ -22,7 +16,15 @@ import random
 import argparse
 from collections import defaultdict, Counter
 from pathlib import Path
-import numpy as np
+from utils.split_utils import (
+    pairs_to_csr, iterative_stratify, split_label_counts, ratio_deviation,
+    load_group_csv, resolve_group_keys, hash_group_index, group_stratify, save_split_plan, load_split_plan,
+)
+from utils.dataset_cache import dataset_fingerprint
+from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, profiled, span, count_file
+
+SPLIT_NAMES = ['train', 'val', 'test']
 
 
 def get_image_extensions():
@@ -30,6 +32,7 @@ def get_image_extensions():
     return ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp']
 
 
+@profiled('parse')
 def load_coco_annotations(annotation_file):
     """
     加载COCO格式标注文件
@@ -42,6 +45,7 @@ def load_coco_annotations(annotation_file):
     """
     with open(annotation_file, 'r', encoding='utf-8') as f:
         coco_data = json.load(f)
+    count_file(annotation_file)
     return coco_data
 
 
@@ -80,33 +84,65 @@ def analyze_dataset_distribution(coco_data):
     }
 
 
-def stratified_split_images(coco_data, train_ratio=0.8, val_ratio=0.1, test_ratio=0.1, random_state=42):
+def build_image_category_matrix(coco_data):
     """
-    按类别分层划分图像，确保各类别在各数据集中的分布均衡
-    
+    构建 图像 x 类别 的稀疏计数矩阵 (CSR)
+
+    Args:
+        coco_data (dict): COCO格式数据
+
+    Returns:
+        tuple: (image_ids, category_ids, indptr, indices, data)
+               第 i 张图像包含类别 category_ids[indices[indptr[i]:indptr[i+1]]], data 为对应标注数
+    """
+    import numpy as np
+    image_ids = [img['id'] for img in coco_data['images']]
+    id_to_row = {img_id: row for row, img_id in enumerate(image_ids)}
+    category_ids = sorted({cat['id'] for cat in coco_data.get('categories', [])} |
+                          {ann['category_id'] for ann in coco_data['annotations']})
+    cat_to_col = {cat_id: col for col, cat_id in enumerate(category_ids)}
+
+    rows = np.fromiter((id_to_row.get(ann['image_id'], -1) for ann in coco_data['annotations']),
+                       dtype=np.int64, count=len(coco_data['annotations']))
+    cols = np.fromiter((cat_to_col[ann['category_id']] for ann in coco_data['annotations']),
+                       dtype=np.int64, count=len(coco_data['annotations']))
+    orphan = rows < 0
+    if orphan.any():
+        log_warn(f"{int(orphan.sum())} 个标注引用了不存在的图像ID, 划分时忽略")
+        rows, cols = rows[~orphan], cols[~orphan]
+    indptr, indices, data = pairs_to_csr(rows, cols, len(image_ids))
+    return image_ids, np.array(category_ids), indptr, indices, data
+
+
+def stratified_split_images(coco_data, train_ratio=0.8, val_ratio=0.1, test_ratio=0.1, random_state=42,
+                            group_keys=None):
+    """
+    按类别迭代分层划分图像 (多标签友好), 使各类别在各数据集中的比例接近目标比例
+
+    每轮处理剩余图像最少的类别, 按各划分对该类别的剩余需求成批分配含该类别的图像,
+    并同时扣减这些图像上其他类别的需求; 无标注图像最后用于补齐各划分的图像数.
+
     Args:
         coco_data (dict): COCO格式数据
         train_ratio (float): 训练集比例
         val_ratio (float): 验证集比例  
         test_ratio (float): 测试集比例
         random_state (int): 随机种子
+        group_keys (list): 与 coco_data['images'] 一一对应的分组键 (可选);
+                           给定时同组图像 (如同一患者的切片) 必定落在同一划分
         
     Returns:
         dict: 划分结果 {'train': [], 'val': [], 'test': []}
     """
+    import numpy as np
     random.seed(random_state)
     np.random.seed(random_state)
     
-    # 分析数据集分布
-    analysis = analyze_dataset_distribution(coco_data)
-    image_to_categories = analysis['image_to_categories']
-    category_to_images = analysis['category_to_images']
-    
     # 获取所有图像ID
     all_image_ids = [img['id'] for img in coco_data['images']]
     
     # 如果没有标注，简单随机划分
-    if not coco_data['annotations']:
+    if not coco_data['annotations'] and group_keys is None:
         log_warn("数据集中没有标注，将进行简单随机划分")
         random.shuffle(all_image_ids)
         
@@ -119,55 +155,28 @@ def stratified_split_images(coco_data, train_ratio=0.8, val_ratio=0.1, test_rati
             'test': all_image_ids[train_count + val_count:]
         }
     
-    # 有标注的情况下，进行分层划分
-    assigned_images = set()
-    train_images, val_images, test_images = [], [], []
-    
-    # 按类别频率排序，优先处理样本较少的类别
-    sorted_categories = sorted(category_to_images.keys(), 
-                             key=lambda x: len(category_to_images[x]))
-    
-    for category_id in sorted_categories:
-        category_images = list(category_to_images[category_id])
-        # 移除已分配的图像
-        category_images = [img_id for img_id in category_images if img_id not in assigned_images]
-        
-        if not category_images:
-            continue
-            
-        random.shuffle(category_images)
-        
-        # 计算该类别的划分数量
-        total = len(category_images)
-        train_count = max(1, int(total * train_ratio))
-        val_count = max(0, int(total * val_ratio)) if total > 1 else 0
-        test_count = total - train_count - val_count
-        
-        # 分配图像
-        train_images.extend(category_images[:train_count])
-        val_images.extend(category_images[train_count:train_count + val_count])
-        test_images.extend(category_images[train_count + val_count:train_count + val_count + test_count])
-        
-        # 标记为已分配
-        assigned_images.update(category_images)
-    
-    # 处理没有标注的图像（背景图像）
-    unassigned_images = [img_id for img_id in all_image_ids if img_id not in assigned_images]
-    if unassigned_images:
-        log_info(f"发现 {len(unassigned_images)} 张无标注图像，进行随机分配")
-        random.shuffle(unassigned_images)
-        
-        bg_train_count = int(len(unassigned_images) * train_ratio)
-        bg_val_count = int(len(unassigned_images) * val_ratio)
-        
-        train_images.extend(unassigned_images[:bg_train_count])
-        val_images.extend(unassigned_images[bg_train_count:bg_train_count + bg_val_count])
-        test_images.extend(unassigned_images[bg_train_count + bg_val_count:])
-    
+    # 有标注的情况下，在 图像 x 类别 矩阵上进行迭代分层 (按是否包含类别, 而非标注数)
+    image_ids, _category_ids, indptr, indices, _data = build_image_category_matrix(coco_data)
+    background = int((np.diff(indptr) == 0).sum())
+    if background:
+        log_info(f"发现 {background} 张无标注图像，用于补齐各划分的图像数")
+    ratios = [train_ratio, val_ratio, test_ratio]
+    if group_keys is not None:
+        # 分组模式: 标注计数聚合到分组后分层
+        group_of, groups = hash_group_index(group_keys)
+        log_info(f"分组划分: {len(groups)} 个分组, 平均每组 {len(image_ids) / max(1, len(groups)):.1f} 张图像")
+        assignment = group_stratify(indptr, indices, group_of, ratios, seed=random_state)
+        group_split = np.full(len(groups), -1, dtype=np.int8)
+        group_split[group_of] = assignment
+        log_info("各划分分组数: " + ', '.join(
+            f"{name} {int((group_split == k).sum())}" for k, name in enumerate(SPLIT_NAMES)))
+    else:
+        assignment = iterative_stratify(indptr, indices, ratios, seed=random_state)
+
+    image_ids = np.array(image_ids, dtype=object)
     return {
-        'train': train_images,
-        'val': val_images,
-        'test': test_images
+        name: image_ids[assignment == k].tolist()
+        for k, name in enumerate(SPLIT_NAMES)
     }
 
 
@@ -210,6 +219,7 @@ def create_split_coco_data(coco_data, image_ids, split_name):
     return split_coco_data
 
 
+@profiled('copy')
 def copy_images(image_list, src_images_dir, dst_images_dir):
     """
     复制图像文件到目标目录
@@ -228,6 +238,7 @@ def copy_images(image_list, src_images_dir, dst_images_dir):
         
         if os.path.exists(src_path):
             shutil.copy2(src_path, dst_path)
+            count_file(dst_path)
             copied_count += 1
         else:
             log_warn(f"图像文件不存在: {src_path}")
@@ -235,41 +246,128 @@ def copy_images(image_list, src_images_dir, dst_images_dir):
     log_info(f"复制了 {copied_count}/{len(image_list)} 张图像")
 
 
-def print_split_statistics(splits, coco_data):
+def print_split_statistics(splits, coco_data, split_ratios=None):
     """
-    打印划分统计信息
-    
+    打印划分统计信息, 以及各类别 实际比例 与 目标比例 的对比
+
     Args:
         splits (dict): 划分结果
         coco_data (dict): 原始COCO数据
+        split_ratios (dict): 目标划分比例 (可选, 缺省时按图像数比例)
     """
-    analysis = analyze_dataset_distribution(coco_data)
-    
+    import numpy as np
+    from prettytable import PrettyTable
+    image_ids, category_ids, indptr, indices, data = build_image_category_matrix(coco_data)
+    total_images = len(image_ids)
+    id_to_row = {img_id: row for row, img_id in enumerate(image_ids)}
+    assignment = np.full(total_images, -1, dtype=np.int8)
+    for k, name in enumerate(SPLIT_NAMES):
+        rows = [id_to_row[i] for i in splits.get(name, []) if i in id_to_row]
+        assignment[rows] = k
+    if split_ratios is None:
+        split_ratios = {name: len(splits.get(name, [])) / max(1, total_images) for name in SPLIT_NAMES}
+    ratios = [split_ratios.get(name, 0.0) for name in SPLIT_NAMES]
+    k = len(SPLIT_NAMES)
+
+    # 类别 x 划分 的计数矩阵: 含该类别的图像数 / 该类别的标注数
+    image_counts = split_label_counts(indptr, indices, assignment, k, num_labels=len(category_ids))
+    ann_counts = split_label_counts(indptr, indices, assignment, k, data=data, num_labels=len(category_ids))
+    deviation = ratio_deviation(image_counts, ratios)
+    cat_names = {cat['id']: cat['name'] for cat in coco_data.get('categories', [])}
+
     log_info("\n=== 数据集划分统计 ===")
     log_info(f"原始数据集:")
-    log_info(f"  - 总图像数: {analysis['total_images']}")
-    log_info(f"  - 总标注数: {analysis['total_annotations']}")
+    log_info(f"  - 总图像数: {total_images}")
+    log_info(f"  - 总标注数: {len(coco_data['annotations'])}")
     log_info(f"  - 类别数: {len(coco_data['categories'])}")
-    
-    for split_name, image_ids in splits.items():
-        split_annotations = [ann for ann in coco_data['annotations'] 
-                           if ann['image_id'] in image_ids]
-
-        # 统计类别分布
-        category_counts = Counter(ann['category_id'] for ann in split_annotations)
 
+    split_anns = ann_counts.sum(axis=0)
+    for k_idx, split_name in enumerate(SPLIT_NAMES):
+        n_images = len(splits.get(split_name, []))
         log_info(f"\n{split_name.upper()}集:")
-        log_info(f"  - 图像数: {len(image_ids)} ({len(image_ids)/analysis['total_images']*100:.1f}%)")
-        log_info(f"  - 标注数: {len(split_annotations)}")
+        log_info(f"  - 图像数: {n_images} ({n_images / max(1, total_images) * 100:.1f}%)")
+        log_info(f"  - 标注数: {int(split_anns[k_idx])}")
 
-        if category_counts:
-            log_info(f"  - 类别分布:")
-            for cat in coco_data['categories']:
-                count = category_counts.get(cat['id'], 0)
-                log_info(f"    * {cat['name']}: {count}")
+    if not len(category_ids):
+        return
+    table = PrettyTable()
+    table.field_names = ["类别", "图像数"] + [f"{name}(实际/目标)" for name in SPLIT_NAMES] + ["最大偏差", "标注数(train/val/test)"]
+    totals = image_counts.sum(axis=1)
+    for col, cat_id in enumerate(category_ids.tolist()):
+        row = [cat_names.get(cat_id, str(cat_id)), int(totals[col])]
+        for k_idx in range(k):
+            achieved = image_counts[col, k_idx] / totals[col] * 100 if totals[col] else 0.0
+            row.append(f"{achieved:.1f}%/{ratios[k_idx] * 100:.0f}%")
+        row.append(f"{deviation[col] * 100:.1f}%")
+        row.append('/'.join(str(int(v)) for v in ann_counts[col]))
+        table.add_row(row)
+    log_info("\n各类别划分比例 (按含该类别的图像数):")
+    print(str(table))
+    worst = int(np.argmax(deviation))
+    log_info(f"类别比例平均偏差 {deviation.mean() * 100:.2f}%, 最大偏差 {deviation[worst] * 100:.2f}% "
+             f"({cat_names.get(int(category_ids[worst]), category_ids[worst])})")
+    missing = [(cat_names.get(int(c), str(c)), SPLIT_NAMES[k_idx])
+               for col, c in enumerate(category_ids.tolist()) for k_idx in range(k)
+               if totals[col] * ratios[k_idx] >= 1 and image_counts[col, k_idx] == 0]
+    if missing:
+        log_warn("以下类别在对应划分中缺失: " + ', '.join(f"{c}@{sp}" for c, sp in missing[:20]))
+
+
+def compute_group_keys(coco_data, group_regex=None, group_csv=None):
+    """
+    根据文件名正则或元数据CSV为每张图像求分组键
 
+    Args:
+        coco_data (dict): COCO格式数据
+        group_regex (str): 作用于 file_name 的正则, 有捕获组时取第1组
+        group_csv (str): 文件名->分组 的CSV路径
 
-def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42):
+    Returns:
+        list | None: 与 coco_data['images'] 一一对应的分组键, 未启用分组时返回 None
+    """
+    if not group_regex and not group_csv:
+        return None
+    mapping = load_group_csv(group_csv) if group_csv else None
+    names = [img['file_name'] for img in coco_data['images']]
+    keys, unmatched = resolve_group_keys(names, regex=group_regex, mapping=mapping)
+    if unmatched:
+        log_warn(f"{unmatched} 张图像未匹配到分组, 各自作为独立分组")
+    return keys
+
+
+def plan_key(file_name):
+    """划分方案的键: file_name 去掉目录与扩展名后的 stem (与 YOLO 划分方案通用)"""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def plan_split_images(coco_data, split_of):
+    """
+    按划分方案 ({stem: 划分}) 分配图像, 不做分层计算
+
+    Returns:
+        dict: 划分结果 {'train': [], 'val': [], 'test': []}
+    """
+    unknown = set(split_of.values()) - set(SPLIT_NAMES)
+    if unknown:
+        raise ValueError(f"划分方案包含不支持的划分名: {', '.join(sorted(unknown))}")
+    splits = {name: [] for name in SPLIT_NAMES}
+    unplanned = 0
+    for img in coco_data['images']:
+        split = split_of.get(plan_key(img['file_name']))
+        if split is None:
+            unplanned += 1
+            continue
+        splits[split].append(img['id'])
+    if unplanned:
+        log_warn(f"{unplanned} 张图像不在划分方案中, 已跳过")
+    matched = sum(len(ids) for ids in splits.values())
+    if matched < len(split_of):
+        log_warn(f"划分方案中有 {len(split_of) - matched} 个 stem 在标注文件中找不到对应图像")
+    return splits
+
+
+def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42, group_regex=None, group_csv=None,
+                       save_plan=None, plan=None):
     """
     划分COCO格式数据集
     
@@ -278,6 +376,10 @@ def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42):
         output_dir (str): 输出数据集目录
         split_ratios (dict): 划分比例
         random_state (int): 随机种子
+        group_regex (str): 分组正则 (可选, 防止同一患者/体数据的切片跨划分)
+        group_csv (str): 文件名->分组 的CSV (可选)
+        save_plan (str): 划分方案输出路径 (可选)
+        plan (str): 已保存的划分方案; 给定时直接按方案分配, 忽略比例/种子/分组 (可选)
     """
     input_path = Path(input_dir)
     output_path = Path(output_dir)
@@ -300,18 +402,31 @@ def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42):
     log_info(f"  - 标注数: {len(coco_data['annotations'])}")
     log_info(f"  - 类别数: {len(coco_data['categories'])}")
     
-    # 执行划分
-    log_info("\n开始执行数据集划分...")
-    splits = stratified_split_images(
-        coco_data, 
-        train_ratio=split_ratios['train'],
-        val_ratio=split_ratios['val'],
-        test_ratio=split_ratios['test'],
-        random_state=random_state
-    )
+    fingerprint = dataset_fingerprint([('root', input_path), ('images', images_dir)])
+    if plan:
+        plan_data, split_of = load_split_plan(plan)
+        meta = plan_data.get('meta', {})
+        log_info(f"\n按划分方案分配: {plan} (创建于 {plan_data.get('created', '未知')}, "
+                 f"来源 {meta.get('tool', '未知')}, 方式 {meta.get('mode', '未知')})")
+        if plan_data.get('fingerprint') and plan_data['fingerprint'] != fingerprint:
+            log_warn("数据集指纹与方案不一致 (文件已变化或格式已转换), 继续按文件 stem 匹配")
+        splits = plan_split_images(coco_data, split_of)
+        split_ratios = meta.get('ratios')
+    else:
+        # 执行划分
+        log_info("\n开始执行数据集划分...")
+        with span('assign'):
+            splits = stratified_split_images(
+                coco_data,
+                train_ratio=split_ratios['train'],
+                val_ratio=split_ratios['val'],
+                test_ratio=split_ratios['test'],
+                random_state=random_state,
+                group_keys=compute_group_keys(coco_data, group_regex, group_csv)
+            )
     
     # 打印统计信息
-    print_split_statistics(splits, coco_data)
+    print_split_statistics(splits, coco_data, split_ratios)
     
     # 创建输出目录并复制文件
     log_info(f"\n创建输出目录: {output_path}")
@@ -334,8 +449,10 @@ def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42):
 
         # 保存标注文件
         split_annotation_file = split_dir / 'annotations.json'
-        with open(split_annotation_file, 'w', encoding='utf-8') as f:
-            json.dump(split_coco_data, f, indent=2, ensure_ascii=False)
+        with span('write'):
+            with open(split_annotation_file, 'w', encoding='utf-8') as f:
+                json.dump(split_coco_data, f, indent=2, ensure_ascii=False)
+            count_file(split_annotation_file)
 
         # 复制图像文件
         copy_images(split_coco_data['images'], str(images_dir), str(split_images_dir))
@@ -350,6 +467,17 @@ def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42):
             shutil.copy2(src_file, dst_file)
             log_info(f"复制额外文件: {extra_file}")
     
+    if save_plan:
+        file_names = {img['id']: img['file_name'] for img in coco_data['images']}
+        mode = 'plan' if plan else ('group' if (group_regex or group_csv) else 'stratify')
+        save_split_plan(save_plan,
+                        {name: [plan_key(file_names[i]) for i in ids] for name, ids in splits.items() if ids},
+                        fingerprint=fingerprint,
+                        meta={'tool': 'coco_dataset_split', 'mode': mode, 'seed': random_state,
+                              'ratios': split_ratios,
+                              'names': [cat['name'] for cat in sorted(coco_data['categories'], key=lambda c: c['id'])]})
+        log_info(f"已保存划分方案 -> {save_plan}")
+
     log_info(f"\n数据集划分完成!")
     log_info(f"输出目录: {output_path}")
     
@@ -374,7 +502,7 @@ def split_coco_dataset(input_dir, output_dir, split_ratios, random_state=42):
             log_info(f"{prefix} {filename}")
 
 
-def main():
+def main(argv=None):
     """主函数"""
     parser = argparse.ArgumentParser(
         description="COCO格式数据集划分工具",
@@ -421,8 +549,20 @@ def main():
                         help='测试集比例 (默认: 0.1)')
     parser.add_argument('--seed', type=int, default=42,
                         help='随机种子 (默认: 42)')
-    
-    args = parser.parse_args()
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--group-regex',
+                        help='按 file_name 正则提取分组键 (如患者ID), 同组图像不跨划分; 有捕获组时取第1组')
+    group.add_argument('--group-csv',
+                        help='文件名->分组 映射CSV (列名如 file_name,patient_id; 无表头时取前两列)')
+    parser.add_argument('--save-plan', metavar='PATH',
+                        help='保存划分方案 (stem->划分 + 数据集指纹, JSON), 与 yolo_dataset_split 通用')
+    parser.add_argument('--plan', metavar='PATH',
+                        help='按已保存的划分方案分配图像 (不重新计算, 忽略比例/种子/分组参数)')
+    
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     
     # 验证比例总和
     total_ratio = args.train_ratio + args.val_ratio + args.test_ratio
@@ -449,6 +589,8 @@ def main():
     log_info(f"验证集比例: {args.val_ratio}")
     log_info(f"测试集比例: {args.test_ratio}")
     log_info(f"随机种子: {args.seed}")
+    if args.group_regex or args.group_csv:
+        log_info(f"分组方式: {'正则 ' + args.group_regex if args.group_regex else 'CSV ' + args.group_csv}")
     log_info("-" * 50)
     
     try:
@@ -457,7 +599,11 @@ def main():
             input_dir=args.input_dir,
             output_dir=args.output_dir,
             split_ratios=split_ratios,
-            random_state=args.seed
+            random_state=args.seed,
+            group_regex=args.group_regex,
+            group_csv=args.group_csv,
+            save_plan=args.save_plan,
+            plan=args.plan
         )
         
     except Exception as e:
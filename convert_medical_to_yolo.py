@@ -6,22 +6,21 @@
 输出结构: format2 (images/, labels/).
 包含基础统计与转换进度.
 """
-import pandas as pd
 import os
-import cv2
-import numpy as np
+import argparse
 from pathlib import Path
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
-_LOG_FILE = tee_stdout_stderr('logs')
-import SimpleITK as sitk
-from tqdm import tqdm
-import argparse
+from utils.profiling import add_profile_args, start_profiling, profiled, span, count, count_file
 
+@profiled('decode')
 def read_mha_image(file_path):
     """读取 MHA 格式图像."""
+    import numpy as np
+    import SimpleITK as sitk
     try:
         # 使用SimpleITK读取MHA文件
         image = sitk.ReadImage(file_path)
+        count_file(file_path)
         # 转换为numpy数组
         image_array = sitk.GetArrayFromImage(image)
         
@@ -65,6 +64,9 @@ def convert_medical_to_yolo(input_dir, output_dir, metadata_file):
         output_dir: 输出目录.
         metadata_file: 元数据 CSV 文件路径.
     """
+    import cv2
+    import pandas as pd
+    from tqdm import tqdm
     # 创建输出目录结构
     output_dir = Path(output_dir)
     images_dir = output_dir / "images"
@@ -119,7 +121,9 @@ def convert_medical_to_yolo(input_dir, output_dir, metadata_file):
             # 保存为JPG格式
             img_output_name = img_name.replace('.mha', '.jpg')
             img_output_path = images_dir / img_output_name
-            cv2.imwrite(str(img_output_path), image_array)
+            with span('encode'):
+                cv2.imwrite(str(img_output_path), image_array)
+                count_file(img_output_path)
             
             # 检查该图像是否有结节（label=1的记录）
             image_records = metadata[metadata['img_name'] == img_name]
@@ -150,6 +154,7 @@ def convert_medical_to_yolo(input_dir, output_dir, metadata_file):
                         
                         # 写入标签文件 (只有一个类别: nodule = 0)
                         f.write(f"0 {center_x:.6f} {center_y:.6f} {norm_width:.6f} {norm_height:.6f}\n")
+                        count('boxes')
                 
                 nodule_images_count += 1
             else:
@@ -193,13 +198,16 @@ names: ['nodule']
     
     log_info(f"数据集配置文件已创建: {yaml_path}.")
 
-def main():
+def main(argv=None):
     """主函数."""
     parser = argparse.ArgumentParser(description="医学图像数据集转 YOLO 格式")
     parser.add_argument('--input_dir', '-i', required=True, help='输入图像目录')
     parser.add_argument('--output_dir', '-o', required=True, help='输出YOLO数据集目录')
     parser.add_argument('--metadata_file', '-m', required=True, help='元数据CSV文件路径')
-    args = parser.parse_args()
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
 
     input_dir = args.input_dir
     output_dir = args.output_dir
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""medds: 数据集工具统一入口
+
+核心: medds <子命令> [参数...], 只导入所选子命令对应的脚本, 参数与单独运行该脚本时完全相同
+扩展: 用单独的 '+' 串联多个子命令, 在同一进程中依次执行, 共用一份日志与目录清单缓存 (utils/manifest.py);
+      任一阶段以非 0 状态退出或输出了 [ERROR] 日志时, 视为失败并停止后续阶段
+默认: 日志写入 logs/<时间戳>_medds_<子命令>.log; 仅查看帮助时不写日志;
+      任一阶段带 --profile 后其后各阶段均被剖析, 每个阶段结束时单独输出汇总表
+使用示例:
+    python medds.py analyze --dataset data/yolo --stats
+    python medds.py classes --dataset data/yolo info + split --input_dir data/yolo --output_dir data/split + yolo2coco --dataset_dir data/split
+"""
+import importlib
+import sys
+
+from utils.logging_utils import tee_stdout_stderr, log_info, log_error, error_count
+from utils import profiling
+
+# 子命令 -> (模块名, 说明); 模块在执行时才导入
+COMMANDS = {
+    'analyze': ('yolo_dataset_analyzer', 'YOLO 数据集分析 (统计/几何/校验/完整性/近重复)'),
+    'split': ('yolo_dataset_split', 'YOLO 数据集划分 (分层/分组/哈希/K 折/划分方案)'),
+    'classes': ('yolo_class_manager', 'YOLO 类别管理 (删除/重命名/重排/清理)'),
+    'view': ('yolo_dataset_viewer', 'YOLO 数据集查看 (交互/批量/拼图导出/浏览服务)'),
+    'convert': ('yolo_format_convert', 'YOLO 结构重排 (format1/format2/standard/mixed)'),
+    'yolo2coco': ('yolo2coco', 'YOLO -> COCO 转换'),
+    'coco-split': ('coco_dataset_split', 'COCO 数据集分层划分'),
+    'coco-analyze': ('coco_dataset_analyzer', 'COCO 数据集分析'),
+    'voc2yolo': ('voc2yolo', 'VOC XML -> YOLO 转换'),
+    'voc2coco': ('voc2coco', 'VOC XML -> COCO 转换'),
+    'mha2yolo': ('convert_medical_to_yolo', '医学影像 (MHA) -> YOLO 转换'),
+    'synth': ('synth_dataset', '生成合成数据集 (YOLO/COCO/VOC/MHA)'),
+    'bench': ('benchmark', '合成数据上的离线基准测试 (耗时/吞吐/峰值内存)'),
+    'pipeline': ('pipeline_runner', '声明式流水线: 一次读取, 内存中执行多个阶段 (YAML)'),
+}
+CHAIN_SEP = '+'
+
+
+def print_usage() -> None:
+    """打印子命令列表 (不导入任何子命令模块)."""
+    print(f"用法: medds <子命令> [参数...] [{CHAIN_SEP} <子命令> [参数...] ...]")
+    print("      medds <子命令> -h    查看子命令参数")
+    print("\n子命令:")
+    width = max(len(c) for c in COMMANDS)
+    for cmd, (module, desc) in COMMANDS.items():
+        print(f"  {cmd:<{width}}  {desc} ({module}.py)")
+
+
+def split_stages(argv: list[str]) -> list[tuple[str, list[str]]]:
+    """按单独的 '+' 切分为 [(子命令, 参数列表), ...]; 空阶段被忽略."""
+    stages, current = [], []
+    for arg in argv + [CHAIN_SEP]:
+        if arg == CHAIN_SEP:
+            if current:
+                stages.append((current[0], current[1:]))
+            current = []
+        else:
+            current.append(arg)
+    return stages
+
+
+def _exit_code(code) -> int:
+    """与解释器处理 SystemExit 的方式一致: None 为 0, 非整数打印后视为 1."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_stage(cmd: str, args: list[str]) -> int:
+    """导入并执行一个子命令的 main(args), 返回退出状态.
+
+    各脚本出错时多为 log_error 后直接 return, 因此阶段内出现 [ERROR] 日志也按状态 1 处理.
+    """
+    module = importlib.import_module(COMMANDS[cmd][0])
+    argv0 = sys.argv[0]
+    errors = error_count()
+    # argparse 以 sys.argv[0] 作为 prog, 使用法提示显示为 "medds <子命令>"
+    sys.argv[0] = f"medds {cmd}"
+    try:
+        module.main(args)
+    except SystemExit as e:
+        code = _exit_code(e.code)
+        if code != 0:
+            return code
+    finally:
+        sys.argv[0] = argv0
+    return 1 if error_count() > errors else 0
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print_usage()
+        return 0
+    stages = split_stages(argv)
+    unknown = [cmd for cmd, _ in stages if cmd not in COMMANDS]
+    if unknown:
+        log_error(f"未知子命令: {', '.join(unknown)}")
+        print_usage()
+        return 2
+
+    help_only = all(any(a in ('-h', '--help') for a in args) for _, args in stages)
+    if not help_only:
+        tee_stdout_stderr('logs', 'medds_' + '_'.join(cmd for cmd, _ in stages))
+    for i, (cmd, args) in enumerate(stages, 1):
+        if len(stages) > 1:
+            log_info(f"===== [{i}/{len(stages)}] {cmd} {' '.join(args)} =====")
+        code = run_stage(cmd, args)
+        if len(stages) > 1:
+            profiling.report(f"[{i}/{len(stages)}] {cmd}", restart=True)
+        if code != 0:
+            if i < len(stages):
+                log_error(f"阶段 {cmd} 失败 (状态 {code}), 停止后续阶段")
+            return code
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""数据集准备流水线 (声明式 YAML)
+
+核心: 按 YAML 中的阶段列表在同一进程内依次执行 分析 -> 类别清理 -> 划分 -> 查看 -> yolo2coco -> COCO 重划分 -> 分析,
+      开始时只读取一次数据集 (每个标签文件一次), 各阶段在内存中的数据集模型 (utils/dataset_model.py) 上进行
+扩展: 只有物化阶段写盘 (write / view / yolo2coco 与 coco-split 指定 output 时); --dry-run 只检查配置不读数据
+默认: 阶段参数与对应脚本的同名参数含义相同; 划分默认种子 42; 任一阶段出错即停止并以状态 1 退出
+使用示例:
+    python pipeline_runner.py -c pipeline.yaml
+    python pipeline_runner.py -c pipeline.yaml -i data/yolo --profile
+
+配置示例:
+    input: data/yolo
+    stages:
+      - analyze: {stats: true, validate: true}
+      - classes: {min_samples: 20}
+      - split: {ratios: [0.8, 0.1, 0.1], stratify: true}
+      - write: {output: data/yolo_split, format: 1}
+      - yolo2coco
+      - coco-split: {ratios: [0.8, 0.1, 0.1], output: data/coco_split}
+      - coco-analyze: {stats: true}
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, span, count, count_file
+
+YOLO_FORMATS = (1, 2, 'standard', 'mixed')
+
+
+class PipelineError(ValueError):
+    """配置错误或阶段无法继续执行."""
+
+
+class PipelineState:
+    """在各阶段之间传递的数据: YOLO 数据集模型, 以及 yolo2coco 之后的 COCO dict 与图片来源."""
+
+    def __init__(self, dataset, workers=None):
+        self.dataset = dataset
+        self.workers = workers
+        self.coco = None            # {分割: coco dict}
+        self.coco_sources = None    # {分割: {image_id: 源图片路径}}
+        self.image_sizes = {}       # 源图片路径 -> (宽, 高), 多次转换时不重复解码
+
+
+def _split_names(ratios):
+    """按比例个数确定分割名, 比例之和须为 1 (与 yolo_dataset_split.py 相同)."""
+    names = {2: ['train', 'val'], 3: ['train', 'val', 'test']}.get(len(ratios))
+    if names is None:
+        raise PipelineError(f"ratios 应为 2 个 (train/val) 或 3 个 (train/val/test) 比例, 当前为 {list(ratios)}")
+    if abs(sum(ratios) - 1.0) > 1e-6:
+        raise PipelineError(f"ratios 总和应为 1.0，当前为 {sum(ratios)}")
+    return names
+
+
+def _class_names_dict(ds):
+    return {i: n for i, n in enumerate(ds.class_names)}
+
+
+def _output_dir(output, overwrite):
+    out = Path(output)
+    if out.exists() and any(out.iterdir()) and not overwrite:
+        raise PipelineError(f"输出目录已存在且非空: {out}，若要继续写入，请添加 overwrite: true")
+    out.mkdir(parents=True, exist_ok=True)
+    return out
+
+
+def _check_unique_names(groups):
+    """同一输出目录内的文件名不能重复 (不同源分割中的同名图片合并到一个目录时会互相覆盖)."""
+    for target, paths in groups.items():
+        names = [os.path.basename(p) for p in paths]
+        if len(set(names)) != len(names):
+            dup = len(names) - len(set(names))
+            raise PipelineError(f"{target}: 有 {dup} 张图片与其他图片同名, 写出时会互相覆盖")
+
+
+def _link_all(jobs, mode, workers):
+    """并行复制/链接 [(源, 目标), ...], 返回退回为复制的个数."""
+    from concurrent.futures import ThreadPoolExecutor
+    from yolo_dataset_split import _link_file
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        used = list(pool.map(lambda job: _link_file(job[0], job[1], mode), jobs))
+    for _src, dst in jobs:
+        count_file(dst)
+    return sum(1 for u in used if u != mode)
+
+
+def stage_analyze(state, *, stats=True, geometry=False, validate=False, check_images=False, num_classes=None):
+    """统计/几何/标签校验/图片完整性 (输出与 yolo_dataset_analyzer.py 相同)."""
+    import numpy as np
+    from utils.box_stats import GeometryAccumulator
+    from utils.image_integrity import check_images as run_check_images
+    from yolo_dataset_analyzer import build_geometry_report, print_report
+    ds = state.dataset
+    labeled = ds.labeled()
+    per_image = np.diff(ds.offsets)
+    report = {'splits': {}, 'totals': {}}
+    for k, split in enumerate(ds.split_names):
+        mask = ds.split_of == k
+        report['splits'][split] = {
+            'missing_labels': [p for i, p in enumerate(ds.image_paths) if mask[i] and not labeled[i]],
+            'redundant_labels': ds.redundant.get(split, []),
+            'images': int(mask.sum()),
+            'labeled': int((mask & labeled).sum()),
+            'background': int((mask & ~labeled).sum()),
+            'boxes': int(per_image[mask].sum()),
+            'class_counts': {str(c): n for c, n in ds.class_counts(mask).items()},
+        }
+    for key in ('missing_labels', 'redundant_labels'):
+        report['totals'][key] = sum(len(sp[key]) for sp in report['splits'].values())
+    for key in ('images', 'labeled', 'background', 'boxes'):
+        report['totals'][key] = sum(sp[key] for sp in report['splits'].values())
+
+    if geometry:
+        acc = GeometryAccumulator()
+        acc.add(ds.boxes)
+        report['geometry'] = build_geometry_report(acc)
+    if validate:
+        n_cls = num_classes or (len(ds.class_names) or None)
+        log_info(f"校验标签 (内存中, 类别数上限: {n_cls if n_cls else '未知'})")
+        report['validation'] = ds.validate(n_cls)
+    if check_images:
+        report['integrity'] = {}
+        for k, split in enumerate(ds.split_names):
+            paths = [p for i, p in enumerate(ds.image_paths) if ds.split_of[i] == k]
+            report['integrity'][split] = run_check_images(paths, workers=state.workers,
+                                                          progress_desc=f"检查图片 {split}")
+            count('files', len(paths))
+    print_report(report, _class_names_dict(ds), stats, geometry, validate, False, check_images)
+
+
+def stage_classes(state, *, delete=None, min_samples=None, min_percentage=None, rename=None, reindex=None,
+                  strict=False):
+    """删除 (显式ID/最小样本数/最小占比) -> 重命名 -> 按名称重排, 只修改内存中的类别ID与类别名."""
+    ds = state.dataset
+    if delete or min_samples is not None or min_percentage is not None:
+        usage = ds.class_counts()
+        total = sum(usage.values()) or 1
+        targets = set(int(c) for c in (delete or []))
+        if min_samples is not None:
+            targets.update(c for c, n in usage.items() if n < min_samples)
+        if min_percentage is not None:
+            targets.update(c for c, n in usage.items() if n < total * float(min_percentage) / 100.0)
+        invalid = sorted(c for c in targets if not 0 <= c < len(ds.class_names))
+        if invalid:
+            raise PipelineError(f"以下类别超出定义范围 (0-{len(ds.class_names) - 1}): {invalid}")
+        if targets:
+            # 未删除的已定义类别按原顺序重新编号 (含未使用的类别, 保证标签与类别名一致)
+            table, names = [], []
+            for c, name in enumerate(ds.class_names):
+                table.append(-1 if c in targets else len(names))
+                if c not in targets:
+                    names.append(name)
+            removed, changed = ds.remap_classes(table, names)
+            log_info(f"删除类别: {sorted(targets)}, 删除标注 {removed} 个 ({removed * 100.0 / total:.1f}%), "
+                     f"重新编号标注 {changed} 个, 剩余类别 {len(names)}")
+        else:
+            log_warn("未指定需要删除的类别 (既没有ID也没有阈值命中)")
+
+    if rename:
+        if not isinstance(rename, dict):
+            raise PipelineError("rename 应为 {旧名称: 新名称} 映射")
+        names = list(ds.class_names)
+        for old, new in rename.items():
+            if old not in names:
+                log_warn(f"类别不存在, 跳过重命名: {old}")
+                continue
+            names[names.index(old)] = str(new)
+            log_info(f"重命名类别: {old} -> {new}")
+        ds.class_names = names
+
+    if reindex:
+        target = [str(n) for n in reindex]
+        name_to_new = {n: i for i, n in enumerate(target)}
+        missing = [n for n in ds.class_names if n not in name_to_new]
+        if missing:
+            if strict:
+                raise PipelineError(f"严格模式: 以下旧类别在目标列表中不存在: {missing}")
+            log_warn(f"以下旧类别在目标列表中不存在: {missing}，这些类别的标注将被丢弃")
+        table = [name_to_new.get(n, -1) for n in ds.class_names]
+        removed, changed = ds.remap_classes(table, target)
+        log_info(f"按目标顺序重排类别: 改写标注 {changed} 个, 丢弃标注 {removed} 个")
+
+
+def stage_split(state, *, ratios=(0.8, 0.1, 0.1), stratify=False, group_regex=None, group_csv=None, seed=42,
+                plan=None, save_plan=None):
+    """重新划分全部图片 (随机/分层/分组/按已保存的方案), 只修改内存中的分割归属."""
+    import numpy as np
+    from utils.split_utils import (group_stratify, hash_group_index, iterative_stratify, load_group_csv,
+                                   load_split_plan, resolve_group_keys, save_split_plan, split_label_counts)
+    ds = state.dataset
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in ds.image_paths]
+    indptr, indices = ds.image_class_csr()
+    if plan:
+        try:
+            plan_data, split_of = load_split_plan(plan)
+        except ValueError as e:
+            raise PipelineError(str(e))
+        splits = list(plan_data['splits'])
+        assignment = np.array([splits.index(split_of[s]) if s in split_of else -1 for s in stems], dtype=np.int64)
+        ratios = [plan_data.get('meta', {}).get('ratios', {}).get(sp, 0.0) for sp in splits]
+        mode = 'plan'
+        log_info(f"按划分方案分配: {plan} ({len(split_of)} 个 stem)")
+        if (assignment < 0).any():
+            log_warn(f"{int((assignment < 0).sum())} 张图片不在划分方案中, 已跳过")
+    else:
+        splits = _split_names(ratios)
+        if group_regex or group_csv:
+            mapping = load_group_csv(group_csv) if group_csv else None
+            keys, unmatched = resolve_group_keys([os.path.basename(p) for p in ds.image_paths],
+                                                 regex=group_regex, mapping=mapping)
+            if unmatched:
+                log_warn(f"{unmatched} 张图片未匹配到分组, 各自作为独立分组")
+            group_of, groups = hash_group_index(keys)
+            log_info(f"分组划分: {len(groups)} 个分组, 平均每组 {len(ds) / max(1, len(groups)):.1f} 张图片")
+            assignment = group_stratify(indptr, indices, group_of, ratios, seed=seed)
+            mode = 'group'
+        elif stratify:
+            assignment = iterative_stratify(indptr, indices, ratios, seed=seed)
+            mode = 'stratify'
+        else:
+            # 随机划分: 与 yolo_dataset_split.py 相同的取整方式 (末个集合取余数), 但由种子决定
+            order = np.random.default_rng(seed).permutation(len(ds))
+            cuts = np.cumsum([int(len(ds) * r) for r in ratios[:-1]])
+            assignment = np.empty(len(ds), dtype=np.int64)
+            for k, part in enumerate(np.split(order, cuts)):
+                assignment[part] = k
+            mode = 'random'
+    assignment = np.asarray(assignment, dtype=np.int64)
+
+    kept = assignment >= 0
+    labeled = ds.labeled()
+    log_info(f"划分完成 ({mode}): {int(kept.sum())} 张图片")
+    for k, sp in enumerate(splits):
+        n = int((assignment == k).sum())
+        log_info(f"{sp}集: {n} 张图片 ({n / max(1, kept.sum()) * 100:.1f}%), 标签图片 {int(((assignment == k) & labeled).sum())}")
+    if indices.size:
+        counts = split_label_counts(indptr, indices, assignment, len(splits))
+        for class_id in np.flatnonzero(counts.sum(axis=1)).tolist():
+            row = [f"{sp}集{int(counts[class_id, k])}" for k, sp in enumerate(splits)]
+            log_info(f"类别 {class_id}: {', '.join(row)}, 总计{int(counts[class_id].sum())}")
+
+    if save_plan:
+        save_split_plan(save_plan, {sp: [s for s, a in zip(stems, assignment.tolist()) if a == k]
+                                    for k, sp in enumerate(splits)},
+                        meta={'tool': 'pipeline_runner', 'mode': mode, 'seed': seed,
+                              'ratios': dict(zip(splits, ratios)), 'names': ds.class_names})
+        log_info(f"已保存划分方案 -> {save_plan}")
+    ds.set_splits(splits, assignment)
+
+
+def stage_write(state, *, output, format=1, mode='copy', overwrite=False):
+    """物化 YOLO 数据集: 标签由内存中的数组生成, 图片按 mode 复制或链接, 同时写出类别文件与 data.yaml."""
+    from utils.yolo_utils import write_class_names
+    from yolo_dataset_split import (LINK_MODES, prepare_output_dirs, split_output_dirs, split_yaml_paths,
+                                    write_data_yaml)
+    if format not in YOLO_FORMATS:
+        raise PipelineError(f"format 应为 {', '.join(map(str, YOLO_FORMATS))} 之一, 当前为 {format}")
+    if mode not in LINK_MODES:
+        raise PipelineError(f"mode 应为 {', '.join(LINK_MODES)} 之一, 当前为 {mode}")
+    ds = state.dataset
+    out = _output_dir(output, overwrite)
+    if format in (1, 2):
+        prepare_output_dirs(str(out), ds.split_names, format)
+        dirs = [split_output_dirs(str(out), sp, format) for sp in ds.split_names]
+    else:
+        img_dir, lbl_dir = (out / 'images', out / 'labels') if format == 'standard' else (out, out)
+        img_dir.mkdir(exist_ok=True)
+        lbl_dir.mkdir(exist_ok=True)
+        dirs = [(str(img_dir), str(lbl_dir))] * len(ds.split_names)
+    groups = {}
+    for i, p in enumerate(ds.image_paths):
+        groups.setdefault(dirs[ds.split_of[i]][0], []).append(p)
+    _check_unique_names(groups)
+
+    labeled = ds.labeled()
+    jobs = []
+    with span('write'):
+        for i, src in enumerate(ds.image_paths):
+            img_dir, lbl_dir = dirs[ds.split_of[i]]
+            name = os.path.basename(src)
+            jobs.append((src, os.path.join(img_dir, name)))
+            if labeled[i]:
+                label_path = os.path.join(lbl_dir, os.path.splitext(name)[0] + '.txt')
+                with open(label_path, 'w', encoding='utf-8') as f:
+                    f.write(ds.label_text(i))
+                count_file(label_path)
+        fallback = _link_all(jobs, mode, state.workers)
+
+    names = ds.class_names
+    if not names and len(ds.boxes):
+        names = [f"Class_{i}" for i in range(int(ds.boxes[:, 0].max()) + 1)]
+    write_class_names(out / 'classes.txt', names)
+    if format in (1, 2):
+        write_data_yaml(str(out), names, split_yaml_paths(format, ds.split_names))
+    bad_lines = sum(len(v) for issues in ds.issues.values() for code, v in issues.items() if code != 'read_error')
+    if bad_lines:
+        log_warn(f"{bad_lines} 行格式错误的标注未写出 (可用 analyze 阶段的 validate 定位)")
+    if fallback:
+        log_warn(f"{fallback} 张图片无法硬链接 (可能跨文件系统), 已改为复制")
+    log_info(f"已写出 YOLO 数据集 -> {out}: {len(ds)} 张图片, 标签 {int(labeled.sum())} 个, "
+             f"标注 {len(ds.boxes)} 个 ({', '.join(f'{sp} {int((ds.split_of == k).sum())}' for k, sp in enumerate(ds.split_names))})")
+
+
+def stage_view(state, *, export, grid='4x4', tile_size=256, format='jpg', quality=90, max_images=None,
+               filter_classes=None):
+    """拼图导出 (与 yolo_dataset_viewer.py --export 相同), 标注直接取自内存."""
+    import numpy as np
+    from yolo_dataset_viewer import export_mosaic_items
+    ds = state.dataset
+    indices = range(len(ds))
+    if filter_classes:
+        lower = {n.lower(): i for i, n in enumerate(ds.class_names)}
+        targets = {int(c) if str(c).isdigit() else lower.get(str(c).lower(), -1) for c in filter_classes}
+        hit = set(ds.owner()[np.isin(ds.boxes[:, 0], list(targets))].tolist())
+        indices = [i for i in indices if i in hit]
+        if not indices:
+            log_warn(f"没有包含类别 {filter_classes} 的图片, 跳过拼图导出")
+            return
+        log_info(f"按类别筛选: {filter_classes}, 共 {len(indices)} 张图片")
+    if max_images:
+        indices = list(indices)[:max_images]
+    items = []
+    for i in indices:
+        items.append({
+            'set_name': ds.split_names[ds.split_of[i]],
+            'image_path': ds.image_paths[i],
+            'label_path': ds.label_paths[i] or '',
+            'annotations': [{'class_id': int(c), 'x_center': x, 'y_center': y, 'width': w, 'height': h}
+                            for c, x, y, w, h in ds.image_boxes(i).tolist()],
+        })
+    export_mosaic_items(items, _class_names_dict(ds), export, Path(ds.root).name, filter_classes, grid, tile_size,
+                        format, quality, None, state.workers)
+
+
+def stage_yolo2coco(state, *, output=None):
+    """在内存中转换为 COCO (按分割); 指定 output 时写出 <output>/<split>.json (单分割为 annotations.json)."""
+    from utils.dataset_model import read_image_sizes, to_coco
+    from yolo2coco import save_coco
+    ds = state.dataset
+    todo = [p for p in ds.image_paths if p not in state.image_sizes]
+    if todo:
+        with span('decode'):
+            state.image_sizes.update(zip(todo, read_image_sizes(todo, state.workers)))
+            count('files', len(todo))
+    with span('convert'):
+        state.coco, state.coco_sources = to_coco(ds, [state.image_sizes[p] for p in ds.image_paths])
+    for split, coco in state.coco.items():
+        log_info(f"{split}: {len(coco['images'])} 张图片, {len(coco['annotations'])} 个标注, "
+                 f"{len(coco['categories'])} 个类别")
+    if output:
+        for split, coco in state.coco.items():
+            name = 'annotations' if len(state.coco) == 1 else split
+            save_coco(coco, os.path.join(output, f'{name}.json'))
+
+
+def stage_coco_split(state, *, ratios=(0.8, 0.1, 0.1), seed=42, group_regex=None, group_csv=None, output=None,
+                     mode='copy', overwrite=False, save_plan=None):
+    """合并各分割后按类别分层重新划分 COCO (与 coco_dataset_split.py 相同); 指定 output 时写出划分结果."""
+    from utils.split_utils import save_split_plan
+    from coco_dataset_split import (SPLIT_NAMES, compute_group_keys, create_split_coco_data, plan_key,
+                                    print_split_statistics, stratified_split_images)
+    if len(ratios) != 3:
+        raise PipelineError("coco-split 的 ratios 应为 3 个比例 (train/val/test)")
+    _split_names(ratios)
+    first = next(iter(state.coco.values()))
+    merged = {'info': {'description': 'pipeline_runner'}, 'licenses': [], 'categories': first['categories'],
+              'images': [img for coco in state.coco.values() for img in coco['images']],
+              'annotations': [ann for coco in state.coco.values() for ann in coco['annotations']]}
+    sources = {i: p for src in state.coco_sources.values() for i, p in src.items()}
+    with span('assign'):
+        splits = stratified_split_images(merged, *ratios, random_state=seed,
+                                         group_keys=compute_group_keys(merged, group_regex, group_csv))
+    print_split_statistics(splits, merged, dict(zip(SPLIT_NAMES, ratios)))
+    # create_split_coco_data 会改写 info, 每个分割传入独立的副本
+    state.coco = {name: create_split_coco_data(dict(merged, info=dict(merged['info'])), ids, name)
+                  for name, ids in splits.items() if ids}
+    state.coco_sources = {name: {i: sources[i] for i in ids} for name, ids in splits.items() if ids}
+
+    if output:
+        from yolo_dataset_split import LINK_MODES
+        if mode not in LINK_MODES:
+            raise PipelineError(f"mode 应为 {', '.join(LINK_MODES)} 之一, 当前为 {mode}")
+        out = _output_dir(output, overwrite)
+        _check_unique_names({name: list(src.values()) for name, src in state.coco_sources.items()})
+        jobs = []
+        with span('write'):
+            for name, coco in state.coco.items():
+                images_dir = out / name / 'images'
+                images_dir.mkdir(parents=True, exist_ok=True)
+                ann_path = out / name / 'annotations.json'
+                with open(ann_path, 'w', encoding='utf-8') as f:
+                    json.dump(coco, f, indent=2, ensure_ascii=False)
+                count_file(ann_path)
+                jobs += [(state.coco_sources[name][img['id']], str(images_dir / img['file_name']))
+                         for img in coco['images']]
+            _link_all(jobs, mode, state.workers)
+        cats = sorted(first['categories'], key=lambda c: c['id'])
+        with open(out / 'classes.txt', 'w', encoding='utf-8') as f:
+            f.write(''.join(f"{c['name']}\n" for c in cats))
+        log_info(f"已写出 COCO 划分结果 -> {out}")
+    if save_plan:
+        file_names = {img['id']: img['file_name'] for img in merged['images']}
+        save_split_plan(save_plan, {name: [plan_key(file_names[i]) for i in ids] for name, ids in splits.items() if ids},
+                        meta={'tool': 'pipeline_runner', 'mode': 'group' if (group_regex or group_csv) else 'stratify',
+                              'seed': seed, 'ratios': dict(zip(SPLIT_NAMES, ratios)),
+                              'names': [c['name'] for c in sorted(first['categories'], key=lambda c: c['id'])]})
+        log_info(f"已保存划分方案 -> {save_plan}")
+
+
+def stage_coco_analyze(state, *, stats=False, geometry=False):
+    """分析内存中的 COCO 数据 (与 coco_dataset_analyzer.py 相同, 不检查图片文件)."""
+    from coco_dataset_analyzer import analyze_coco_items, iter_coco_dict, print_coco_report
+    all_stats = {}
+    for split, coco in state.coco.items():
+        all_stats[split] = analyze_coco_items(iter_coco_dict(coco), check_files=False, geometry=geometry)
+        count('boxes', all_stats[split]['annotations'])
+    print_coco_report(all_stats, stats, geometry, check_files=False)
+
+
+# 阶段名 -> (函数, 是否需要先执行 yolo2coco, 说明)
+STAGES = {
+    'analyze': (stage_analyze, False, 'YOLO 统计/几何/校验/图片完整性'),
+    'classes': (stage_classes, False, '删除/重命名/重排类别'),
+    'split': (stage_split, False, '重新划分 (随机/分层/分组/方案)'),
+    'write': (stage_write, False, '写出 YOLO 数据集 (format 1/2/standard/mixed)'),
+    'view': (stage_view, False, '拼图导出'),
+    'yolo2coco': (stage_yolo2coco, False, 'YOLO -> COCO (内存, 可选写出 JSON)'),
+    'coco-split': (stage_coco_split, True, 'COCO 分层重新划分 (可选写出)'),
+    'coco-analyze': (stage_coco_analyze, True, 'COCO 统计'),
+}
+
+
+# 参数类型检查: 每个检查函数返回规整后的值, 类型或取值不符时抛出 ValueError (说明不含阶段名)
+def _is_int(v):
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _is_number(v):
+    return _is_int(v) or isinstance(v, float)
+
+
+def _bool(v):
+    if not isinstance(v, bool):
+        raise ValueError(f"应为 true/false, 当前为 {v!r}")
+    return v
+
+
+def _check_range(v, minimum, maximum):
+    if minimum is not None and maximum is not None and not minimum <= v <= maximum:
+        raise ValueError(f"应在 {minimum}-{maximum} 之间, 当前为 {v}")
+    if minimum is not None and v < minimum:
+        raise ValueError(f"应 >= {minimum}, 当前为 {v}")
+    if maximum is not None and v > maximum:
+        raise ValueError(f"应 <= {maximum}, 当前为 {v}")
+    return v
+
+
+def _int(minimum=None, maximum=None):
+    def check(v):
+        if not _is_int(v):
+            raise ValueError(f"应为整数, 当前为 {v!r}")
+        return _check_range(v, minimum, maximum)
+    return check
+
+
+def _number(minimum=None, maximum=None):
+    def check(v):
+        if not _is_number(v):
+            raise ValueError(f"应为数值, 当前为 {v!r}")
+        return _check_range(v, minimum, maximum)
+    return check
+
+
+def _str(v):
+    if not isinstance(v, str) or not v:
+        raise ValueError(f"应为非空字符串, 当前为 {v!r}")
+    return v
+
+
+def _regex(v):
+    import re
+    _str(v)
+    try:
+        re.compile(v)
+    except re.error as e:
+        raise ValueError(f"不是有效的正则表达式: {e}")
+    return v
+
+
+def _choice(*options):
+    def check(v):
+        if isinstance(v, bool) or v not in options:
+            raise ValueError(f"应为 {', '.join(map(str, options))} 之一, 当前为 {v!r}")
+        return v
+    return check
+
+
+def _link_mode(v):
+    from yolo_dataset_split import LINK_MODES
+    return _choice(*LINK_MODES)(v)
+
+
+def _list_of(item, what):
+    def check(v):
+        if not isinstance(v, (list, tuple)):
+            raise ValueError(f"应为{what}列表, 当前为 {v!r}")
+        try:
+            return [item(x) for x in v]
+        except ValueError:
+            raise ValueError(f"应为{what}列表, 当前为 {v!r}")
+    return check
+
+
+def _name(v):
+    """类别名称: 接受字符串或数字 (YAML 中未加引号的数字名称)."""
+    if isinstance(v, bool) or not isinstance(v, (str, int, float)):
+        raise ValueError(f"应为类别名称, 当前为 {v!r}")
+    return str(v)
+
+
+def _class_ref(v):
+    """类别ID或名称."""
+    return v if _is_int(v) else _name(v)
+
+
+def _rename_map(v):
+    if not isinstance(v, dict):
+        raise ValueError(f"应为 {{旧名称: 新名称}} 映射, 当前为 {v!r}")
+    return {_name(old): _name(new) for old, new in v.items()}
+
+
+def _ratios(count=None):
+    def check(v):
+        values = _list_of(_number(0, 1), '比例')(v)
+        if count is not None and len(values) != count:
+            raise ValueError(f"应为 {count} 个比例, 当前为 {values}")
+        try:
+            _split_names(values)
+        except PipelineError as e:
+            raise ValueError(str(e).removeprefix('ratios '))
+        return tuple(values)
+    return check
+
+
+def _grid(v):
+    from yolo_dataset_viewer import _parse_grid
+    if not isinstance(v, str):
+        raise ValueError(f"应为 '列x行' 字符串 (如 '4x4', 需加引号), 当前为 {v!r}")
+    _parse_grid(v)
+    return v
+
+
+def _tile_size(v):
+    from yolo_dataset_viewer import MIN_TILE_SIZE
+    return _int(MIN_TILE_SIZE)(v)
+
+
+# 阶段名 -> {参数名: 检查函数}; 默认值为 None 的参数也接受 null
+PARAM_TYPES = {
+    'analyze': {'stats': _bool, 'geometry': _bool, 'validate': _bool, 'check_images': _bool,
+                'num_classes': _int(1)},
+    'classes': {'delete': _list_of(_int(0), '类别ID'), 'min_samples': _int(0), 'min_percentage': _number(0, 100),
+                'rename': _rename_map, 'reindex': _list_of(_name, '类别名称'), 'strict': _bool},
+    'split': {'ratios': _ratios(), 'stratify': _bool, 'group_regex': _regex, 'group_csv': _str, 'seed': _int(),
+              'plan': _str, 'save_plan': _str},
+    'write': {'output': _str, 'format': _choice(*YOLO_FORMATS), 'mode': _link_mode, 'overwrite': _bool},
+    'view': {'export': _str, 'grid': _grid, 'tile_size': _tile_size, 'format': _choice('jpg', 'png'),
+             'quality': _int(1, 100), 'max_images': _int(1), 'filter_classes': _list_of(_class_ref, '类别ID或名称')},
+    'yolo2coco': {'output': _str},
+    'coco-split': {'ratios': _ratios(3), 'seed': _int(), 'group_regex': _regex, 'group_csv': _str, 'output': _str,
+                   'mode': _link_mode, 'overwrite': _bool, 'save_plan': _str},
+    'coco-analyze': {'stats': _bool, 'geometry': _bool},
+}
+
+
+def load_spec(config_path, input_override=None):
+    """读取并检查流水线配置, 返回 (输入目录, workers, [(阶段名, 参数), ...]); 配置错误时抛出 PipelineError."""
+    import yaml
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            spec = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        raise PipelineError(f"无法读取配置文件 {config_path}: {e}")
+    if not isinstance(spec, dict) or not isinstance(spec.get('stages'), list) or not spec['stages']:
+        raise PipelineError("配置应包含非空的 stages 列表")
+    input_dir = input_override or spec.get('input')
+    if not input_dir:
+        raise PipelineError("未指定输入数据集 (配置中的 input 或 --input)")
+    if not isinstance(input_dir, str):
+        raise PipelineError(f"input 应为目录路径, 当前为 {input_dir!r}")
+    workers = spec.get('workers')
+    if workers is not None and not (_is_int(workers) and workers >= 1):
+        raise PipelineError(f"workers 应为正整数, 当前为 {workers!r}")
+
+    stages = []
+    has_coco = False
+    for n, item in enumerate(spec['stages'], 1):
+        if isinstance(item, str):
+            name, params = item, {}
+        elif isinstance(item, dict) and len(item) == 1:
+            name, params = next(iter(item.items()))
+            params = params or {}
+        else:
+            raise PipelineError(f"第 {n} 个阶段格式错误, 应为 '- 阶段名' 或 '- 阶段名: {{参数}}'")
+        if name not in STAGES:
+            raise PipelineError(f"第 {n} 个阶段: 未知阶段 {name} (可用: {', '.join(STAGES)})")
+        if not isinstance(params, dict):
+            raise PipelineError(f"第 {n} 个阶段 {name}: 参数应为映射")
+        func, needs_coco, _desc = STAGES[name]
+        sig = inspect.signature(func)
+        accepted = [p for p in sig.parameters.values() if p.kind == p.KEYWORD_ONLY]
+        unknown = sorted(set(params) - {p.name for p in accepted})
+        if unknown:
+            raise PipelineError(f"第 {n} 个阶段 {name}: 未知参数 {unknown} (可用: {', '.join(p.name for p in accepted)})")
+        missing = [p.name for p in accepted if p.default is p.empty and p.name not in params]
+        if missing:
+            raise PipelineError(f"第 {n} 个阶段 {name}: 缺少必需参数 {missing}")
+        params = dict(params)
+        for p in accepted:
+            if p.name not in params or (params[p.name] is None and p.default is None):
+                continue
+            try:
+                params[p.name] = PARAM_TYPES[name][p.name](params[p.name])
+            except ValueError as e:
+                raise PipelineError(f"第 {n} 个阶段 {name}: 参数 {p.name} {e}")
+        if needs_coco and not has_coco:
+            raise PipelineError(f"第 {n} 个阶段 {name}: 需要先执行 yolo2coco 阶段")
+        has_coco = has_coco or name == 'yolo2coco'
+        stages.append((name, params))
+    return input_dir, workers, stages
+
+
+def load_dataset(input_dir, workers=None):
+    """检测结构并读取全部标签一次, 返回 YoloDataset."""
+    from utils.dataset_model import load_yolo_dataset
+    from utils.yolo_utils import discover_class_names
+    from yolo_dataset_analyzer import get_dataset_paths, load_class_names
+    structure, paths = get_dataset_paths(input_dir)
+    if not paths:
+        raise PipelineError(f"未找到有效的YOLO数据集结构: {input_dir}")
+    names, _src = discover_class_names(input_dir)
+    if not names:
+        loaded = load_class_names(input_dir)
+        names = [loaded[k] for k in sorted(loaded)]
+    log_info(f"检测到数据集结构: {structure}, 分割: {', '.join(sp for sp, _i, _l in paths)}, 类别 {len(names)} 个")
+    ds = load_yolo_dataset(input_dir, structure, paths, names, workers)
+    log_info(f"已载入 {len(ds)} 张图片, 标签文件 {int(ds.labeled().sum())} 个 (各读取一次), 标注 {len(ds.boxes)} 个")
+    return ds
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="声明式数据集准备流水线: 一次读取, 在内存中依次执行各阶段, 只在物化阶段写盘")
+    p.add_argument('-c', '--config', required=True, help='流水线配置文件 (YAML)')
+    p.add_argument('-i', '--input', default=None, help='输入 YOLO 数据集目录 (覆盖配置中的 input)')
+    p.add_argument('--workers', type=int, default=None, help='并行数 (覆盖配置中的 workers; 默认按 CPU 核数)')
+    p.add_argument('--dry-run', action='store_true', help='只检查配置并列出阶段, 不读取数据')
+    add_profile_args(p)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
+    try:
+        input_dir, workers, stages = load_spec(args.config, args.input)
+    except PipelineError as e:
+        log_error(str(e))
+        sys.exit(1)
+    workers = args.workers or workers
+    log_info(f"流水线: {args.config}, 输入 {input_dir}, 共 {len(stages)} 个阶段")
+    for n, (name, params) in enumerate(stages, 1):
+        log_info(f"  {n}. {name} {json.dumps(params, ensure_ascii=False) if params else ''}")
+    if args.dry_run:
+        log_info("[预览模式] 配置检查通过, 未执行")
+        return
+
+    started = time.perf_counter()
+    try:
+        with span('load'):
+            state = PipelineState(load_dataset(input_dir, workers), workers)
+        for n, (name, params) in enumerate(stages, 1):
+            log_info(f"===== [{n}/{len(stages)}] {name} =====")
+            t0 = time.perf_counter()
+            with span(name):
+                STAGES[name][0](state, **params)
+            log_info(f"阶段 {name} 完成, 用时 {time.perf_counter() - t0:.2f}s")
+    except (PipelineError, OSError) as e:
+        log_error(f"流水线中止: {e}")
+        sys.exit(1)
+    except (TypeError, ValueError) as e:
+        # 配置检查之外的意外错误, 仍按失败处理而不输出回溯
+        log_error(f"流水线中止: {type(e).__name__}: {e}")
+        sys.exit(1)
+    log_info(f"流水线完成: {len(stages)} 个阶段, 总用时 {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""标注框几何统计: 按类别的流式分位数草图与位置热力图 (全部向量化, 内存固定)."""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+GEOMETRY_METRICS = ('width', 'height', 'area', 'aspect')
+
+
+class ClassQuantileSketch:
+    """按类别分组的对数分桶分位数草图 (DDSketch 思路).
+
+    每个类别一行固定长度的桶计数, 分位数相对误差不超过 alpha;
+    内存只与类别数和桶数有关, 与样本量无关. 不大于 min_value 的值计入第 0 桶.
+    """
+
+    def __init__(self, alpha: float = 0.01, min_value: float = 1e-6, max_value: float = 1e6):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.num_buckets = int(math.ceil(math.log(max_value / min_value) / self._log_gamma)) + 2
+        self.counts = np.zeros((0, self.num_buckets), dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+
+    def _grow(self, num_classes: int) -> None:
+        if num_classes > self.counts.shape[0]:
+            extra = num_classes - self.counts.shape[0]
+            self.counts = np.vstack([self.counts, np.zeros((extra, self.num_buckets), dtype=np.int64)])
+            self.sums = np.concatenate([self.sums, np.zeros(extra)])
+
+    def add(self, class_idx: np.ndarray, values: np.ndarray) -> None:
+        """批量加入 (类别行号, 数值) 样本."""
+        if values.size == 0:
+            return
+        num_classes = int(class_idx.max()) + 1
+        self._grow(num_classes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            idx = np.ceil(np.log(np.maximum(values, self.min_value) / self.min_value) / self._log_gamma)
+        idx = np.clip(np.nan_to_num(idx, nan=0.0), 0, self.num_buckets - 1).astype(np.int64)
+        flat = np.bincount(class_idx * self.num_buckets + idx, minlength=num_classes * self.num_buckets)
+        self.counts[:num_classes] += flat.reshape(num_classes, self.num_buckets)
+        self.sums[:num_classes] += np.bincount(class_idx, weights=values, minlength=num_classes)
+
+    def count(self, row: int) -> int:
+        return int(self.counts[row].sum()) if row < self.counts.shape[0] else 0
+
+    def mean(self, row: int) -> float:
+        n = self.count(row)
+        return float(self.sums[row] / n) if n else float('nan')
+
+    def quantiles(self, row: int, qs) -> list[float]:
+        """返回某类别的若干分位数估计 (桶的几何中点)."""
+        n = self.count(row)
+        if n == 0:
+            return [float('nan')] * len(qs)
+        cum = np.cumsum(self.counts[row])
+        res = []
+        for q in qs:
+            b = int(np.searchsorted(cum, q * (n - 1) + 1))
+            if b == 0:
+                res.append(self.min_value)
+            else:
+                res.append(self.min_value * self.gamma ** (b - 0.5))
+        return res
+
+
+class GeometryAccumulator:
+    """按类别累计框宽/高/面积/宽高比分布与中心点位置热力图.
+
+    add() 只缓存数组, 缓存框数超过 buffer_size 时批量 flush, 每次 flush 全部向量化,
+    因此单文件开销极小, 总内存受 buffer_size 与类别数约束.
+    """
+
+    def __init__(self, bins: int = 32, buffer_size: int = 1_000_000, alpha: float = 0.01):
+        self.bins = bins
+        self.buffer_size = buffer_size
+        self.sketches = {m: ClassQuantileSketch(alpha=alpha) for m in GEOMETRY_METRICS}
+        self.heatmaps = np.zeros((0, bins, bins), dtype=np.int64)
+        self.class_ids: list[int] = []
+        self._class_row: dict[int, int] = {}
+        self._buffer: list[np.ndarray] = []
+        self._buffered = 0
+        self.invalid = 0
+
+    def add(self, boxes: np.ndarray) -> None:
+        """加入单个标签文件的 (N, 5) 框数组 [cls, cx, cy, w, h]."""
+        if boxes.size == 0:
+            return
+        self._buffer.append(boxes)
+        self._buffered += len(boxes)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def _rows_for(self, class_ids: np.ndarray) -> np.ndarray:
+        uniq, inverse = np.unique(class_ids, return_inverse=True)
+        for cid in uniq.tolist():
+            if cid not in self._class_row:
+                self._class_row[cid] = len(self.class_ids)
+                self.class_ids.append(cid)
+        lookup = np.array([self._class_row[c] for c in uniq.tolist()], dtype=np.int64)
+        return lookup[inverse]
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        boxes = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+
+        cx, cy, w, h = boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
+        valid = (w > 0) & (h > 0) & np.isfinite(boxes).all(axis=1)
+        self.invalid += int((~valid).sum())
+        if not valid.any():
+            return
+        boxes = boxes[valid]
+        cx, cy, w, h = boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
+        rows = self._rows_for(boxes[:, 0].astype(np.int64))
+
+        self.sketches['width'].add(rows, w)
+        self.sketches['height'].add(rows, h)
+        self.sketches['area'].add(rows, w * h)
+        self.sketches['aspect'].add(rows, w / h)
+
+        num_classes = len(self.class_ids)
+        if num_classes > self.heatmaps.shape[0]:
+            extra = num_classes - self.heatmaps.shape[0]
+            self.heatmaps = np.concatenate([self.heatmaps, np.zeros((extra, self.bins, self.bins), dtype=np.int64)])
+        # 等价于逐类别 np.histogram2d(cy, cx, bins, range=[[0,1],[0,1]]), 用单次 bincount 合并完成
+        iy = np.clip((cy * self.bins).astype(np.int64), 0, self.bins - 1)
+        ix = np.clip((cx * self.bins).astype(np.int64), 0, self.bins - 1)
+        flat = np.bincount((rows * self.bins + iy) * self.bins + ix, minlength=num_classes * self.bins * self.bins)
+        self.heatmaps[:num_classes] += flat.reshape(num_classes, self.bins, self.bins)
+
+    def summary(self, qs=(0.05, 0.5, 0.95)) -> dict[int, dict]:
+        """返回 {class_id: {'count': n, metric: {'mean': m, 'q': [..]}}}."""
+        self.flush()
+        res = {}
+        for cid, row in sorted(self._class_row.items()):
+            item = {'count': self.sketches['width'].count(row)}
+            for m in GEOMETRY_METRICS:
+                sk = self.sketches[m]
+                item[m] = {'mean': sk.mean(row), 'q': sk.quantiles(row, qs)}
+            res[cid] = item
+        return res
+
+    def heatmap(self, class_id: int | None = None) -> np.ndarray:
+        """返回某类别 (None 为全部类别合计) 的中心点热力图, 形状 (bins, bins), 行为 y 列为 x."""
+        self.flush()
+        if class_id is None:
+            return self.heatmaps.sum(axis=0) if len(self.heatmaps) else np.zeros((self.bins, self.bins), dtype=np.int64)
+        row = self._class_row.get(class_id)
+        return self.heatmaps[row] if row is not None else np.zeros((self.bins, self.bins), dtype=np.int64)
+
+    def save_npz(self, path, qs=(0.05, 0.25, 0.5, 0.75, 0.95)) -> None:
+        """保存各类别热力图与分位数到 npz 文件."""
+        summary = self.summary(qs)
+        arrays = {
+            'class_ids': np.array(self.class_ids, dtype=np.int64),
+            'heatmaps': self.heatmaps,
+            'quantile_levels': np.array(qs, dtype=np.float64),
+        }
+        for m in GEOMETRY_METRICS:
+            arrays[f'{m}_quantiles'] = np.array([summary[c][m]['q'] for c in self.class_ids], dtype=np.float64).reshape(-1, len(qs))
+            arrays[f'{m}_mean'] = np.array([summary[c][m]['mean'] for c in self.class_ids], dtype=np.float64)
+        np.savez_compressed(path, **arrays)
+
+
+def render_ascii_heatmap(grid: np.ndarray, size: int = 16) -> list[str]:
+    """把热力图降采样为 size x size 的字符画 (密度由低到高: ' .:-=+*#%@')."""
+    shades = ' .:-=+*#%@'
+    bins = grid.shape[0]
+    step = max(1, bins // size)
+    n = bins // step
+    coarse = grid[:n * step, :n * step].reshape(n, step, n, step).sum(axis=(1, 3))
+    peak = coarse.max()
+    if peak == 0:
+        return []
+    levels = np.minimum((coarse / peak * (len(shades) - 1)).round().astype(int), len(shades) - 1)
+    return ['|' + ''.join(shades[v] * 2 for v in row) + '|' for row in levels]
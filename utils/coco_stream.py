@@ -0,0 +1,187 @@
+"""COCO JSON 流式读取: 逐个产出顶层数组 (images / annotations / categories ...) 的元素.
+
+只缓冲当前正在解析的元素, 内存与单个元素大小相关而与文件总大小无关,
+可用于统计数 GB 的标注文件. 解析基于 json.JSONDecoder.raw_decode, 不依赖第三方库.
+
+CocoStreamWriter 是对应的流式写出: 逐条写入 images / annotations, 内存与总条目数无关.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+COCO_SECTIONS = ('images', 'annotations', 'categories')
+_WS = ' \t\n\r'
+
+
+class CocoStreamError(ValueError):
+    """COCO 文件不是以对象为顶层的合法 JSON."""
+
+
+class _BufferedReader:
+    """分块读取文本并维护解析位置, 已消费的前缀会被定期丢弃."""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """追加读取一块, 返回是否读到新数据."""
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        if self.pos > len(self.buf) // 2:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += data
+        return True
+
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符 (文件结束时返回空串)."""
+        while True:
+            buf, n = self.buf, len(self.buf)
+            pos = self.pos
+            while pos < n and buf[pos] in _WS:
+                pos += 1
+            self.pos = pos
+            if pos < n:
+                return buf[pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise CocoStreamError(f"期望 '{ch}', 实际为 '{got or 'EOF'}' (偏移 {self.pos})")
+        self.pos += 1
+
+    def decode(self, decoder: json.JSONDecoder):
+        """解析下一个完整 JSON 值; 缓冲不足时继续读取后重试."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # 值恰好结束在缓冲末尾时 (如被截断的数字) 需要确认后面没有更多内容
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_coco_sections(path: str | Path, sections: Iterable[str] | None = COCO_SECTIONS,
+                       chunk_size: int = 1 << 22) -> Iterator[Tuple[str, object]]:
+    """按文件顺序产出 (顶层键, 元素).
+
+    顶层值为数组且键在 sections 中时, 逐个产出数组元素; 其他数组逐个解析后丢弃,
+    不会整体驻留内存. 非数组的顶层值 (如 info) 以 (键, 值) 形式整体产出.
+    sections 为 None 时产出全部顶层数组的元素.
+
+    注意: COCO 规范不保证 images 在 annotations 之前, 调用方不应依赖顺序.
+    """
+    wanted = None if sections is None else set(sections)
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        r = _BufferedReader(f, chunk_size)
+        r.expect('{')
+        if r.peek() == '}':
+            return
+        while True:
+            key = r.decode(decoder)
+            if not isinstance(key, str):
+                raise CocoStreamError(f"顶层键必须为字符串 (偏移 {r.pos})")
+            r.expect(':')
+            if r.peek() == '[':
+                r.pos += 1
+                emit = wanted is None or key in wanted
+                if r.peek() == ']':
+                    r.pos += 1
+                else:
+                    while True:
+                        item = r.decode(decoder)
+                        if emit:
+                            yield key, item
+                        sep = r.peek()
+                        r.pos += 1
+                        if sep == ']':
+                            break
+                        if sep != ',':
+                            raise CocoStreamError(f"数组 '{key}' 中期望 ',' 或 ']' (偏移 {r.pos - 1})")
+            else:
+                yield key, r.decode(decoder)
+            sep = r.peek()
+            r.pos += 1
+            if sep == '}':
+                return
+            if sep != ',':
+                raise CocoStreamError(f"顶层对象中期望 ',' 或 '}}' (偏移 {r.pos - 1})")
+
+
+class CocoStreamWriter:
+    """流式写出 COCO JSON.
+
+    images 直接写入目标文件的临时副本, annotations 先写入同目录的临时文件, finish() 时
+    拼接两者并写入 categories (可在写出过程中动态确定), 最后原子替换为目标文件.
+    未调用 finish() 就退出 with 块时 (如发生异常) 删除临时文件, 不留下半截 JSON.
+    """
+
+    def __init__(self, path: str | Path, info: dict | None = None, licenses: list | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._main_path = self.path.with_name(self.path.name + '.part')
+        self._ann_path = self.path.with_name(self.path.name + '.ann.part')
+        self._main = open(self._main_path, 'w', encoding='utf-8')
+        self._ann = open(self._ann_path, 'w+', encoding='utf-8')
+        self.num_images = 0
+        self.num_annotations = 0
+        self._main.write('{"info": ' + json.dumps(info or {}, ensure_ascii=False) +
+                         ', "licenses": ' + json.dumps(licenses or [], ensure_ascii=False) + ', "images": [')
+
+    def add_image(self, image: dict) -> None:
+        self._main.write((',' if self.num_images else '') + json.dumps(image, ensure_ascii=False))
+        self.num_images += 1
+
+    def add_annotation(self, annotation: dict) -> None:
+        self._ann.write((',' if self.num_annotations else '') + json.dumps(annotation, ensure_ascii=False))
+        self.num_annotations += 1
+
+    def finish(self, categories: List[dict]) -> Path:
+        """写入 annotations 与 categories 并生成目标文件, 返回其路径."""
+        self._main.write('], "annotations": [')
+        self._ann.seek(0)
+        shutil.copyfileobj(self._ann, self._main, 1 << 20)
+        self._main.write('], "categories": ' + json.dumps(categories, ensure_ascii=False) + '}')
+        self._close_files()
+        os.replace(self._main_path, self.path)
+        os.remove(self._ann_path)
+        return self.path
+
+    def abort(self) -> None:
+        self._close_files()
+        for p in (self._main_path, self._ann_path):
+            if p.exists():
+                p.unlink()
+
+    def _close_files(self) -> None:
+        for f in (self._main, self._ann):
+            if not f.closed:
+                f.close()
+
+    def __enter__(self) -> 'CocoStreamWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self._main.closed:
+            self.abort()
@@ -0,0 +1,157 @@
+"""数据集指纹与分析报告缓存.
+
+指纹只依赖目录扫描得到的 (相对路径, 大小, mtime), 不读取文件内容, 用于判断数据集是否变化.
+各工具的默认缓存目录位于用户缓存目录下 (default_cache_dir), 不写入数据集目录.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from utils.logging_utils import log_warn
+
+
+def _scan_entries(directory: str | Path) -> List[Tuple[str, int, int]]:
+    """扫描单层目录内的文件, 返回排序后的 (文件名, 大小, mtime_ns) 列表."""
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for e in it:
+                if e.is_file():
+                    st = e.stat()
+                    entries.append((e.name, st.st_size, st.st_mtime_ns))
+    except OSError:
+        pass
+    entries.sort()
+    return entries
+
+
+def default_cache_dir(dataset_dir: str | Path, tool: str) -> Path:
+    """返回某工具对某数据集的默认缓存目录: <用户缓存目录>/medds/<tool>/<数据集名>-<路径哈希>.
+
+    用户缓存目录依次取 MEDDS_CACHE_DIR, XDG_CACHE_HOME, LOCALAPPDATA, ~/.cache;
+    缓存放在数据集之外, 复制/转换/划分数据集时不会被一并带走.
+    """
+    resolved = Path(dataset_dir).resolve()
+    base = os.environ.get('MEDDS_CACHE_DIR')
+    if base:
+        base = Path(base)
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA')
+                    or Path.home() / '.cache') / 'medds'
+    key = hashlib.sha1(str(resolved).encode('utf-8', 'surrogateescape')).hexdigest()[:12]
+    return base / tool / f"{resolved.name or 'root'}-{key}"
+
+
+def dataset_fingerprint(dirs: Iterable[Tuple[str, str | Path]], options: dict | None = None) -> str:
+    """根据若干 (标识, 目录) 中全部文件的名称/大小/mtime 与选项计算 sha1 指纹.
+
+    同一目录出现多次 (如混合结构 images == labels) 只扫描一次.
+    """
+    h = hashlib.sha1()
+    seen = set()
+    for tag, directory in dirs:
+        key = os.path.abspath(str(directory))
+        if key in seen:
+            continue
+        seen.add(key)
+        h.update(f"[{tag}]\n".encode('utf-8'))
+        for name, size, mtime in _scan_entries(directory):
+            h.update(f"{name}\t{size}\t{mtime}\n".encode('utf-8', 'surrogateescape'))
+    if options:
+        h.update(json.dumps(options, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+
+def write_table(rows: list[dict], path_stem: str | Path) -> str:
+    """把逐行记录写为 Parquet (需 pandas + pyarrow); 不可用时退化为 CSV. 返回实际写出的路径."""
+    path_stem = Path(path_stem)
+    try:
+        import pandas as pd
+        df = pd.DataFrame(rows)
+        try:
+            out = path_stem.with_suffix('.parquet')
+            df.to_parquet(out, index=False)
+            return str(out)
+        except ImportError:
+            out = path_stem.with_suffix('.csv')
+            log_warn("未安装 pyarrow/fastparquet, 逐图表格退化为 CSV")
+            df.to_csv(out, index=False)
+            return str(out)
+    except ImportError:
+        import csv
+        out = path_stem.with_suffix('.csv')
+        log_warn("未安装 pandas, 逐图表格退化为 CSV")
+        with open(out, 'w', encoding='utf-8', newline='') as f:
+            if rows:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+        return str(out)
+
+
+class ReportCache:
+    """按指纹存放的分析报告缓存: <cache_dir>/<fingerprint>/report.json + 附带文件."""
+
+    REPORT_NAME = 'report.json'
+
+    def __init__(self, cache_dir: str | Path, keep: int = 5):
+        self.cache_dir = Path(cache_dir)
+        self.keep = keep
+
+    def entry_dir(self, fingerprint: str) -> Path:
+        return self.cache_dir / fingerprint
+
+    def load(self, fingerprint: str) -> dict | None:
+        """读取缓存报告, 不存在或损坏时返回 None."""
+        p = self.entry_dir(fingerprint) / self.REPORT_NAME
+        if not p.is_file():
+            return None
+        try:
+            with open(p, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return report if report.get('fingerprint') == fingerprint else None
+
+    def save(self, fingerprint: str, report: dict, rows: list[dict] | None = None) -> Path:
+        """写入报告 JSON 与逐图表格, 并清理超出保留数量的旧缓存."""
+        d = self.entry_dir(fingerprint)
+        if d.exists():
+            shutil.rmtree(d, ignore_errors=True)
+        d.mkdir(parents=True, exist_ok=True)
+        if rows is not None:
+            report['images_table'] = Path(write_table(rows, d / 'images')).name
+        tmp = d / (self.REPORT_NAME + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, d / self.REPORT_NAME)
+        self._prune(exclude=fingerprint)
+        return d
+
+    def export(self, fingerprint: str, out_dir: str | Path) -> None:
+        """把缓存条目中的全部文件复制到 out_dir."""
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        src = self.entry_dir(fingerprint)
+        for p in src.iterdir():
+            if p.is_file() and not p.name.endswith('.tmp'):
+                shutil.copy2(p, out / p.name)
+
+    def _prune(self, exclude: str) -> None:
+        try:
+            entries = [p for p in self.cache_dir.iterdir() if p.is_dir() and p.name != exclude]
+        except OSError:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for p in entries[max(0, self.keep - 1):]:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+def now_iso() -> str:
+    return datetime.now().isoformat(timespec='seconds')
@@ -0,0 +1,375 @@
+"""内存中的 YOLO 数据集模型 (pipeline_runner.py 在各阶段之间传递).
+
+load_yolo_dataset 只读取每个标签文件一次, 结果以列式保存: 图片按 (分割, 文件名) 排序,
+第 i 张图片的框为 boxes[offsets[i]:offsets[i + 1]] ([cls, cx, cy, w, h], 与 read_yolo_boxes 相同),
+lines 记录每个框在源文件中的行号, 格式错误的行 (字段不足/非数值) 记入 issues 而不进入 boxes.
+删除/重排类别、重新划分只修改数组; 写出 YOLO 目录或转换 COCO 时直接由数组生成, 不回读标签.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+from utils.label_validation import (MAX_LINES_PER_CODE, add_file_errors, check_label_array, parse_label_lines,
+                                    validate_label_files)
+from utils.manifest import list_dir
+from utils.yolo_utils import CLASS_FILES, YAML_FILES, get_image_extensions
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 进程池每个任务读取的标签文件数
+_CHUNK_SIZE = 256
+
+
+class YoloDataset:
+    """一个 YOLO 数据集的全部图片与标注 (列式存储).
+
+    属性:
+        class_names: 类别名列表 (下标即类别ID, 未找到类别文件时为空)
+        split_names: 分割名列表, split_of[i] 为第 i 张图片所属分割的下标
+        image_paths / label_paths: 源图片与源标签路径 (无标签时为 None)
+        offsets / boxes / lines: 框的 CSR 存储与源行号; line_count 为各标签文件的非空行数
+        issues: {图片下标: {错误码: [行号, ...]}}, 仅包含有格式问题或读取失败的文件
+        redundant: {分割名: [没有对应图片的标签路径, ...]}
+    """
+
+    def __init__(self, root: str, structure: str, class_names: List[str], split_names: List[str],
+                 image_paths: List[str], label_paths: List[str | None], split_of: np.ndarray,
+                 offsets: np.ndarray, boxes: np.ndarray, lines: np.ndarray, line_count: np.ndarray,
+                 issues: Dict[int, Dict[str, List[int]]] | None = None,
+                 redundant: Dict[str, List[str]] | None = None):
+        self.root = root
+        self.structure = structure
+        self.class_names = list(class_names)
+        self.split_names = list(split_names)
+        self.image_paths = image_paths
+        self.label_paths = label_paths
+        self.split_of = split_of
+        self.offsets = offsets
+        self.boxes = boxes
+        self.lines = lines
+        self.line_count = line_count
+        self.issues = issues or {}
+        self.redundant = redundant or {}
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+    def owner(self) -> np.ndarray:
+        """每个框所属图片的下标 (M,)."""
+        import numpy as np
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def image_boxes(self, i: int) -> np.ndarray:
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def labeled(self) -> np.ndarray:
+        """有标签文件的图片掩码 (框全部被删除的图片仍算有标签, 写出时为空标签文件)."""
+        import numpy as np
+        return np.array([p is not None for p in self.label_paths], dtype=bool)
+
+    def class_counts(self, image_mask: np.ndarray | None = None) -> Dict[int, int]:
+        """按类别统计框数 (image_mask 限定图片范围), 返回按ID排序的 {类别ID: 框数}."""
+        import numpy as np
+        cls = self.boxes[:, 0]
+        if image_mask is not None:
+            cls = cls[image_mask[self.owner()]]
+        ids, counts = np.unique(cls.astype(np.int64), return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+    def image_class_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """图片 x 类别 的 CSR (indptr, indices), 值为是否包含该类别; 负数类别ID不计入."""
+        from utils.split_utils import pairs_to_csr
+        cls = self.boxes[:, 0].astype('int64')
+        valid = cls >= 0
+        indptr, indices, _data = pairs_to_csr(self.owner()[valid], cls[valid], len(self), binary=True)
+        return indptr, indices
+
+    def remap_classes(self, old_to_new: Sequence[int], class_names: List[str]) -> Tuple[int, int]:
+        """按 old_to_new (旧ID -> 新ID, -1 为删除) 改写框的类别并替换类别名.
+
+        超出映射表范围或非整数的类别ID保持不变. 返回 (删除的框数, 改写的框数).
+        """
+        import numpy as np
+        table = np.asarray(old_to_new, dtype=np.int64)
+        cls = self.boxes[:, 0]
+        mapped = (cls >= 0) & (cls < len(table)) & (cls == np.floor(cls))
+        new_cls = cls.copy()
+        new_cls[mapped] = table[cls[mapped].astype(np.int64)]
+        drop = mapped & (new_cls < 0)
+        changed = int((~drop & (new_cls != cls)).sum())
+        boxes = self.boxes.copy()
+        boxes[:, 0] = new_cls
+        if drop.any():
+            keep = ~drop
+            self._set_offsets(np.bincount(self.owner()[keep], minlength=len(self)))
+            boxes, self.lines = boxes[keep], self.lines[keep]
+        self.boxes = boxes
+        self.class_names = list(class_names)
+        return int(drop.sum()), changed
+
+    def set_splits(self, split_names: Sequence[str], assignment: np.ndarray) -> None:
+        """重新划分: assignment[i] 为第 i 张图片的新分割下标, 负数表示丢弃该图片."""
+        import numpy as np
+        assignment = np.asarray(assignment, dtype=np.int64)
+        if (assignment < 0).any():
+            self.subset(assignment >= 0)
+            assignment = assignment[assignment >= 0]
+        self.split_names = list(split_names)
+        self.split_of = assignment.astype(np.int32)
+        # 冗余标签只属于源目录的分割
+        self.redundant = {}
+
+    def subset(self, keep: np.ndarray) -> None:
+        """只保留 keep 掩码为 True 的图片."""
+        import numpy as np
+        idx = np.flatnonzero(keep)
+        box_keep = keep[self.owner()]
+        self._set_offsets(np.diff(self.offsets)[idx])
+        self.boxes, self.lines = self.boxes[box_keep], self.lines[box_keep]
+        self.image_paths = [self.image_paths[i] for i in idx.tolist()]
+        self.label_paths = [self.label_paths[i] for i in idx.tolist()]
+        self.split_of = self.split_of[idx]
+        self.line_count = self.line_count[idx]
+        new_index = {old: new for new, old in enumerate(idx.tolist())}
+        self.issues = {new_index[i]: v for i, v in self.issues.items() if i in new_index}
+
+    def _set_offsets(self, per_image: np.ndarray) -> None:
+        import numpy as np
+        self.offsets = np.zeros(len(per_image) + 1, dtype=np.int64)
+        np.cumsum(per_image, out=self.offsets[1:])
+
+    def label_text(self, i: int) -> str:
+        """第 i 张图片的标签文件内容; 坐标按 repr 写出, 再次解析得到完全相同的浮点数."""
+        out = []
+        for c, x, y, w, h in self.image_boxes(i).tolist():
+            cls = str(int(c)) if c.is_integer() else repr(c)
+            out.append(f"{cls} {x!r} {y!r} {w!r} {h!r}\n")
+        return ''.join(out)
+
+    def validate(self, num_classes: int | None = None) -> Dict[str, dict]:
+        """在内存中校验全部标签, 返回与 validate_label_files 相同格式的 {分割: 校验汇总}.
+
+        格式错误来自加载时的解析结果, 取值检查对全部框一次完成 (重复行按文件判断);
+        冗余标签不在模型中, 单独读取校验.
+        """
+        import numpy as np
+        results: Dict[int, dict] = {}
+
+        def result_for(i: int) -> dict:
+            if i not in results:
+                results[i] = {'file': self.label_paths[i], 'lines': int(self.line_count[i]),
+                              'errors': {}, 'counts': {}}
+            return results[i]
+
+        for i, issues in self.issues.items():
+            for code, line_numbers in issues.items():
+                add_file_errors(result_for(i), code, line_numbers)
+        owner = self.owner()
+        for code, mask in check_label_array(self.boxes, num_classes, owner).items():
+            hit = np.flatnonzero(mask)
+            # 按 (图片, 行号) 排序后按图片切分, 每个文件保留行号最小的若干个
+            hit = hit[np.lexsort((self.lines[hit], owner[hit]))]
+            starts = np.flatnonzero(np.r_[True, owner[hit][1:] != owner[hit][:-1]])
+            for chunk in np.split(hit, starts[1:]):
+                res = result_for(int(owner[chunk[0]]))
+                res['counts'][code] = len(chunk)
+                res['errors'][code] = self.lines[chunk[:MAX_LINES_PER_CODE]].tolist()
+
+        labeled = self.labeled()
+        validation = {}
+        for k, split in enumerate(self.split_names):
+            mask = (self.split_of == k) & labeled
+            summary = validate_label_files(self.redundant.get(split, []), num_classes, workers=1)
+            summary['files'] += int(mask.sum())
+            summary['lines'] += int(self.line_count[mask].sum())
+            for i in sorted(results):
+                if not mask[i]:
+                    continue
+                summary['bad_files'].append(results[i])
+                for code, n in results[i]['counts'].items():
+                    summary['counts'][code] = summary['counts'].get(code, 0) + n
+            summary['bad_files'].sort(key=lambda r: r['file'])
+            validation[split] = summary
+        return validation
+
+
+def scan_split(img_dir: str, label_dir: str) -> Tuple[List[str], List[str | None], List[str]]:
+    """列出一个分割的图片 (排序) 与对应标签路径 (无标签为 None), 以及没有对应图片的冗余标签.
+
+    混合结构 (img_dir == label_dir) 下类别文件不作为标签.
+    """
+    img_exts = get_image_extensions()
+    mixed = img_dir == label_dir
+    label_names = set(list_dir(label_dir)) if os.path.isdir(label_dir) else set()
+    images, labels, stems = [], [], set()
+    for f in sorted(list_dir(img_dir)):
+        if Path(f).suffix.lower() not in img_exts:
+            continue
+        stem = Path(f).stem
+        stems.add(stem)
+        label_name = stem + '.txt'
+        label_path = os.path.join(label_dir, label_name)
+        images.append(os.path.join(img_dir, f))
+        if mixed and label_name in CLASS_FILES:
+            labels.append(None)
+        elif label_name in label_names or os.path.exists(label_path):
+            labels.append(label_path)
+        else:
+            labels.append(None)
+    redundant = sorted(os.path.join(label_dir, f) for f in label_names
+                       if f.endswith('.txt') and f not in CLASS_FILES and f not in YAML_FILES
+                       and f[:-4] not in stems)
+    return images, labels, redundant
+
+
+def _read_label_chunk(paths: List[str]) -> list:
+    """进程池任务: 读取并解析一批标签文件, 读取失败的文件为 None."""
+    out = []
+    for p in paths:
+        try:
+            with open(p, 'r', encoding='utf-8', errors='replace') as f:
+                raw = f.read().splitlines()
+        except OSError:
+            out.append(None)
+            continue
+        out.append(parse_label_lines(raw))
+    return out
+
+
+def load_yolo_dataset(root: str, structure: str, paths: List[Tuple[str, str, str]], class_names: List[str],
+                      workers: int | None = None) -> YoloDataset:
+    """读取数据集的全部标签 (每个文件一次) 构建 YoloDataset.
+
+    paths 为 [(分割名, 图片目录, 标签目录), ...] (yolo_dataset_analyzer.get_dataset_paths 的输出).
+    """
+    import numpy as np
+    from tqdm import tqdm
+    from utils.profiling import count, count_file, span
+
+    image_paths, label_paths, split_of, redundant = [], [], [], {}
+    with span('scan'):
+        for k, (split, img_dir, label_dir) in enumerate(paths):
+            images, labels, extra = scan_split(img_dir, label_dir)
+            image_paths += images
+            label_paths += labels
+            split_of += [k] * len(images)
+            if extra:
+                redundant[split] = extra
+
+    labeled = [i for i, p in enumerate(label_paths) if p is not None]
+    files = [label_paths[i] for i in labeled]
+    chunks = [files[i:i + _CHUNK_SIZE] for i in range(0, len(files), _CHUNK_SIZE)]
+    parsed = []
+    with span('parse'):
+        if workers == 1 or len(chunks) <= 1:
+            results = map(_read_label_chunk, chunks)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+            results = pool.map(_read_label_chunk, chunks)
+        try:
+            with tqdm(total=len(files), desc='读取标签', unit='个') as bar:
+                for chunk_result in results:
+                    parsed += chunk_result
+                    bar.update(len(chunk_result))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        for p in files:
+            count_file(p)
+
+    n = len(image_paths)
+    per_image = np.zeros(n, dtype=np.int64)
+    line_count = np.zeros(n, dtype=np.int32)
+    box_parts, line_parts, issues = [], [], {}
+    for i, res in zip(labeled, parsed):
+        if res is None:
+            issues[i] = {'read_error': [0]}
+            continue
+        arr, line_no, line_count[i], file_issues = res
+        per_image[i] = len(arr)
+        box_parts.append(arr)
+        line_parts.append(line_no)
+        if file_issues:
+            issues[i] = file_issues
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(per_image, out=offsets[1:])
+    boxes = np.concatenate(box_parts) if box_parts else np.empty((0, 5), dtype=np.float64)
+    lines = np.concatenate(line_parts) if line_parts else np.empty(0, dtype=np.int32)
+    count('boxes', len(boxes))
+    return YoloDataset(root, structure, class_names, [sp for sp, _img, _lbl in paths], image_paths, label_paths,
+                       np.array(split_of, dtype=np.int32), offsets, boxes, lines, line_count, issues, redundant)
+
+
+def read_image_sizes(paths: List[str], workers: int | None = None) -> List[Tuple[int, int] | None]:
+    """线程池并行读取图片尺寸 (宽, 高), 无法读取的图片为 None."""
+    import cv2
+    from tqdm import tqdm
+
+    def _size(p):
+        img = cv2.imread(p)
+        return None if img is None else (img.shape[1], img.shape[0])
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(tqdm(pool.map(_size, paths), total=len(paths), desc='读取图片尺寸', unit='张'))
+
+
+def to_coco(ds: YoloDataset, sizes: List[Tuple[int, int] | None]) -> Tuple[Dict[str, dict], Dict[str, Dict[int, str]]]:
+    """把数据集按分割转换为 COCO dict, 返回 ({分割: coco}, {分割: {image_id: 源图片路径}}).
+
+    image_id 为图片在模型中的下标, 标注ID全局连续, 因此各分割合并后仍不冲突;
+    无法读取尺寸的图片被跳过; 超出类别表的ID自动扩展 categories, 负数或非整数类别ID的框被跳过.
+    """
+    import numpy as np
+    from utils.logging_utils import log_warn
+
+    cls = ds.boxes[:, 0]
+    valid = (cls >= 0) & (cls == np.floor(cls))
+    num_categories = max(len(ds.class_names), int(cls[valid].max()) + 1 if valid.any() else 0)
+    categories = [{'id': i, 'name': ds.class_names[i] if i < len(ds.class_names) else f'class_{i}',
+                   'supercategory': 'object'} for i in range(num_categories)]
+    if (~valid).any():
+        log_warn(f"跳过 {int((~valid).sum())} 个类别ID为负数或非整数的标注")
+
+    wh = np.array([s if s is not None else (0, 0) for s in sizes], dtype=np.float64).reshape(-1, 2)
+    owner = ds.owner()
+    # 与 yolo2coco.convert_split 相同的换算顺序, 结果逐位一致
+    x1 = ((ds.boxes[:, 1] - ds.boxes[:, 3] / 2.0) * wh[owner, 0]).tolist()
+    y1 = ((ds.boxes[:, 2] - ds.boxes[:, 4] / 2.0) * wh[owner, 1]).tolist()
+    bw = np.maximum(ds.boxes[:, 3] * wh[owner, 0], 0.0).tolist()
+    bh = np.maximum(ds.boxes[:, 4] * wh[owner, 1], 0.0).tolist()
+    cat_ids = cls.astype(np.int64).tolist()
+    valid = valid.tolist()
+
+    cocos, sources = {}, {}
+    for split in ds.split_names:
+        cocos[split] = {'info': {'description': f'YOLO->COCO 转换 ({split})'}, 'licenses': [],
+                        'categories': [dict(c) for c in categories], 'images': [], 'annotations': []}
+        sources[split] = {}
+    skipped = 0
+    ann_id = 0
+    for i, path in enumerate(ds.image_paths):
+        split = ds.split_names[ds.split_of[i]]
+        if sizes[i] is None:
+            skipped += 1
+            continue
+        coco = cocos[split]
+        coco['images'].append({'file_name': os.path.basename(path), 'id': i,
+                               'width': sizes[i][0], 'height': sizes[i][1]})
+        sources[split][i] = path
+        for j in range(ds.offsets[i], ds.offsets[i + 1]):
+            if not valid[j]:
+                continue
+            x, y, w, h = x1[j], y1[j], bw[j], bh[j]
+            coco['annotations'].append({
+                'id': ann_id, 'image_id': i, 'category_id': cat_ids[j], 'bbox': [x, y, w, h], 'area': w * h,
+                'iscrowd': 0, 'segmentation': [[x, y, x + w, y, x + w, y + h, x, y + h]],
+            })
+            ann_id += 1
+    if skipped:
+        log_warn(f"{skipped} 张图片无法读取, 已跳过")
+    return cocos, sources
@@ -0,0 +1,220 @@
+"""感知哈希 (pHash) 计算、磁盘缓存与近重复检索.
+
+检索采用多索引哈希 (multi-index hashing): 64 位哈希切成 ceil((threshold+1)/2) 段,
+汉明距离 <= threshold 的两个哈希必有一段相差不超过 1 位 (抽屉原理), 只需比较同桶与相邻桶候选, 避免 O(N^2).
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+HASH_BITS = 64
+
+
+def compute_phash(image_path: str) -> int | None:
+    """计算 64 位 DCT 感知哈希; 图片无法读取时返回 None."""
+    import numpy as np
+    import cv2
+    # 降采样解码即可满足 32x32 的 DCT 输入, 大图可显著减少解码耗时
+    img = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None or img.size == 0:
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None or img.size == 0:
+        return None
+    small = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    med = np.median(low[1:])
+    bits = (low > med).astype(np.uint8)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _hash_chunk(paths: List[str]) -> List[Tuple[str, int | None]]:
+    return [(p, compute_phash(p)) for p in paths]
+
+
+class HashCache:
+    """pHash 磁盘缓存 (sqlite), 以 路径 + mtime + 大小 作为有效性判断."""
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS phash (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT)')
+
+    def lookup(self, items: Iterable[Tuple[str, int, int]]) -> Dict[str, int]:
+        """items 为 (路径, 大小, mtime_ns); 返回命中缓存的 {路径: 哈希}."""
+        rows = dict((p, (sz, mt, h)) for p, sz, mt, h in self.conn.execute('SELECT path, size, mtime, hash FROM phash'))
+        hits = {}
+        for path, size, mtime in items:
+            r = rows.get(path)
+            if r is not None and r[0] == size and r[1] == mtime:
+                hits[path] = int(r[2], 16)
+        return hits
+
+    def store(self, entries: Iterable[Tuple[str, int, int, int]]) -> None:
+        self.conn.executemany('INSERT OR REPLACE INTO phash VALUES (?, ?, ?, ?)',
+                              ((p, sz, mt, format(h, '016x')) for p, sz, mt, h in entries))
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def hash_images(paths: List[str], cache: HashCache | None = None, workers: int | None = None,
+                chunk_size: int = 128, progress_desc: str | None = None) -> Tuple[Dict[str, int], List[str]]:
+    """计算一批图片的 pHash (命中缓存的跳过), 返回 ({路径: 哈希}, 读取失败的路径列表)."""
+    stats = {}
+    for p in paths:
+        try:
+            st = os.stat(p)
+            stats[p] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+    hashes = cache.lookup((p, sz, mt) for p, (sz, mt) in stats.items()) if cache else {}
+    todo = [p for p in stats if p not in hashes]
+    failed = [p for p in paths if p not in stats]
+    if todo:
+        chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        new_entries = []
+        if workers == 1 or len(chunks) == 1:
+            pool = None
+            results: Iterable = map(_hash_chunk, chunks)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+            results = pool.map(_hash_chunk, chunks)
+        if progress_desc:
+            from tqdm import tqdm
+            results = tqdm(results, total=len(chunks), desc=progress_desc)
+        try:
+            for chunk_res in results:
+                for p, h in chunk_res:
+                    if h is None:
+                        failed.append(p)
+                        continue
+                    hashes[p] = h
+                    new_entries.append((p, stats[p][0], stats[p][1], h))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if cache and new_entries:
+            cache.store(new_entries)
+    return hashes, failed
+
+
+def _popcount64(x: np.ndarray) -> np.ndarray:
+    import numpy as np
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+    lut = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return lut[np.ascontiguousarray(x, dtype=np.uint64).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _iter_bucket_pairs(sa: np.ndarray, la: np.ndarray, sb: np.ndarray, lb: np.ndarray,
+                       same: np.ndarray, max_pairs: int):
+    """按批展开 桶 A x 桶 B 的全部元素对, 逐批产出 (pos_a, pos_b) (排序后位置).
+
+    same 为 True 的是桶与自身比较, 每行只取其后的元素 (pos_a < pos_b); 按行切批, 每批约 max_pairs 对.
+    """
+    import numpy as np
+    pair = np.repeat(np.arange(len(la)), la)
+    row_pos = sa[pair] + np.arange(len(pair)) - np.repeat(np.cumsum(la) - la, la)
+    same = same[pair]
+    col_start = np.where(same, row_pos + 1, sb[pair])
+    row_len = np.where(same, sb[pair] + lb[pair] - row_pos - 1, lb[pair])
+    ends = np.cumsum(row_len)
+    batch = (ends - row_len) // max_pairs
+    cuts = np.flatnonzero(np.r_[True, batch[1:] != batch[:-1], True])
+    for r0, r1 in zip(cuts[:-1].tolist(), cuts[1:].tolist()):
+        rl = row_len[r0:r1]
+        total = int(ends[r1 - 1] - ends[r0] + rl[0])
+        if total == 0:
+            continue
+        col = np.arange(total) - np.repeat(np.cumsum(rl) - rl, rl)
+        yield np.repeat(row_pos[r0:r1], rl), np.repeat(col_start[r0:r1], rl) + col
+
+
+def find_near_duplicate_groups(hashes: List[int], threshold: int = 4,
+                               max_pairs: int = 1 << 20) -> List[List[int]]:
+    """返回汉明距离 <= threshold 的连通簇 (元素为 hashes 的下标, 仅包含大小 > 1 的簇).
+
+    64 位哈希切成 ceil((threshold+1)/2) 段, 距离 <= threshold 的两个哈希必有一段相差不超过 1 位;
+    每段只比较 同桶 与 相差一位的相邻桶, 候选对分批 (每批约 max_pairs 对) 异或 + popcount 校验后
+    直接并入并查集, 不保留候选列表. 相比 threshold+1 段精确匹配, 段更宽, 阈值较大时桶也不会退化.
+    """
+    import numpy as np
+    n = len(hashes)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[rj] = ri
+
+    # 1) 完全相同的哈希直接合并, 后续只在去重后的哈希上检索
+    first_of: Dict[int, int] = {}
+    for i, h in enumerate(hashes):
+        if h in first_of:
+            union(first_of[h], i)
+        else:
+            first_of[h] = i
+    uniq = list(first_of.keys())
+    uniq_idx = [first_of[h] for h in uniq]
+
+    # 2) 分段分桶: 同桶 + 相邻桶 (段内相差一位) 为候选
+    if threshold > 0 and len(uniq) > 1:
+        arr = np.array(uniq, dtype=np.uint64)
+        num_segments = min((threshold + 2) // 2, HASH_BITS)
+        bounds = np.linspace(0, HASH_BITS, num_segments + 1).astype(int).tolist()
+        masks = [np.uint64((1 << (hi - lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        for s in range(num_segments):
+            lo, width = bounds[s], bounds[s + 1] - bounds[s]
+            keys = (arr >> np.uint64(lo)) & masks[s]
+            order = np.argsort(keys, kind='stable')
+            ukeys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+            multi = counts > 1
+            sa, la, sb, lb = [starts[multi]], [counts[multi]], [starts[multi]], [counts[multi]]
+            same = [np.ones(int(multi.sum()), dtype=bool)]
+            for bit in range(width):
+                nb = ukeys ^ np.uint64(1 << bit)
+                src = np.flatnonzero(nb > ukeys)
+                pos = np.searchsorted(ukeys, nb[src])
+                ok = pos < len(ukeys)
+                ok[ok] = ukeys[pos[ok]] == nb[src[ok]]
+                src, pos = src[ok], pos[ok]
+                sa.append(starts[src])
+                la.append(counts[src])
+                sb.append(starts[pos])
+                lb.append(counts[pos])
+                same.append(np.zeros(len(src), dtype=bool))
+            sa, la, sb, lb, same = (np.concatenate(x) for x in (sa, la, sb, lb, same))
+            if not len(sa):
+                continue
+            sorted_arr = arr[order]
+            for pos_a, pos_b in _iter_bucket_pairs(sa, la, sb, lb, same, max_pairs):
+                xor = sorted_arr[pos_a] ^ sorted_arr[pos_b]
+                hit = _popcount64(xor) <= threshold
+                a, b, xor = order[pos_a[hit]], order[pos_b[hit]], xor[hit]
+                # 前面的段已是候选 (段内相差 <= 1 位) 的对已合并过, 跳过
+                for e in range(s):
+                    fresh = _popcount64((xor >> np.uint64(bounds[e])) & masks[e]) > 1
+                    a, b, xor = a[fresh], b[fresh], xor[fresh]
+                for i, j in zip(a.tolist(), b.tolist()):
+                    union(uniq_idx[i], uniq_idx[j])
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
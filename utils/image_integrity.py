@@ -0,0 +1,115 @@
+"""图片完整性快速检查: 先读文件头/尾标记判断, 仅对可疑文件做完整解码.
+
+JPEG 检查 SOI (FFD8FF) 与文件尾部的 EOI (FFD9); PNG 检查 8 字节签名与 IEND 块;
+BMP/WebP 检查头部记录的文件长度. 其余格式或头部无法识别时视为可疑, 交给 cv2 完整解码.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Tuple
+
+# 问题类型 -> 中文说明 (按输出顺序)
+INTEGRITY_CODES = {
+    'empty': '空文件',
+    'read_error': '文件读取失败',
+    'decode_failed': '无法解码',
+    'truncated': '文件被截断 (缺少结束标记)',
+    'bad_header': '文件头无法识别 (但可解码)',
+}
+# 只有这些问题会导致 cv2.imread 返回 None, 其余为警告
+FATAL_CODES = ('empty', 'read_error', 'decode_failed')
+
+_TAIL_BYTES = 4096
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_IEND = b'IEND\xaeB`\x82'
+
+
+def _check_markers(head: bytes, tail: bytes, size: int) -> str | None:
+    """根据头尾字节判断: None 为正常, 'truncated' 为缺少结束标记,
+    'unverifiable' 为格式已知但无结束标记可查 (如 TIFF), 'unknown' 为无法识别."""
+    if head[:3] == b'\xff\xd8\xff':
+        # 部分相机会在 EOI 之后追加填充字节, 因此在尾部窗口内查找
+        return None if b'\xff\xd9' in tail else 'truncated'
+    if head[:8] == _PNG_SIGNATURE:
+        return None if _PNG_IEND in tail else 'truncated'
+    if head[:2] == b'BM' and len(head) >= 6:
+        declared = int.from_bytes(head[2:6], 'little')
+        # 部分写入器把该字段写为 0, 此时无法判断
+        if declared == 0:
+            return 'unverifiable'
+        return None if size >= declared else 'truncated'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        declared = int.from_bytes(head[4:8], 'little') + 8
+        return None if size >= declared else 'truncated'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'unverifiable'
+    return 'unknown'
+
+
+def _full_decode_ok(image_path: str) -> bool:
+    import cv2
+    import numpy as np
+    try:
+        data = np.fromfile(image_path, dtype=np.uint8)
+    except OSError:
+        return False
+    if data.size == 0:
+        return False
+    img = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+    return img is not None and img.size > 0
+
+
+def check_image(image_path: str, full_decode: bool = False) -> Tuple[str, str | None]:
+    """检查单张图片, 返回 (路径, 问题类型或 None).
+
+    参数:
+        full_decode: 为 True 时对所有文件做完整解码 (慢, 用于复核)
+    """
+    try:
+        size = os.path.getsize(image_path)
+        if size == 0:
+            return image_path, 'empty'
+        with open(image_path, 'rb') as f:
+            head = f.read(32)
+            f.seek(max(0, size - _TAIL_BYTES))
+            tail = f.read(_TAIL_BYTES)
+    except OSError:
+        return image_path, 'read_error'
+
+    verdict = _check_markers(head, tail, size)
+    if verdict is None and not full_decode:
+        return image_path, None
+    # 可疑文件: 完整解码确认
+    if not _full_decode_ok(image_path):
+        return image_path, 'decode_failed'
+    if verdict == 'unknown':
+        return image_path, 'bad_header'
+    return image_path, None if verdict == 'unverifiable' else verdict
+
+
+def check_images(paths: Iterable[str], workers: int | None = None, full_decode: bool = False,
+                 progress_desc: str | None = None) -> dict:
+    """用线程池并行检查多张图片 (读头尾与 cv2 解码均释放 GIL).
+
+    返回:
+        {'files': 文件数, 'counts': {code: n}, 'bad_files': [(路径, code), ...]}
+    """
+    paths = list(paths)
+    summary = {'files': len(paths), 'counts': {}, 'bad_files': []}
+    if not paths:
+        return summary
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results: Iterable = pool.map(lambda p: check_image(p, full_decode), paths)
+        if progress_desc:
+            from tqdm import tqdm
+            results = tqdm(results, total=len(paths), desc=progress_desc)
+        for path, code in results:
+            if code is None:
+                continue
+            summary['counts'][code] = summary['counts'].get(code, 0) + 1
+            summary['bad_files'].append((path, code))
+    summary['bad_files'].sort()
+    return summary
+
@@ -0,0 +1,199 @@
+"""YOLO 标签文件校验: 按文件批量解析后用数组运算检查格式与取值范围, 支持进程池并行.
+
+parse_label_lines (格式) 与 check_label_array (取值) 也可单独使用: 后者接受多个文件拼接后的
+数组与所属文件下标, 一次完成全部检查 (utils/dataset_model.py 在内存中的数据集上校验时使用).
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 错误码 -> 中文说明 (按输出顺序)
+ERROR_CODES = {
+    'too_few_fields': '字段数不足 5',
+    'non_numeric': '存在非数值字段',
+    'class_not_integer': '类别ID不是整数',
+    'class_out_of_range': '类别ID越界',
+    'coord_out_of_range': '坐标超出 [0,1]',
+    'non_positive_size': '宽或高 <= 0',
+    'duplicate_line': '重复标注行',
+    'read_error': '文件读取失败',
+}
+MAX_LINES_PER_CODE = 10
+
+
+def parse_label_lines(raw_lines: List[str]) -> tuple[np.ndarray, np.ndarray, int, Dict[str, List[int]]]:
+    """解析标签文本行, 返回 (数值行 (N, 5), 对应行号 (N,), 非空行数, {格式错误码: [行号, ...]}).
+
+    字段不足 5 个 (too_few_fields) 与含非数值/非有限值 (non_numeric) 的行被剔除并记录行号 (1-based).
+    """
+    import numpy as np
+    issues: Dict[str, List[int]] = {}
+    line_no = []
+    rows = []
+    for i, ln in enumerate(raw_lines, 1):
+        parts = ln.split()
+        if parts:
+            line_no.append(i)
+            rows.append(parts)
+    empty = np.empty((0, 5), dtype=np.float64), np.empty(0, dtype=np.int32)
+    if not rows:
+        return (*empty, 0, issues)
+
+    # 快速路径: 全部行恰为 5 个数值字段时整体转换
+    if all(len(r) == 5 for r in rows):
+        try:
+            arr = np.array(rows, dtype=np.float64)
+            keep_no = np.array(line_no, dtype=np.int32)
+            rows = None
+        except ValueError:
+            pass
+    if rows is not None:
+        short = [n for n, r in zip(line_no, rows) if len(r) < 5]
+        if short:
+            issues['too_few_fields'] = short
+        keep = [k for k, r in enumerate(rows) if len(r) >= 5]
+        keep_no = np.array([line_no[k] for k in keep], dtype=np.int32)
+        first5 = [rows[k][:5] for k in keep]
+        # 批量转换; 失败时逐行定位非数值行
+        try:
+            arr = np.array(first5, dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            ok = np.ones(len(first5), dtype=bool)
+            for k, r in enumerate(first5):
+                try:
+                    [float(v) for v in r]
+                except ValueError:
+                    ok[k] = False
+            issues.setdefault('non_numeric', []).extend(keep_no[~ok].tolist())
+            arr = np.array([r for r, good in zip(first5, ok) if good], dtype=np.float64).reshape(-1, 5)
+            keep_no = keep_no[ok]
+
+    finite = np.isfinite(arr).all(axis=1)
+    if not finite.all():
+        issues['non_numeric'] = sorted(issues.get('non_numeric', []) + keep_no[~finite].tolist())
+        arr, keep_no = arr[finite], keep_no[finite]
+    return arr, keep_no, len(line_no), issues
+
+
+def check_label_array(arr: np.ndarray, num_classes: int | None = None,
+                      owner: np.ndarray | None = None) -> Dict[str, np.ndarray]:
+    """对已解析的数值行做取值检查, 返回 {错误码: 行掩码}, 只包含有问题的错误码.
+
+    owner 为每行所属文件的下标 (多个文件拼接时), 重复行只在同一文件内判断; 省略时视为同一文件.
+    """
+    import numpy as np
+    masks = {}
+    if len(arr) == 0:
+        return masks
+    cls = arr[:, 0]
+    out_of_range = cls < 0
+    if num_classes:
+        out_of_range |= cls >= num_classes
+    coords = arr[:, 1:5]
+    masks['class_not_integer'] = cls != np.floor(cls)
+    masks['class_out_of_range'] = out_of_range
+    masks['coord_out_of_range'] = ((coords < 0) | (coords > 1)).any(axis=1)
+    masks['non_positive_size'] = (arr[:, 3] <= 0) | (arr[:, 4] <= 0)
+
+    # 重复行: 按 (文件, 数值) lexsort 后比较相邻行, 首次出现不计为重复
+    if len(arr) > 1:
+        keyed = arr if owner is None else np.column_stack([owner, arr])
+        order = np.lexsort(keyed.T[::-1])
+        sorted_arr = keyed[order]
+        dup = np.zeros(len(arr), dtype=bool)
+        dup[order[1:]] = (sorted_arr[1:] == sorted_arr[:-1]).all(axis=1)
+        masks['duplicate_line'] = dup
+    return {code: m for code, m in masks.items() if m.any()}
+
+
+def validate_label_file(label_path: str, num_classes: int | None = None) -> dict:
+    """校验单个标签文件, 返回 {'file', 'lines', 'errors': {code: [行号(1-based), ...]}}.
+
+    行号列表最多保留 MAX_LINES_PER_CODE 个, 'counts' 记录各错误码的完整计数.
+    """
+    result = {'file': label_path, 'lines': 0, 'errors': {}, 'counts': {}}
+    try:
+        with open(label_path, 'r', encoding='utf-8', errors='replace') as f:
+            raw = f.read().splitlines()
+    except OSError:
+        add_file_errors(result, 'read_error', [0])
+        return result
+
+    arr, line_no, result['lines'], issues = parse_label_lines(raw)
+    for code, lines in issues.items():
+        add_file_errors(result, code, lines)
+    for code, mask in check_label_array(arr, num_classes).items():
+        add_file_errors(result, code, line_no[mask].tolist())
+    return result
+
+
+def add_file_errors(result: dict, code: str, line_numbers: List[int]) -> None:
+    """把某错误码的行号计入单文件校验结果 (行号最多保留 MAX_LINES_PER_CODE 个)."""
+    if not line_numbers:
+        return
+    result['counts'][code] = result['counts'].get(code, 0) + len(line_numbers)
+    kept = result['errors'].setdefault(code, [])
+    kept.extend(line_numbers[:max(0, MAX_LINES_PER_CODE - len(kept))])
+
+
+def _validate_chunk(task: tuple) -> tuple[int, int, list]:
+    """进程池任务: 校验一批文件, 仅回传有错误的文件, 返回 (文件数, 行数, 错误结果列表)."""
+    paths, num_classes = task
+    total_lines = 0
+    bad = []
+    for p in paths:
+        res = validate_label_file(p, num_classes)
+        total_lines += res['lines']
+        if res['counts']:
+            bad.append(res)
+    return len(paths), total_lines, bad
+
+
+def validate_label_files(paths: Iterable[str], num_classes: int | None = None, workers: int | None = None,
+                         chunk_size: int = 256) -> dict:
+    """并行校验多个标签文件.
+
+    返回:
+        {'files': 文件数, 'lines': 标注行数, 'counts': {code: n}, 'bad_files': [逐文件结果...]}
+    """
+    paths = list(paths)
+    chunks = [(paths[i:i + chunk_size], num_classes) for i in range(0, len(paths), chunk_size)]
+    summary = {'files': 0, 'lines': 0, 'counts': {}, 'bad_files': []}
+    if not chunks:
+        return summary
+    if workers == 1 or len(chunks) == 1:
+        results: Iterable = map(_validate_chunk, chunks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        results = pool.map(_validate_chunk, chunks)
+    try:
+        for n_files, n_lines, bad in results:
+            summary['files'] += n_files
+            summary['lines'] += n_lines
+            for res in bad:
+                for code, n in res['counts'].items():
+                    summary['counts'][code] = summary['counts'].get(code, 0) + n
+            summary['bad_files'].extend(bad)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    summary['bad_files'].sort(key=lambda r: r['file'])
+    return summary
+
+
+def format_file_errors(res: dict) -> List[str]:
+    """把单文件校验结果格式化为紧凑文本行: code x 次数 @ 行号..."""
+    out = []
+    for code in ERROR_CODES:
+        if code not in res['counts']:
+            continue
+        lines = ','.join(str(n) for n in res['errors'].get(code, []))
+        more = '...' if res['counts'][code] > len(res['errors'].get(code, [])) else ''
+        out.append(f"{code} x{res['counts'][code]} @ {lines}{more}")
+    return out
@@ -1,19 +1,151 @@
+import atexit
 import os
 import sys
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, TextIO
+from typing import Dict, List, Optional, TextIO
+
+# 待写入条目上限 (超过时调用方等待后台写出, 不丢日志), 后台写出与落盘间隔(秒)
+_MAX_PENDING = 65536
+_FLUSH_INTERVAL = 0.5
+_STOP = object()
+# 当前进程已创建的日志文件路径 (同一进程只 tee 一次)
+_ACTIVE_LOG: Optional[str] = None
+# log_error 的累计调用次数 (medds 据此判断一个阶段是否出错) 与最后一条错误内容
+_ERROR_COUNT = 0
+_LAST_ERROR: Optional[str] = None
+
+
+class _AsyncLogWriter:
+    """后台线程批量写日志文件.
+
+    调用方只把 (流, 文本) 追加到 deque (原子操作, 不加锁), 后台线程按固定间隔整批取出、
+    合并写入并 flush; 积压超过 _MAX_PENDING 条时调用方等待后台写出.
+    写入文件前过滤以 '\\r' 覆盖的进度刷新 (如 tqdm), 每行只保留最终内容.
+    进程退出时 (atexit) 写完剩余内容; fork 前先等待写完,
+    子进程及 close() 之后改为同步直写文件描述符.
+    """
+
+    def __init__(self, file: TextIO):
+        self._file = file
+        self._fd = file.fileno()
+        self._items: deque = deque()
+        self._wake = threading.Event()
+        self._pending: Dict[str, str] = {}
+        self._sync = False
+        self._sync_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self.drain, after_in_child=self._after_fork)
+
+    def write(self, stream: str, data: str) -> None:
+        if self._sync:
+            self._write_sync(stream, data)
+            return
+        self._items.append((stream, data))
+        if len(self._items) > _MAX_PENDING:
+            self.drain()
+
+    def drain(self, timeout: float = 5.0) -> None:
+        """等待已追加的内容写入并 flush 到文件."""
+        if self._sync or not self._thread.is_alive() or threading.current_thread() is self._thread:
+            return
+        done = threading.Event()
+        self._items.append(done)
+        self._wake.set()
+        done.wait(timeout)
+
+    def close(self) -> None:
+        """写完剩余内容 (含未换行的最后一段) 并停止后台线程."""
+        if self._sync:
+            return
+        if self._thread.is_alive():
+            self._items.append(_STOP)
+            self._wake.set()
+            self._thread.join(5.0)
+        self._sync = True
+        # 停止信号之后才追加的内容
+        while self._items:
+            item = self._items.popleft()
+            if isinstance(item, tuple):
+                self._write_sync(*item)
+
+    def _after_fork(self) -> None:
+        # 子进程没有后台线程, 且与父进程共享文件偏移, 直接写 fd
+        self._sync = True
+        self._sync_lock = threading.Lock()
+        self._pending = {}
+        self._items = deque()
+
+    def _write_sync(self, stream: str, data: str) -> None:
+        with self._sync_lock:
+            text = self._filter(stream, data)
+            if text:
+                try:
+                    os.write(self._fd, text.encode('utf-8'))
+                except OSError:
+                    pass
+
+    def _filter(self, stream: str, data: str) -> str:
+        """返回可写入文件的完整行; 未结束的行暂存, 其中被 '\\r' 覆盖的部分直接丢弃."""
+        text = self._pending.get(stream, '') + data
+        cut = text.rfind('\n') + 1
+        done, rest = text[:cut], text[cut:]
+        if '\r' in rest:
+            # 保留最后一段可见内容; 以 '\r' 结尾时可能是被拆开的 '\r\n'
+            segs = rest.split('\r')
+            rest = segs[-2] + '\r' if rest.endswith('\r') else segs[-1]
+        self._pending[stream] = rest
+        if '\r' not in done:
+            return done
+        return '\n'.join(line.rstrip('\r').rsplit('\r', 1)[-1] for line in done.split('\n'))
+
+    def _run(self) -> None:
+        items = self._items
+        while True:
+            self._wake.wait(_FLUSH_INTERVAL)
+            self._wake.clear()
+            out: List[str] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            # 只取本轮开始时已有的条目, 避免持续写入时一直不 flush
+            for _ in range(len(items)):
+                item = items.popleft()
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    out.append(self._filter(*item))
+            if stop:
+                out.extend(v.rstrip('\r') + '\n' for v in self._pending.values() if v.strip('\r'))
+                self._pending.clear()
+            try:
+                if out:
+                    self._file.write(''.join(out))
+                    self._file.flush()
+            except Exception:
+                pass
+            for w in waiters:
+                w.set()
+            if stop:
+                return
 
 
 class _Tee:
     """将标准输出/错误复制写入日志文件与控制台.
 
-    此类作为 file-like 包装器, 同时把写入内容写到原始流与日志文件中.
+    此类作为 file-like 包装器, 控制台同步写入, 日志文件交给 _AsyncLogWriter 在后台写入.
     """
 
-    def __init__(self, original: TextIO, file: TextIO):
+    def __init__(self, original: TextIO, writer: _AsyncLogWriter, stream: str):
         self._orig = original
-        self._file = file
+        self._writer = writer
+        self._stream = stream
 
     def write(self, data: str):
         try:
@@ -21,19 +153,16 @@ class _Tee:
         except Exception:
             pass
         try:
-            self._file.write(data)
+            self._writer.write(self._stream, data)
         except Exception:
             pass
 
     def flush(self):
+        # 只刷新控制台; 日志文件由后台线程定期 flush, 退出时写完
         try:
             self._orig.flush()
         except Exception:
             pass
-        try:
-            self._file.flush()
-        except Exception:
-            pass
 
     def isatty(self):
         try:
@@ -46,7 +175,12 @@ def tee_stdout_stderr(log_dir: str | Path = 'logs', script_basename: Optional[st
     """把标准输出与标准错误复制到日志文件并保留原有控制台输出.
 
     会在 log_dir 下创建按时间戳命名的日志文件, 返回该日志文件的绝对路径.
+    日志文件由后台线程批量写入, 不含 '\\r' 进度刷新的中间状态 (见 _AsyncLogWriter).
+    同一进程内只在首次调用时创建日志 (如 medds 串联多个子命令), 之后直接返回该文件路径.
     """
+    global _ACTIVE_LOG
+    if _ACTIVE_LOG is not None:
+        return _ACTIVE_LOG
     base = Path(log_dir)
     base.mkdir(parents=True, exist_ok=True)
     if script_basename is None:
@@ -57,7 +191,7 @@ def tee_stdout_stderr(log_dir: str | Path = 'logs', script_basename: Optional[st
     log_path = base / f"{ts}_{script_basename}.log"
 
     # Open in text mode with utf-8 to support CN output
-    f = open(log_path, 'w', encoding='utf-8', buffering=1)
+    f = open(log_path, 'w', encoding='utf-8', buffering=1 << 16)
 
     header = f"===== {script_basename} start {datetime.now().isoformat(timespec='seconds')} =====\n"
     cmdline = ' '.join(sys.argv)
@@ -68,10 +202,12 @@ def tee_stdout_stderr(log_dir: str | Path = 'logs', script_basename: Optional[st
     except Exception:
         pass
 
-    sys.stdout = _Tee(sys.stdout, f)  # type: ignore
-    sys.stderr = _Tee(sys.stderr, f)  # type: ignore
+    writer = _AsyncLogWriter(f)
+    sys.stdout = _Tee(sys.stdout, writer, 'stdout')  # type: ignore
+    sys.stderr = _Tee(sys.stderr, writer, 'stderr')  # type: ignore
 
-    return str(log_path)
+    _ACTIVE_LOG = str(log_path)
+    return _ACTIVE_LOG
 
 
 def log_info(message: str) -> None:
@@ -92,7 +228,20 @@ def log_warn(message: str) -> None:
 
 def log_error(message: str) -> None:
     """输出错误级别日志到控制台与日志文件, 统一前缀为 '[ERROR] '."""
+    global _ERROR_COUNT, _LAST_ERROR
     if message is None or str(message).strip() == "":
         print("")
         return
+    _ERROR_COUNT += 1
+    _LAST_ERROR = str(message)
     print(f"[ERROR] {message}")
+
+
+def error_count() -> int:
+    """返回本进程中 log_error 已输出的错误条数."""
+    return _ERROR_COUNT
+
+
+def last_error() -> Optional[str]:
+    """返回本进程中 log_error 最后输出的错误内容, 没有时返回 None."""
+    return _LAST_ERROR
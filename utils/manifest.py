@@ -0,0 +1,45 @@
+"""进程内目录清单缓存: 同一进程中多次列出同一目录时只扫描一次.
+
+以目录自身的 (inode, mtime_ns, ctime_ns) 校验缓存: 目录内增删/重命名条目会更新目录 mtime,
+此时自动重新扫描. 只缓存文件名, 文件内容变化 (如原地改写标签) 不影响清单.
+文件系统时间戳粒度有限, 与 git 处理 "racy clean" 的方式相同: 最近 _RACY_NS 内修改过的目录不缓存.
+medds 串联多个子命令时各阶段共享同一缓存, 单个脚本内的重复列目录同样受益.
+"""
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+_RACY_NS = 2_000_000_000
+
+_cache: Dict[str, Tuple[Tuple[int, int, int], Tuple[str, ...]]] = {}
+
+
+def _dir_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_ino, st.st_mtime_ns, st.st_ctime_ns
+
+
+def list_dir(directory: str | Path) -> Tuple[str, ...]:
+    """与 os.listdir 相同 (目录不存在时同样抛出 OSError), 返回不可变元组; 目录未变化时直接返回缓存."""
+    path = os.path.abspath(os.fspath(directory))
+    key = _dir_key(os.stat(path))
+    hit = _cache.get(path)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    names = tuple(os.listdir(path))
+    # 扫描期间目录被修改, 或修改时间过近 (同一时间戳粒度内的后续修改无法察觉) 时不缓存
+    if _dir_key(os.stat(path)) == key and time.time_ns() - key[1] > _RACY_NS:
+        _cache[path] = (key, names)
+    else:
+        _cache.pop(path, None)
+    return names
+
+
+def invalidate(directory: str | Path | None = None) -> None:
+    """丢弃指定目录 (None 为全部) 的缓存清单."""
+    if directory is None:
+        _cache.clear()
+    else:
+        _cache.pop(os.path.abspath(os.fspath(directory)), None)
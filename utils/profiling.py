@@ -0,0 +1,273 @@
+"""阶段级性能剖析: 各阶段耗时、吞吐 (files/s, MB/s, boxes/s) 与峰值内存.
+
+各脚本在关键阶段外包一层 span('scan' / 'parse' / 'decode' / 'encode' / 'write' ...),
+并用 count('files' / 'bytes' / 'boxes', n) 累计处理量; --profile 时在退出前把汇总表
+经 log_info 输出 (同时写入 logs/ 下的日志文件). 未启用时 span/count 直接返回, 开销可忽略.
+--profile-out 额外用 cProfile 记录主线程的函数级统计并写入 .prof 文件 (pstats/snakeviz 查看).
+
+span 可嵌套, 表中以 '外层/内层' 命名; count 计入当前线程所有外层 span 与全局合计,
+线程池 worker 中没有自己的 span 时计入主线程当前所在的阶段.
+进程池 worker 内的 span 不回传主进程, 由主进程中包住进程池调用的 span 计时.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from utils.logging_utils import log_info, log_warn
+
+# cProfile 报告中列出的函数数
+_TOP_FUNCTIONS = 25
+# 汇总表中按耗时列出的最多阶段数
+_MAX_ROWS = 40
+
+
+class _Profiler:
+    """累计各 span 的调用次数/耗时与计数器, 线程安全."""
+
+    def __init__(self, prof_path: Optional[str] = None):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.order: List[str] = []
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.totals: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.main_stack = self.stack()
+        self.prof_path = prof_path
+        self.cprofile = None
+        if prof_path:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stack(self) -> List[str]:
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def enter(self, key: str) -> None:
+        # 按首次进入的顺序登记, 外层阶段排在其内层阶段之前
+        if key not in self.calls:
+            with self.lock:
+                if key not in self.calls:
+                    self.order.append(key)
+                    self.calls[key] = 0
+                    self.seconds[key] = 0.0
+
+    def add_time(self, key: str, seconds: float) -> None:
+        with self.lock:
+            self.calls[key] += 1
+            self.seconds[key] += seconds
+
+    def add_count(self, name: str, n: int) -> None:
+        stack = self.stack() or self.main_stack
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0) + n
+            for key in stack:
+                bucket = self.counts.setdefault(key, {})
+                bucket[name] = bucket.get(name, 0) + n
+
+
+_PROFILER: Optional[_Profiler] = None
+# 已输出的汇总次数
+_REPORTS = 0
+
+
+def add_profile_args(parser) -> None:
+    """为 argparse 解析器添加 --profile / --profile-out."""
+    parser.add_argument('--profile', action='store_true',
+                        help='结束时输出各阶段耗时/吞吐/峰值内存汇总表 (同时写入 logs/ 日志)')
+    parser.add_argument('--profile-out', default=None, metavar='PROF',
+                        help='同时用 cProfile 记录函数级统计并写入该 .prof 文件 (隐含 --profile)')
+
+
+def start_profiling(args) -> bool:
+    """按命令行参数启用剖析 (在 tee_stdout_stderr 之后调用), 返回是否启用.
+
+    退出时自动输出汇总; medds 串联执行时由其在每个阶段结束后调用 report().
+    """
+    global _PROFILER
+    prof_path = getattr(args, 'profile_out', None)
+    if not (getattr(args, 'profile', False) or prof_path):
+        return False
+    if _PROFILER is None:
+        _PROFILER = _Profiler(prof_path)
+        # 在日志写出线程 (先注册) 关闭之前执行, 保证汇总进入日志文件
+        atexit.register(_report_at_exit)
+    return True
+
+
+def is_enabled() -> bool:
+    return _PROFILER is not None
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """计时一个阶段; 未启用剖析时不做任何事."""
+    prof = _PROFILER
+    if prof is None:
+        yield
+        return
+    stack = prof.stack()
+    key = f"{stack[-1]}/{name}" if stack else name
+    stack.append(key)
+    prof.enter(key)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        prof.add_time(key, time.perf_counter() - t0)
+        stack.pop()
+
+
+def profiled(name: str):
+    """装饰器形式的 span, 用于整个函数即一个阶段的情况."""
+    def decorator(func):
+        import functools
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _PROFILER is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1) -> None:
+    """累计处理量 (如 'files' / 'bytes' / 'boxes'); 未启用剖析时不做任何事."""
+    prof = _PROFILER
+    if prof is not None and n:
+        prof.add_count(name, n)
+
+
+def count_file(path) -> None:
+    """计入一个文件及其字节数 ('files' / 'bytes'); 仅在启用剖析时 stat."""
+    prof = _PROFILER
+    if prof is None:
+        return
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    prof.add_count('files', 1)
+    prof.add_count('bytes', size)
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """返回本进程与已回收子进程的峰值常驻内存 (MB); 平台不支持时返回空 dict."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return {'self': psutil.Process().memory_info().peak_wset / 2 ** 20}
+        except Exception:
+            return {}
+    # Linux 上 ru_maxrss 单位为 KB, macOS 上为字节
+    scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+    result = {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale}
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    if children:
+        result['children'] = children
+    return result
+
+
+def _format_counts(counts: Dict[str, int], seconds: float) -> tuple[str, str]:
+    amounts, rates = [], []
+    for name in sorted(counts):
+        value = counts[name]
+        if name == 'bytes':
+            unit, scale = ('MB', 2 ** 20) if value >= 2 ** 20 else ('KB', 2 ** 10)
+            amounts.append(f"{value / scale:.1f} {unit}")
+            rates.append(f"{value / scale / seconds:.1f} {unit}/s" if seconds > 0 else '-')
+        else:
+            amounts.append(f"{value} {name}")
+            rates.append(f"{value / seconds:.0f} {name}/s" if seconds > 0 else '-')
+    return ', '.join(amounts), ', '.join(rates)
+
+
+def report(title: Optional[str] = None, restart: bool = False) -> None:
+    """输出汇总表; 未启用时不做任何事.
+
+    restart=True 时清空已累计的数据并继续剖析 (medds 串联时每个阶段单独汇总).
+    """
+    global _PROFILER, _REPORTS
+    prof = _PROFILER
+    if prof is None:
+        return
+    wall = time.perf_counter() - prof.started
+    if prof.cprofile is not None:
+        prof.cprofile.disable()
+
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ['阶段', '次数', '耗时(s)', '占比', '处理量', '吞吐']
+    table.align['阶段'] = 'l'
+    table.align['处理量'] = 'l'
+    table.align['吞吐'] = 'l'
+    keys = sorted(prof.order, key=lambda k: -prof.seconds[k])[:_MAX_ROWS]
+    # 保持首次出现顺序, 使嵌套阶段紧跟在外层之后
+    for key in sorted(keys, key=prof.order.index):
+        seconds = prof.seconds[key]
+        amount, rate = _format_counts(prof.counts.get(key, {}), seconds)
+        table.add_row([key, prof.calls[key], f"{seconds:.3f}",
+                       f"{seconds / wall * 100:.1f}%" if wall > 0 else '-', amount, rate])
+    # 同一批文件会在多个阶段分别计数, 合计行只给出总耗时
+    table.add_row(['(总计)', '', f"{wall:.3f}", '100.0%', '', ''])
+
+    log_info("===== 性能剖析" + (f": {title}" if title else "") + " =====")
+    for line in table.get_string().splitlines():
+        log_info(line)
+    rss = peak_rss_mb()
+    if rss:
+        log_info("峰值内存: " + ', '.join(
+            f"{'本进程' if k == 'self' else '子进程'} {v:.1f} MB" for k, v in rss.items()))
+    if prof.cprofile is not None:
+        _dump_cprofile(prof.cprofile, prof.prof_path)
+
+    _REPORTS += 1
+    _PROFILER = _Profiler(prof.prof_path and _next_prof_path(prof.prof_path)) if restart else None
+
+
+def _report_at_exit() -> None:
+    prof = _PROFILER
+    # medds 已按阶段输出过汇总且其后没有新的阶段数据时不再输出空表
+    if prof is not None and (_REPORTS == 0 or prof.order or prof.totals):
+        report()
+
+
+def _dump_cprofile(cprofile, path: str) -> None:
+    import io
+    import pstats
+    try:
+        cprofile.dump_stats(path)
+    except OSError as e:
+        log_warn(f"无法写入 cProfile 统计: {path}: {e}")
+        return
+    buf = io.StringIO()
+    pstats.Stats(cprofile, stream=buf).sort_stats('cumulative').print_stats(_TOP_FUNCTIONS)
+    log_info(f"cProfile 统计已保存: {path} (按累计耗时前 {_TOP_FUNCTIONS} 个函数如下)")
+    for line in buf.getvalue().strip().splitlines():
+        if line.strip():
+            log_info(line)
+
+
+def _next_prof_path(path: str) -> str:
+    """同一进程多次输出时 (medds 串联) 依次写 x.prof, x.2.prof, x.3.prof ..."""
+    import re
+    stem, dot, ext = path.rpartition('.')
+    if not dot:
+        stem, ext = path, ''
+    m = re.match(r'^(.*)\.(\d+)$', stem)
+    stem, n = (m.group(1), int(m.group(2)) + 1) if m else (stem, 2)
+    return f"{stem}.{n}" + (f".{ext}" if dot else '')
@@ -0,0 +1,335 @@
+"""数据集划分工具: 基于稀疏 样本 x 标签 矩阵的迭代分层 (iterative stratification).
+
+矩阵使用 CSR 三元组 (indptr, indices, data) 表示, 第 i 个样本的标签为
+indices[indptr[i]:indptr[i+1]], 对应计数为 data 的同一区间. 样本可以是单张图片,
+也可以是聚合后的分组 (如同一患者的全部切片), 此时 data 为组内计数, sample_weight 为组内图片数.
+
+算法参考 Sechidis et al. 2011: 每轮选剩余样本最少的标签, 把带该标签的未分配样本
+按各分割对该标签的剩余需求一次性成批分配, 再向量化扣减这些样本其余标签的需求.
+总复杂度 O(nnz + 标签数^2), 百万样本/千类别在秒级完成.
+
+分组划分 (同一患者/体数据的切片必须落在同一分割) 先用哈希表把样本映射到分组下标,
+再把标签计数聚合到分组上做分层, 整体为线性时间.
+
+hash_split_index 提供无状态的流式划分: 分割只由文件名 (或分组键) 的带种子哈希决定.
+
+划分方案 (split plan) 以 JSON 记录 {分割: [文件 stem, ...]} 与数据集指纹, 两个划分工具共用,
+用于在其他机器上或格式转换后按同一方案重新生成数据集, 无需重新计算.
+"""
+from __future__ import annotations
+
+import bisect
+import csv
+import hashlib
+import json
+import os
+import re
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+SPLIT_PLAN_VERSION = 1
+
+# 分组 CSV 中可识别的列名 (小写)
+GROUP_CSV_FILE_COLUMNS = ('file', 'file_name', 'filename', 'image', 'image_name', 'stem', 'name', 'path')
+GROUP_CSV_GROUP_COLUMNS = ('group', 'patient', 'patient_id', 'case', 'case_id', 'volume', 'series', 'subject', 'study')
+
+
+def pairs_to_csr(sample_idx: np.ndarray, label_idx: np.ndarray, num_samples: int,
+                 binary: bool = False, weights: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """把 (样本下标, 标签下标) 对 (可重复) 聚合为 CSR.
+
+    重复的对累加计数 (给定 weights 时累加权重); binary=True 时计数截断为 1.
+    """
+    import numpy as np
+    sample_idx = np.asarray(sample_idx, dtype=np.int64)
+    label_idx = np.asarray(label_idx, dtype=np.int64)
+    if sample_idx.size == 0:
+        return np.zeros(num_samples + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    num_labels = int(label_idx.max()) + 1
+    keys, inverse = np.unique(sample_idx * num_labels + label_idx, return_inverse=True)
+    counts = np.bincount(inverse, weights=weights, minlength=len(keys))
+    rows = keys // num_labels
+    indices = keys % num_labels
+    indptr = np.zeros(num_samples + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_samples), out=indptr[1:])
+    data = np.ones(len(keys), dtype=np.int64) if binary else counts.astype(np.int64)
+    return indptr, indices, data
+
+
+def _gather_rows(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """返回若干行在 CSR 中的全部元素位置, 以及每个元素所属的行 (rows 中的序号)."""
+    import numpy as np
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return starts[owner] + offsets, owner
+
+
+def _cut_by_weight(weights: np.ndarray, shares: np.ndarray) -> np.ndarray:
+    """按各分割份额把依次排列的样本切成连续段, 返回每个样本的分割下标.
+
+    以样本权重累计值的中点落在哪个区间决定归属, 份额为 0 的分割不会分到样本.
+    """
+    import numpy as np
+    cum = np.cumsum(weights, dtype=np.float64)
+    total = cum[-1] if len(cum) else 0.0
+    shares = np.clip(shares, 0, None).astype(np.float64)
+    if shares.sum() <= 0:
+        shares = np.ones_like(shares)
+    bounds = np.cumsum(shares / shares.sum() * total)[:-1]
+    return np.searchsorted(bounds, cum - weights / 2.0, side='right')
+
+
+def iterative_stratify(indptr: np.ndarray, indices: np.ndarray, ratios: Sequence[float],
+                       data: np.ndarray | None = None, sample_weight: np.ndarray | None = None,
+                       seed: int = 42) -> np.ndarray:
+    """多标签迭代分层划分.
+
+    参数:
+        indptr/indices/data: 样本 x 标签的 CSR 矩阵 (data 为 None 时视为全 1)
+        ratios: 各分割比例 (如 [0.8, 0.1, 0.1]), 比例为 0 的分割不会分到样本
+        sample_weight: 每个样本代表的图片数 (分组划分时使用), 默认全 1
+        seed: 随机种子
+
+    返回:
+        长度为样本数的 int8 数组, 值为分割下标
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    num_samples = len(indptr) - 1
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    k = len(ratios)
+    num_labels = int(indices.max()) + 1 if indices.size else 0
+    data = np.ones(len(indices), dtype=np.int64) if data is None else np.asarray(data)
+    sample_weight = np.ones(num_samples, dtype=np.float64) if sample_weight is None \
+        else np.asarray(sample_weight, dtype=np.float64)
+
+    assignment = np.full(num_samples, -1, dtype=np.int8)
+    # 各分割剩余需求: 按样本权重与按标签计数
+    desired_samples = ratios * sample_weight.sum()
+    label_totals = np.bincount(indices, weights=data, minlength=num_labels)
+    desired_labels = label_totals[:, None] * ratios[None, :]
+    remaining = np.bincount(indices, minlength=num_labels).astype(np.int64)
+
+    # 标签 -> 样本 的倒排 (CSC), 用于按标签取出候选样本
+    row_of = np.repeat(np.arange(num_samples), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    csc_rows = row_of[order]
+    csc_vals = data[order]
+    csc_ptr = np.zeros(num_labels + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=num_labels), out=csc_ptr[1:])
+
+    big = np.iinfo(np.int64).max
+    while True:
+        active = np.where(remaining > 0, remaining, big)
+        label = int(np.argmin(active)) if num_labels else 0
+        if num_labels == 0 or active[label] == big:
+            break
+        lo, hi = csc_ptr[label], csc_ptr[label + 1]
+        rows, vals = csc_rows[lo:hi], csc_vals[lo:hi]
+        free = assignment[rows] < 0
+        rows, vals = rows[free], vals[free]
+        perm = rng.permutation(len(rows))
+        rows, vals = rows[perm], vals[perm]
+
+        # 优先满足该标签在各分割的剩余需求; 都已满足时按样本数需求分配
+        shares = np.clip(desired_labels[label], 0, None)
+        if shares.sum() <= 0:
+            shares = np.clip(desired_samples, 0, None)
+        if shares.sum() <= 0:
+            shares = ratios
+        split = _cut_by_weight(vals.astype(np.float64), shares * (ratios > 0))
+        assignment[rows] = split
+
+        # 向量化扣减这些样本全部标签的需求
+        pos, owner = _gather_rows(indptr, rows)
+        labels = indices[pos]
+        flat = labels * k + split[owner]
+        desired_labels -= np.bincount(flat, weights=data[pos], minlength=num_labels * k).reshape(num_labels, k)
+        remaining -= np.bincount(labels, minlength=num_labels)
+        desired_samples -= np.bincount(split, weights=sample_weight[rows], minlength=k)
+
+    # 无标签样本 (背景) 用于补齐各分割的样本数需求
+    rest = np.flatnonzero(assignment < 0)
+    if len(rest):
+        rest = rest[rng.permutation(len(rest))]
+        shares = np.clip(desired_samples, 0, None) * (ratios > 0)
+        assignment[rest] = _cut_by_weight(sample_weight[rest], shares if shares.sum() > 0 else ratios)
+
+    # 样本粒度很粗 (少量大分组) 时, 比例较小的分割可能分不到任何样本: 从超额最多的分割挪入其最小的样本
+    counts = np.bincount(assignment, minlength=k)
+    for j in np.flatnonzero((ratios > 0) & (counts == 0)).tolist():
+        surplus = np.bincount(assignment, weights=sample_weight, minlength=k) - ratios * sample_weight.sum()
+        surplus[counts <= 1] = -np.inf
+        donor = int(np.argmax(surplus))
+        if not np.isfinite(surplus[donor]):
+            break
+        cand = np.flatnonzero(assignment == donor)
+        assignment[cand[np.argmin(sample_weight[cand])]] = j
+        counts = np.bincount(assignment, minlength=k)
+    return assignment
+
+
+def split_label_counts(indptr: np.ndarray, indices: np.ndarray, assignment: np.ndarray, num_splits: int,
+                       data: np.ndarray | None = None, num_labels: int | None = None) -> np.ndarray:
+    """返回 标签 x 分割 的计数矩阵 (一次 bincount 完成); assignment < 0 的行 (未分配) 不计入."""
+    import numpy as np
+    if num_labels is None:
+        num_labels = int(indices.max()) + 1 if indices.size else 0
+    row_split = np.asarray(assignment, dtype=np.int64)[np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))]
+    kept = row_split >= 0
+    flat = indices[kept] * num_splits + row_split[kept]
+    weights = None if data is None else data[kept]
+    return np.bincount(flat, weights=weights, minlength=num_labels * num_splits).reshape(num_labels, num_splits)
+
+
+def ratio_deviation(counts: np.ndarray, ratios: Sequence[float]) -> np.ndarray:
+    """各标签实际比例与目标比例的最大绝对偏差 (标签总数为 0 时为 0)."""
+    import numpy as np
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        achieved = np.where(totals > 0, counts / totals, ratios[None, :])
+    return np.abs(achieved - ratios[None, :]).max(axis=1)
+
+
+def load_group_csv(csv_path: str) -> Dict[str, str]:
+    """读取 文件名 -> 分组 的映射 CSV.
+
+    带表头时按列名识别 (如 file_name/patient_id), 否则取前两列. 映射同时以文件名和去扩展名的 stem 为键.
+    """
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = [r for r in csv.reader(f) if r]
+    if not rows:
+        return {}
+    header = [c.strip().lower() for c in rows[0]]
+    file_col, group_col = 0, 1
+    if any(c in GROUP_CSV_FILE_COLUMNS for c in header) or any(c in GROUP_CSV_GROUP_COLUMNS for c in header):
+        file_col = next((i for i, c in enumerate(header) if c in GROUP_CSV_FILE_COLUMNS), 0)
+        group_col = next((i for i, c in enumerate(header) if c in GROUP_CSV_GROUP_COLUMNS),
+                         1 if file_col == 0 else 0)
+        rows = rows[1:]
+    mapping = {}
+    for r in rows:
+        if len(r) <= max(file_col, group_col):
+            continue
+        name = os.path.basename(r[file_col].strip().replace('\\', '/'))
+        group = r[group_col].strip()
+        mapping[name] = group
+        mapping.setdefault(os.path.splitext(name)[0], group)
+    return mapping
+
+
+def make_group_key_fn(regex: str | None = None,
+                      mapping: Dict[str, str] | None = None) -> Callable[[str], str | None]:
+    """返回 文件名 -> 分组键 的函数 (未匹配时返回 None).
+
+    regex 含捕获组时取第 1 个捕获组, 否则取整个匹配; mapping 依次按原名/文件名/stem 查找.
+    """
+    if mapping is not None:
+        def key_fn(name: str) -> str | None:
+            base = os.path.basename(name)
+            return mapping.get(name) or mapping.get(base) or mapping.get(os.path.splitext(base)[0])
+        return key_fn
+    if regex:
+        pattern = re.compile(regex)
+        take_group = pattern.groups > 0
+
+        def key_fn(name: str) -> str | None:
+            m = pattern.search(name)
+            if not m:
+                return None
+            return m.group(1) if take_group else m.group(0)
+        return key_fn
+    return lambda name: None
+
+
+def resolve_group_keys(names: Sequence[str], regex: str | None = None,
+                       mapping: Dict[str, str] | None = None) -> Tuple[List[str], int]:
+    """为每个文件名求分组键, 返回 (分组键列表, 未匹配数); 未匹配的文件自成一组."""
+    key_fn = make_group_key_fn(regex, mapping)
+    keys = []
+    unmatched = 0
+    for name in names:
+        key = key_fn(name)
+        if key is None:
+            unmatched += 1
+            key = '\0' + name
+        keys.append(key)
+    return keys, unmatched
+
+
+def hash_group_index(keys: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """用哈希表把分组键映射为连续下标 (按首次出现顺序), 返回 (每个样本的分组下标, 分组键列表)."""
+    import numpy as np
+    index: Dict[str, int] = {}
+    group_of = np.fromiter((index.setdefault(k, len(index)) for k in keys), dtype=np.int64, count=len(keys))
+    return group_of, list(index.keys())
+
+
+def group_stratify(indptr: np.ndarray, indices: np.ndarray, group_of: np.ndarray, ratios: Sequence[float],
+                   data: np.ndarray | None = None, seed: int = 42) -> np.ndarray:
+    """分组迭代分层: 把样本标签计数聚合到分组后分层, 返回每个样本的分割下标.
+
+    同一分组的样本必定落在同一分割; 分组的样本数作为权重参与各分割的数量平衡.
+    """
+    import numpy as np
+    group_of = np.asarray(group_of, dtype=np.int64)
+    num_groups = int(group_of.max()) + 1 if len(group_of) else 0
+    row_of = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    g_indptr, g_indices, g_data = pairs_to_csr(group_of[row_of], indices, num_groups, weights=data)
+    sizes = np.bincount(group_of, minlength=num_groups)
+    group_assignment = iterative_stratify(g_indptr, g_indices, ratios, data=g_data, sample_weight=sizes, seed=seed)
+    return group_assignment[group_of]
+
+
+def hash_split_index(key: str, cum_ratios: Sequence[float], seed: int = 42) -> int:
+    """按带种子的 blake2b 哈希把 key 映射到 [0, 1), 再按累计比例返回分割下标.
+
+    结果只取决于 key/种子/比例, 与遍历顺序、机器和 Python 哈希随机化无关, 无需保存任何状态.
+    """
+    digest = hashlib.blake2b(key.encode('utf-8', 'surrogateescape'), digest_size=8,
+                             key=str(seed).encode('utf-8')[:64]).digest()
+    u = int.from_bytes(digest, 'big') / 2.0 ** 64
+    return min(bisect.bisect_right(cum_ratios, u), len(cum_ratios) - 1)
+
+
+def save_split_plan(path: str, members: Dict[str, Sequence[str]], fingerprint: str | None = None,
+                    meta: dict | None = None) -> None:
+    """写出划分方案: members 为 {分割: [文件 stem, ...]} (按分割分组, 比逐文件映射更紧凑)."""
+    from utils.dataset_cache import now_iso
+    plan = {
+        'version': SPLIT_PLAN_VERSION,
+        'created': now_iso(),
+        'fingerprint': fingerprint,
+        'meta': meta or {},
+        'splits': {split: sorted(stems) for split, stems in members.items()},
+    }
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_split_plan(path: str) -> Tuple[dict, Dict[str, str]]:
+    """读取划分方案, 返回 (方案, {stem: 分割}); 格式不符时抛出 ValueError."""
+    with open(path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    if not isinstance(plan, dict) or not isinstance(plan.get('splits'), dict):
+        raise ValueError(f"不是有效的划分方案文件: {path}")
+    if plan.get('version') != SPLIT_PLAN_VERSION:
+        raise ValueError(f"不支持的划分方案版本: {plan.get('version')} (期望 {SPLIT_PLAN_VERSION})")
+    split_of: Dict[str, str] = {}
+    for split, stems in plan['splits'].items():
+        for stem in stems:
+            if split_of.setdefault(stem, split) != split:
+                raise ValueError(f"划分方案中 {stem} 同时属于 {split_of[stem]} 与 {split}")
+    return plan, split_of
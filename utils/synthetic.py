@@ -0,0 +1,276 @@
+"""合成数据集生成 (synth_dataset.py / benchmark.py 共用).
+
+先按参数生成一份与格式无关的标注方案 (SyntheticPlan: 文件名 + 每图框数 + 归一化框),
+再按目标格式写出: YOLO (format1 / format2 / standard / mixed)、COCO、VOC、MHA + metadata.csv.
+图片为小尺寸噪声占位图, 默认只编码少量变体循环复用, 写盘开销与文件数成正比而与像素无关.
+同一组参数与种子总是得到完全相同的数据集, 可用于基准测试与回归比较.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+YOLO_LAYOUTS = ('format1', 'format2', 'standard', 'mixed')
+FORMATS = YOLO_LAYOUTS + ('coco', 'voc', 'mha')
+SPLITS = ('train', 'val', 'test')
+# 默认编码的占位图变体数 (--unique-images 时每张图单独编码)
+_PLACEHOLDER_VARIANTS = 16
+
+
+class SyntheticPlan(NamedTuple):
+    """与输出格式无关的合成标注; 第 i 张图的框为 boxes[offsets[i]:offsets[i + 1]]."""
+    names: List[str]          # 图片文件名 (caseXXXXX_sYYY.jpg, 同一 case 的切片可按分组划分)
+    groups: np.ndarray        # (N,) 每张图所属 case 编号
+    offsets: np.ndarray       # (N + 1,) 框的起始下标
+    classes: np.ndarray       # (M,) 类别 ID
+    boxes: np.ndarray         # (M, 4) 归一化 cx, cy, w, h
+    class_names: List[str]
+
+
+def plan_dataset(num_images: int, boxes_per_image: float = 3.0, num_classes: int = 10,
+                 background: float = 0.1, imbalance: float = 1.0, slices_per_case: int = 10,
+                 seed: int = 0, ext: str = '.jpg') -> SyntheticPlan:
+    """生成标注方案.
+
+    每图框数服从均值 boxes_per_image 的泊松分布, background 比例的图片不含框;
+    类别按 1 / (k + 1) ** imbalance 的长尾分布抽取 (0 为均匀分布).
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(boxes_per_image, num_images)
+    counts[rng.random(num_images) < background] = 0
+    offsets = np.zeros(num_images + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    total = int(offsets[-1])
+
+    weights = 1.0 / np.arange(1, num_classes + 1, dtype=np.float64) ** imbalance
+    classes = rng.choice(num_classes, size=total, p=weights / weights.sum())
+    wh = rng.uniform(0.02, 0.3, size=(total, 2))
+    centers = wh / 2 + rng.random((total, 2)) * (1 - wh)
+    boxes = np.round(np.concatenate([centers, wh], axis=1), 6)
+
+    slices_per_case = max(1, slices_per_case)
+    groups = np.arange(num_images) // slices_per_case
+    names = [f"case{g:05d}_s{i % slices_per_case:03d}{ext}" for i, g in enumerate(groups.tolist())]
+    return SyntheticPlan(names, groups, offsets, classes, boxes, [f"class_{k}" for k in range(num_classes)])
+
+
+def assign_splits(plan: SyntheticPlan, ratios: Sequence[float] = (0.8, 0.1, 0.1), seed: int = 0) -> np.ndarray:
+    """按 case 整体随机分配到各 split (同一 case 的切片不跨集合), 返回每张图的 split 下标."""
+    import numpy as np
+    rng = np.random.default_rng(seed + 1)
+    num_groups = int(plan.groups.max()) + 1 if len(plan.groups) else 0
+    cum = np.cumsum(np.asarray(ratios, dtype=np.float64) / sum(ratios))
+    group_split = np.searchsorted(cum, rng.random(num_groups), side='right')
+    return np.minimum(group_split, len(ratios) - 1)[plan.groups]
+
+
+def _placeholder_bytes(image_size: int, count: int, seed: int, ext: str) -> List[bytes]:
+    import numpy as np
+    import cv2
+    rng = np.random.default_rng(seed + 2)
+    out = []
+    for _ in range(count):
+        # 低分辨率噪声放大, 各变体的感知哈希互不相同
+        coarse = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+        img = cv2.resize(coarse, (image_size, image_size), interpolation=cv2.INTER_LINEAR)
+        ok, buf = cv2.imencode(ext, img)
+        if not ok:
+            raise RuntimeError(f"无法编码占位图: {ext}")
+        out.append(buf.tobytes())
+    return out
+
+
+def write_placeholder_images(paths: Sequence[Path], image_size: int = 64, unique: bool = False,
+                             seed: int = 0, workers: int | None = None) -> int:
+    """写出占位图片, 返回写出的总字节数; 扩展名取自第一个路径."""
+    if not paths:
+        return 0
+    ext = Path(paths[0]).suffix.lower() or '.jpg'
+    variants = _placeholder_bytes(image_size, len(paths) if unique else min(_PLACEHOLDER_VARIANTS, len(paths)),
+                                  seed, ext)
+
+    def _write(i: int) -> int:
+        data = variants[i % len(variants)]
+        with open(paths[i], 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    if workers == 1 or len(paths) < 256:
+        return sum(_write(i) for i in range(len(paths)))
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        return sum(pool.map(_write, range(len(paths))))
+
+
+def _yolo_text(plan: SyntheticPlan, i: int) -> str:
+    a, b = plan.offsets[i], plan.offsets[i + 1]
+    return ''.join(f"{c} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}\n"
+                   for c, (cx, cy, w, h) in zip(plan.classes[a:b].tolist(), plan.boxes[a:b].tolist()))
+
+
+def _yolo_dirs(out_dir: Path, layout: str, split: str | None) -> Tuple[Path, Path]:
+    if layout == 'format1':
+        return out_dir / split / 'images', out_dir / split / 'labels'
+    if layout == 'format2':
+        return out_dir / 'images' / split, out_dir / 'labels' / split
+    if layout == 'standard':
+        return out_dir / 'images', out_dir / 'labels'
+    return out_dir, out_dir
+
+
+def generate_yolo(out_dir: str | Path, plan: SyntheticPlan, layout: str = 'standard', image_size: int = 64,
+                  ratios: Sequence[float] = (0.8, 0.1, 0.1), unique_images: bool = False, seed: int = 0,
+                  workers: int | None = None) -> Dict:
+    """写出 YOLO 数据集 (4 种结构之一) 与根目录 classes.txt; 无框的图片不写标签文件."""
+    from utils.yolo_utils import write_class_names
+    out_dir = Path(out_dir)
+    if layout in ('format1', 'format2'):
+        split_idx = assign_splits(plan, ratios, seed).tolist()
+        dirs = [_yolo_dirs(out_dir, layout, sp) for sp in SPLITS[:len(ratios)]]
+    else:
+        split_idx = [0] * len(plan.names)
+        dirs = [_yolo_dirs(out_dir, layout, None)]
+    for d in {d for pair in dirs for d in pair}:
+        d.mkdir(parents=True, exist_ok=True)
+    image_paths = []
+    for i, name in enumerate(plan.names):
+        img_dir, lbl_dir = dirs[split_idx[i]]
+        image_paths.append(img_dir / name)
+        if plan.offsets[i + 1] > plan.offsets[i]:
+            with open(lbl_dir / (os.path.splitext(name)[0] + '.txt'), 'w', encoding='utf-8') as f:
+                f.write(_yolo_text(plan, i))
+    image_bytes = write_placeholder_images(image_paths, image_size, unique_images, seed, workers)
+    write_class_names(out_dir / 'classes.txt', plan.class_names)
+    return _summary(plan, layout, out_dir, image_bytes)
+
+
+def generate_coco(out_dir: str | Path, plan: SyntheticPlan, image_size: int = 64, unique_images: bool = False,
+                  seed: int = 0, workers: int | None = None) -> Dict:
+    """写出 <out_dir>/annotations.json + images/ (coco_dataset_split.py 的输入结构), 类别 ID 从 0 开始."""
+    from utils.coco_stream import CocoStreamWriter
+    out_dir = Path(out_dir)
+    img_dir = out_dir / 'images'
+    img_dir.mkdir(parents=True, exist_ok=True)
+    pixel = plan.boxes * image_size
+    with CocoStreamWriter(out_dir / 'annotations.json', info={'description': 'synthetic'}) as writer:
+        for i, name in enumerate(plan.names):
+            writer.add_image({'file_name': name, 'id': i, 'width': image_size, 'height': image_size})
+            for j in range(plan.offsets[i], plan.offsets[i + 1]):
+                cx, cy, w, h = pixel[j].tolist()
+                x, y = round(cx - w / 2, 2), round(cy - h / 2, 2)
+                w, h = round(w, 2), round(h, 2)
+                writer.add_annotation({
+                    'id': writer.num_annotations, 'image_id': i, 'category_id': int(plan.classes[j]),
+                    'bbox': [x, y, w, h], 'area': round(w * h, 2), 'iscrowd': 0,
+                    'segmentation': [[x, y, x + w, y, x + w, y + h, x, y + h]],
+                })
+        writer.finish([{'id': k, 'name': n, 'supercategory': 'object'} for k, n in enumerate(plan.class_names)])
+    image_bytes = write_placeholder_images([img_dir / n for n in plan.names], image_size, unique_images, seed, workers)
+    with open(out_dir / 'classes.txt', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(plan.class_names))
+    return _summary(plan, 'coco', out_dir, image_bytes)
+
+
+_VOC_OBJECT = ("  <object><name>{name}</name><difficult>0</difficult>"
+               "<bndbox><xmin>{x1}</xmin><ymin>{y1}</ymin><xmax>{x2}</xmax><ymax>{y2}</ymax></bndbox></object>\n")
+
+
+def generate_voc(out_dir: str | Path, plan: SyntheticPlan, image_size: int = 64, unique_images: bool = False,
+                 seed: int = 0, workers: int | None = None) -> Dict:
+    """写出 Annotations/*.xml + JPEGImages/ (voc2yolo / voc2coco 的默认输入结构), 坐标为 1-based 整数像素."""
+    import numpy as np
+    out_dir = Path(out_dir)
+    xml_dir, img_dir = out_dir / 'Annotations', out_dir / 'JPEGImages'
+    xml_dir.mkdir(parents=True, exist_ok=True)
+    img_dir.mkdir(parents=True, exist_ok=True)
+    s = image_size
+    corners = np.empty_like(plan.boxes)
+    corners[:, :2] = plan.boxes[:, :2] - plan.boxes[:, 2:] / 2
+    corners[:, 2:] = plan.boxes[:, :2] + plan.boxes[:, 2:] / 2
+    corners = np.clip(np.rint(corners * s), 1, s - 1).astype(np.int64)
+    for i, name in enumerate(plan.names):
+        objects = ''.join(
+            _VOC_OBJECT.format(name=plan.class_names[c], x1=x1, y1=y1, x2=max(x2, x1 + 1), y2=max(y2, y1 + 1))
+            for c, (x1, y1, x2, y2) in zip(plan.classes[plan.offsets[i]:plan.offsets[i + 1]].tolist(),
+                                           corners[plan.offsets[i]:plan.offsets[i + 1]].tolist()))
+        with open(xml_dir / (os.path.splitext(name)[0] + '.xml'), 'w', encoding='utf-8') as f:
+            f.write(f"<annotation>\n  <folder>JPEGImages</folder><filename>{name}</filename>\n"
+                    f"  <size><width>{s}</width><height>{s}</height><depth>3</depth></size>\n"
+                    f"{objects}</annotation>\n")
+    image_bytes = write_placeholder_images([img_dir / n for n in plan.names], image_size, unique_images, seed, workers)
+    return _summary(plan, 'voc', out_dir, image_bytes)
+
+
+def write_mha(path: str | Path, image: np.ndarray) -> int:
+    """以 MetaImage (.mha, 头部 + 原始像素) 格式写出 2D uint8 图像, 不依赖 SimpleITK; 返回字节数."""
+    import numpy as np
+    h, w = image.shape
+    header = ("ObjectType = Image\nNDims = 2\nBinaryData = True\nBinaryDataByteOrderMSB = False\n"
+              "CompressedData = False\nElementSpacing = 1 1\n"
+              f"DimSize = {w} {h}\nElementType = MET_UCHAR\nElementDataFile = LOCAL\n").encode('ascii')
+    data = np.ascontiguousarray(image, dtype=np.uint8).tobytes()
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(data)
+    return len(header) + len(data)
+
+
+def generate_mha(out_dir: str | Path, plan: SyntheticPlan, image_size: int = 64, seed: int = 0) -> Dict:
+    """写出 *.mha 与 metadata.csv (convert_medical_to_yolo.py 的输入: img_name,x,y,width,height,label).
+
+    有框的图片每个框一行 label=1 (x, y 为左上角像素坐标), 无框的图片一行 label=0.
+    """
+    import numpy as np
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed + 2)
+    variants = [rng.integers(0, 256, size=(image_size, image_size), dtype=np.uint8)
+                for _ in range(min(_PLACEHOLDER_VARIANTS, max(1, len(plan.names))))]
+    pixel = plan.boxes * image_size
+    image_bytes = 0
+    rows = ['img_name,x,y,width,height,label']
+    for i, name in enumerate(plan.names):
+        mha_name = os.path.splitext(name)[0] + '.mha'
+        image_bytes += write_mha(out_dir / mha_name, variants[i % len(variants)])
+        if plan.offsets[i + 1] == plan.offsets[i]:
+            rows.append(f"{mha_name},0,0,0,0,0")
+        for cx, cy, w, h in pixel[plan.offsets[i]:plan.offsets[i + 1]].tolist():
+            rows.append(f"{mha_name},{cx - w / 2:.2f},{cy - h / 2:.2f},{w:.2f},{h:.2f},1")
+    with open(out_dir / 'metadata.csv', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(rows) + '\n')
+    return _summary(plan, 'mha', out_dir, image_bytes)
+
+
+def generate(out_dir: str | Path, fmt: str, plan: SyntheticPlan, image_size: int = 64,
+             ratios: Sequence[float] = (0.8, 0.1, 0.1), unique_images: bool = False, seed: int = 0,
+             workers: int | None = None) -> Dict:
+    """按格式名分派到对应生成函数, 返回摘要 dict."""
+    if fmt in YOLO_LAYOUTS:
+        return generate_yolo(out_dir, plan, fmt, image_size, ratios, unique_images, seed, workers)
+    if fmt == 'coco':
+        return generate_coco(out_dir, plan, image_size, unique_images, seed, workers)
+    if fmt == 'voc':
+        return generate_voc(out_dir, plan, image_size, unique_images, seed, workers)
+    if fmt == 'mha':
+        return generate_mha(out_dir, plan, image_size, seed)
+    raise ValueError(f"未知格式: {fmt} (可选: {', '.join(FORMATS)})")
+
+
+def _summary(plan: SyntheticPlan, fmt: str, out_dir: Path, image_bytes: int) -> Dict:
+    import numpy as np
+    counts = np.diff(plan.offsets)
+    return {
+        'format': fmt,
+        'path': str(out_dir),
+        'images': len(plan.names),
+        'labeled': int((counts > 0).sum()),
+        'boxes': int(plan.offsets[-1]),
+        'classes': len(plan.class_names),
+        'image_bytes': int(image_bytes),
+    }
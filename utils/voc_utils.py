@@ -0,0 +1,182 @@
+"""Pascal VOC XML 解析 (voc2yolo / voc2coco 共用).
+
+每个 XML 只解析一次: 进程池分块解析, 结果为紧凑的 VocRecord (类别名元组 + (n, 4) 框数组),
+图像尺寸直接取自 XML 的 <size> 节点, 不解码图片.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from utils.logging_utils import log_warn
+from utils.profiling import count_file
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def resolve_voc_dirs(in_root: Path, xml_dir: str | None = None, img_dir: str | None = None) -> Tuple[Path | None, Path]:
+    """推断 XML 与图片目录: 默认 <input>/Annotations 与 <input>/JPEGImages.
+
+    未显式指定且 Annotations 不存在时把 input 当作 XML 目录; 显式指定的 XML 目录不存在时返回 (None, 图片目录).
+    """
+    xml_path = Path(xml_dir) if xml_dir else (in_root / "Annotations")
+    img_path = Path(img_dir) if img_dir else (in_root / "JPEGImages")
+    if not xml_path.exists():
+        xml_path = None if xml_dir else in_root
+    return xml_path, img_path
+
+
+def collect_xml_files(xml_dir: Path) -> List[Path]:
+    xmls = [p for p in xml_dir.iterdir() if p.is_file() and p.suffix.lower() == ".xml"]
+    return sorted(xmls)
+
+
+def parse_voc_xml(path: Path, ignore_difficult: bool) -> Tuple[str, int, int, List[Dict]]:
+    try:
+        tree = ET.parse(path)
+        root = tree.getroot()
+    except Exception as e:
+        raise RuntimeError(f"解析 XML 失败: {path}: {e}")
+
+    def _text(node, name, default="0"):
+        el = node.find(name)
+        return el.text.strip() if el is not None and el.text else default
+
+    filename = root.findtext("filename", default="")
+    size = root.find("size")
+    if size is None:
+        raise RuntimeError(f"XML 缺少 size 节点: {path}")
+    w = int(_text(size, "width", "0"))
+    h = int(_text(size, "height", "0"))
+    if w <= 0 or h <= 0:
+        raise RuntimeError(f"无效的图像尺寸 w={w} h={h} in {path}")
+
+    objects: List[Dict] = []
+    for obj in root.findall("object"):
+        name = obj.findtext("name")
+        if not name:
+            continue
+        difficult = obj.findtext("difficult", default="0")
+        if ignore_difficult and difficult == "1":
+            continue
+        bnd = obj.find("bndbox")
+        if bnd is None:
+            continue
+        try:
+            xmin = float(bnd.findtext("xmin"))
+            ymin = float(bnd.findtext("ymin"))
+            xmax = float(bnd.findtext("xmax"))
+            ymax = float(bnd.findtext("ymax"))
+        except Exception:
+            continue
+        # VOC 坐标通常是 1-based 且包含像素；这里直接采用数值，不做 -1 修正，作为近似。
+        # 保证范围在图像内
+        xmin = max(0.0, min(xmin, w - 1))
+        ymin = max(0.0, min(ymin, h - 1))
+        xmax = max(0.0, min(xmax, w - 1))
+        ymax = max(0.0, min(ymax, h - 1))
+        if xmax <= xmin or ymax <= ymin:
+            continue
+        objects.append({
+            "name": name,
+            "bbox": (xmin, ymin, xmax, ymax),
+        })
+    return filename, w, h, objects
+
+
+class VocRecord(NamedTuple):
+    """单个 XML 的紧凑解析结果 (可跨进程传递); error 非空表示解析失败."""
+    xml_name: str
+    filename: str
+    width: int
+    height: int
+    names: Tuple[str, ...]
+    boxes: np.ndarray  # (n, 4) float64: xmin, ymin, xmax, ymax
+    error: str = ""
+
+
+def _parse_voc_chunk(paths: List[str], ignore_difficult: bool) -> List[VocRecord]:
+    import numpy as np
+    records = []
+    for p in paths:
+        path = Path(p)
+        try:
+            filename, w, h, objects = parse_voc_xml(path, ignore_difficult)
+        except Exception as e:
+            records.append(VocRecord(path.name, "", 0, 0, (), np.empty((0, 4)), str(e)))
+            continue
+        boxes = np.array([o["bbox"] for o in objects], dtype=np.float64).reshape(-1, 4)
+        records.append(VocRecord(path.name, filename, w, h, tuple(o["name"].strip() for o in objects), boxes))
+    return records
+
+
+def iter_voc_records(xml_files: List[Path], ignore_difficult: bool, workers: int | None = None,
+                     chunk_size: int = 256, progress_desc: str | None = "解析 XML") -> Iterator[VocRecord]:
+    """用进程池分块解析 XML (每个文件只解析一次), 按 xml_files 的顺序逐个产出结果."""
+    paths = [str(p) for p in xml_files]
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if workers == 1 or len(chunks) == 1:
+        pool = None
+        results: Iterable = (_parse_voc_chunk(c, ignore_difficult) for c in chunks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        results = pool.map(_parse_voc_chunk, chunks, [ignore_difficult] * len(chunks))
+    if progress_desc:
+        from tqdm import tqdm
+        results = tqdm(results, total=len(chunks), desc=progress_desc, unit="块")
+    try:
+        for chunk_records in results:
+            yield from chunk_records
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def parse_all_xml(xml_files: List[Path], ignore_difficult: bool, workers: int | None = None,
+                  chunk_size: int = 256) -> List[VocRecord]:
+    """解析全部 XML 并返回结果列表 (顺序与 xml_files 一致)."""
+    return list(iter_voc_records(xml_files, ignore_difficult, workers, chunk_size))
+
+
+def index_images(img_dir: Path, image_exts: List[str]) -> Dict[str, Path]:
+    """扫描一次图片目录建立 stem -> 图片 的索引; 同名多扩展时按 image_exts 顺序优先."""
+    rank = {e: i for i, e in enumerate(image_exts)}
+    best: Dict[str, Tuple[int, Path]] = {}
+    if not img_dir.exists():
+        return {}
+    with os.scandir(img_dir) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            r = rank.get(ext.lower())
+            if r is None or not entry.is_file():
+                continue
+            if stem not in best or r < best[stem][0]:
+                best[stem] = (r, Path(entry.path))
+    return {stem: path for stem, (_r, path) in best.items()}
+
+
+def copy_images_parallel(jobs: Dict[Path, Path], workers: int | None = None,
+                         progress_desc: str | None = "复制图片") -> int:
+    """线程池并行复制 {目标: 源} 图片, 返回成功数 (复制为 IO, 释放 GIL)."""
+    def _copy(dst: Path) -> bool:
+        try:
+            shutil.copyfile(jobs[dst], dst)
+            count_file(dst)
+            return True
+        except Exception as e:
+            log_warn(f"复制图片失败 {jobs[dst]} -> {dst}: {e}")
+            return False
+
+    if not jobs:
+        return 0
+    with ThreadPoolExecutor(max_workers=min(32, (workers or os.cpu_count() or 1) * 4)) as pool:
+        results: Iterable = pool.map(_copy, jobs)
+        if progress_desc:
+            from tqdm import tqdm
+            results = tqdm(results, total=len(jobs), desc=progress_desc)
+        return sum(results)
@@ -1,7 +1,13 @@
+from __future__ import annotations
+
 import os
 from pathlib import Path
-import yaml
-from typing import List, Tuple, Iterable
+from typing import TYPE_CHECKING, List, Tuple, Iterable
+
+from utils.manifest import list_dir
+
+if TYPE_CHECKING:
+    import numpy as np
 
 IMG_EXTS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp']
 CLASS_FILES = ['classes.txt', 'obj.names', 'names.txt']
@@ -24,6 +30,7 @@ def list_possible_class_files(base_dir: str | Path) -> List[str]:
 def read_class_names(path: str | Path) -> List[str]:
     path = str(path)
     if path.endswith(('.yaml', '.yml')):
+        import yaml
         try:
             with open(path, 'r', encoding='utf-8') as f:
                 data = yaml.safe_load(f) or {}
@@ -45,6 +52,7 @@ def read_class_names(path: str | Path) -> List[str]:
 def write_class_names(path: str | Path, names: List[str]) -> None:
     path = str(path)
     if path.endswith(('.yaml', '.yml')):
+        import yaml
         try:
             data = {}
             if os.path.exists(path):
@@ -113,7 +121,7 @@ def yolo_label_dirs(base_dir: str | Path, structure: str) -> List[str]:
 
 
 def iter_label_files(label_dir: str | Path, structure: str) -> Iterable[str]:
-    for f in os.listdir(label_dir):
+    for f in list_dir(label_dir):
         # 仅遍历 .txt 标签文件，并在任何结构下都跳过类别/配置文件
         if not f.endswith('.txt'):
             continue
@@ -122,6 +130,35 @@ def iter_label_files(label_dir: str | Path, structure: str) -> Iterable[str]:
         yield f
 
 
+def read_yolo_boxes(label_path: str | Path) -> np.ndarray:
+    """读取 YOLO 标签文件为 (N, 5) 数组 [class_id, cx, cy, w, h].
+
+    快速路径: 全部行恰为 5 列时整体转换; 否则逐行取前 5 列, 不足 5 列或非数值的行被跳过.
+    """
+    import numpy as np
+    try:
+        with open(label_path, 'r', encoding='utf-8', errors='replace') as f:
+            rows = [r for r in (ln.split() for ln in f) if r]
+    except OSError:
+        return np.empty((0, 5), dtype=np.float64)
+    if not rows:
+        return np.empty((0, 5), dtype=np.float64)
+    if all(len(r) == 5 for r in rows):
+        try:
+            return np.array(rows, dtype=np.float64)
+        except ValueError:
+            pass
+    out = []
+    for r in rows:
+        if len(r) < 5:
+            continue
+        try:
+            out.append([float(v) for v in r[:5]])
+        except ValueError:
+            continue
+    return np.array(out, dtype=np.float64).reshape(-1, 5)
+
+
 def get_folder_size(path: str | Path) -> float:
     total = 0
     try:
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""VOC (Pascal VOC XML) -> COCO 直接转换脚本
+
+输出: <output_dir>/annotations.json + images/ (与 coco_dataset_split.py 输入结构一致) 或单一 .json 文件
+类别: 自动聚合 object/name 或 --classes-file; 类别ID从 0 开始 (与 yolo2coco.py 一致)
+性能: 与 voc2yolo 共用单遍并行 XML 解析; 图像尺寸取自 XML <size>, 不解码图片;
+      COCO JSON 流式写出, 不生成中间 YOLO 目录
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Set
+
+from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, span, count, count_file
+from utils.yolo_utils import (
+    read_class_names,
+    write_class_names,
+    get_image_extensions,
+)
+from utils.voc_utils import (
+    collect_xml_files,
+    copy_images_parallel,
+    index_images,
+    iter_voc_records,
+    resolve_voc_dirs,
+)
+from utils.coco_stream import CocoStreamWriter
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="将 VOC XML 标注直接转换为 COCO JSON (不经过 YOLO 中间格式)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    p.add_argument("-i", "--input", required=True, help="输入 VOC 根目录 (包含 Annotations/ JPEGImages/ 或自定义) 或存放 XML 的目录")
+    p.add_argument("-o", "--output_dir", required=True,
+                   help="输出目录 (写 annotations.json + images/) 或以 .json 结尾的单一文件 (此时不复制图片)")
+    p.add_argument("--xml-dir", default=None, help="若 XML 不在 input/Annotations 下，可显式指定")
+    p.add_argument("--img-dir", default=None, help="若图片不在 input/JPEGImages 下，可显式指定")
+    p.add_argument("--classes-file", default=None, help="预先存在的类别文件 (txt 或 yaml)，若提供则以此为准")
+    p.add_argument("--allow-new-classes", action="store_true", help="当 XML 中出现 classes-file 里未定义的类别时，自动追加")
+    p.add_argument("--ignore-difficult", action="store_true", help="跳过 difficult=1 的目标对象")
+    p.add_argument("--image-exts", nargs="*", default=None, help="限定可匹配的图片扩展 (不含点). 默认=内置列表")
+    p.add_argument("--no-copy-images", action="store_true", help="仅生成 annotations.json，不复制图片")
+    p.add_argument("--workers", type=int, default=None, help="XML 解析进程数 / 复制线程数 (默认=CPU 核数; 1=单进程)")
+    p.add_argument("--verbose", action="store_true", help="打印更多调试信息")
+    add_profile_args(p)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tee_stdout_stderr(script_basename=Path(sys.argv[0]).stem)
+    start_profiling(args)
+
+    in_root = Path(args.input)
+    if not in_root.exists():
+        log_error(f"输入目录不存在: {in_root}")
+        sys.exit(1)
+
+    xml_dir, img_dir = resolve_voc_dirs(in_root, args.xml_dir, args.img_dir)
+    if xml_dir is None:
+        log_error(f"XML 目录不存在: {args.xml_dir}")
+        sys.exit(1)
+    if not img_dir.exists():
+        log_warn(f"图片目录不存在: {img_dir}")
+
+    xml_files = collect_xml_files(xml_dir)
+    if not xml_files:
+        log_error(f"未找到任何 XML: {xml_dir}")
+        sys.exit(1)
+    log_info(f"发现 XML 标注文件: {len(xml_files)}")
+
+    # 类别: 提供类别文件时以其为准, 否则按 XML 顺序首次出现的类别名依次编号 (与 voc2yolo 相同)
+    classes: List[str] = []
+    if args.classes_file:
+        classes = read_class_names(args.classes_file)
+        if not classes:
+            log_warn(f"指定 classes 文件为空或读取失败: {args.classes_file}")
+    fixed_classes = bool(classes) and not args.allow_new_classes
+    cls_to_id: Dict[str, int] = {c: i for i, c in enumerate(classes)}
+
+    out = Path(args.output_dir)
+    if out.suffix.lower() == ".json":
+        json_path, out_root, img_out_dir = out, out.parent, None
+    else:
+        json_path, out_root = out / "annotations.json", out
+        img_out_dir = None if args.no_copy_images else out / "images"
+    if img_out_dir is not None:
+        img_out_dir.mkdir(parents=True, exist_ok=True)
+    log_info(f"输出: {json_path}" + (f"; images -> {img_out_dir}" if img_out_dir else ""))
+
+    image_exts = [e.lower() for e in (args.image_exts if args.image_exts else [x[1:] for x in get_image_extensions()])]
+    image_exts = [f".{e}" if not e.startswith('.') else e for e in image_exts]
+    image_index = index_images(img_dir, image_exts)
+
+    workers = args.workers or os.cpu_count() or 1
+    missing_image = 0
+    failed_xml = 0
+    duplicate = 0
+    skipped_objects = 0
+    new_classes: List[str] = []
+    seen_names: Set[str] = set()
+    copy_jobs: Dict[Path, Path] = {}
+    info = {"description": f"VOC->COCO 转换 ({in_root.name})"}
+    with span('convert'), CocoStreamWriter(json_path, info=info) as writer:
+        for rec in iter_voc_records(xml_files, args.ignore_difficult, workers):
+            if rec.error:
+                failed_xml += 1
+                log_warn(f"跳过无法解析的 XML: {rec.xml_name}: {rec.error}")
+                continue
+            stem = Path(rec.filename).stem if rec.filename else Path(rec.xml_name).stem
+            img_path = image_index.get(stem)
+            if img_path is None:
+                missing_image += 1
+                if args.verbose:
+                    log_warn(f"未找到匹配图片: {stem}.* (仍写入标注)")
+                file_name = rec.filename or f"{stem}.jpg"
+            else:
+                file_name = img_path.name
+            if file_name in seen_names:
+                duplicate += 1
+                log_warn(f"重复的图片 {file_name} (来自 {rec.xml_name}), 已跳过")
+                continue
+            seen_names.add(file_name)
+
+            image_id = writer.num_images
+            writer.add_image({"file_name": file_name, "id": image_id, "width": rec.width, "height": rec.height})
+            for name, (xmin, ymin, xmax, ymax) in zip(rec.names, rec.boxes.tolist()):
+                if name not in cls_to_id:
+                    if fixed_classes:
+                        skipped_objects += 1
+                        if args.verbose:
+                            log_warn(f"未知类别 {name} (未启用 --allow-new-classes), 已跳过")
+                        continue
+                    cls_to_id[name] = len(cls_to_id)
+                    classes.append(name)
+                    if args.classes_file:
+                        new_classes.append(name)
+                box_w, box_h = xmax - xmin, ymax - ymin
+                writer.add_annotation({
+                    "id": writer.num_annotations,
+                    "image_id": image_id,
+                    "category_id": cls_to_id[name],
+                    "bbox": [xmin, ymin, box_w, box_h],
+                    "area": box_w * box_h,
+                    "iscrowd": 0,
+                    "segmentation": [[xmin, ymin, xmax, ymin, xmax, ymax, xmin, ymax]],
+                })
+            if img_path is not None and img_out_dir is not None:
+                copy_jobs[img_out_dir / img_path.name] = img_path
+
+        if not classes:
+            log_error("未能获取类别集合 (classes)；请显式提供 --classes-file")
+            sys.exit(1)
+        categories = [{"id": i, "name": name, "supercategory": "object"} for i, name in enumerate(classes)]
+        writer.finish(categories)
+        num_images, num_annotations = writer.num_images, writer.num_annotations
+        count('files', len(xml_files))
+        count('boxes', num_annotations)
+        count_file(json_path)
+    log_info(f"保存: {json_path}")
+
+    with span('copy'):
+        copied = copy_images_parallel(copy_jobs, workers)
+    cls_out = out_root / "classes.txt"
+    write_class_names(cls_out, classes)
+    log_info(f"已写入类别文件: {cls_out} (共 {len(classes)} 类)")
+    if new_classes:
+        log_info(f"新增类别 (allow-new-classes): {new_classes}")
+    log_info("===== 转换完成 =====")
+    log_info(f"XML 数: {len(xml_files)} (解析失败 {failed_xml}, 重复跳过 {duplicate})")
+    log_info(f"图像数: {num_images}")
+    log_info(f"标注数: {num_annotations}" + (f" (未知类别跳过 {skipped_objects})" if skipped_objects else ""))
+    log_info(f"复制图片: {copied}")
+    log_info(f"缺失图片(未复制): {missing_image}")
+    log_info(f"类别数: {len(classes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,24 +4,38 @@
 
 输出: standard(images/ + labels/) 或 mixed(同目录混放)
 类别: 自动聚合 object/name 或 --classes-file; 可生成 classes.txt / data.yaml
+性能: XML 只解析一遍 (进程池), 类别从解析结果聚合, 标签写出与图片复制用线程池并行
 """
 from __future__ import annotations
 
 import argparse
+import os
 import sys
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple, Set
+from typing import TYPE_CHECKING, List, Dict, Tuple, Set
 
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, span, count, count_file
 from utils.yolo_utils import (
     read_class_names,
     write_class_names,
     get_image_extensions,
 )
+from utils.voc_utils import (
+    VocRecord,
+    collect_xml_files,
+    copy_images_parallel,
+    index_images,
+    parse_all_xml,
+    resolve_voc_dirs,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     p = argparse.ArgumentParser(
         description="将 VOC XML 标注转换为 YOLO txt 标注 (standard 或 mixed 输出结构)",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -38,74 +52,22 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--overwrite", action="store_true", help="若输出目录已存在允许继续写入 (不清空)")
     p.add_argument("--image-exts", nargs="*", default=None, help="限定可复制的图片扩展 (不含点). 默认=内置列表")
     p.add_argument("--no-copy-images", action="store_true", help="仅生成 labels，不复制图片 (需自行保证 images/ 可访问)")
+    p.add_argument("--workers", type=int, default=None, help="XML 解析进程数 / 写出线程数 (默认=CPU 核数; 1=单进程)")
     p.add_argument("--verbose", action="store_true", help="打印更多调试信息")
-    return p.parse_args()
-
-
-def collect_xml_files(xml_dir: Path) -> List[Path]:
-    xmls = [p for p in xml_dir.iterdir() if p.is_file() and p.suffix.lower() == ".xml"]
-    return sorted(xmls)
-
-
-def parse_voc_xml(path: Path, ignore_difficult: bool) -> Tuple[str, int, int, List[Dict]]:
-    try:
-        tree = ET.parse(path)
-        root = tree.getroot()
-    except Exception as e:
-        raise RuntimeError(f"解析 XML 失败: {path}: {e}")
-
-    def _text(node, name, default="0"):
-        el = node.find(name)
-        return el.text.strip() if el is not None and el.text else default
+    add_profile_args(p)
+    return p.parse_args(argv)
 
-    filename = root.findtext("filename", default="")
-    size = root.find("size")
-    if size is None:
-        raise RuntimeError(f"XML 缺少 size 节点: {path}")
-    w = int(_text(size, "width", "0"))
-    h = int(_text(size, "height", "0"))
-    if w <= 0 or h <= 0:
-        raise RuntimeError(f"无效的图像尺寸 w={w} h={h} in {path}")
 
-    objects: List[Dict] = []
-    for obj in root.findall("object"):
-        name = obj.findtext("name")
-        if not name:
-            continue
-        difficult = obj.findtext("difficult", default="0")
-        if ignore_difficult and difficult == "1":
-            continue
-        bnd = obj.find("bndbox")
-        if bnd is None:
-            continue
-        try:
-            xmin = float(bnd.findtext("xmin"))
-            ymin = float(bnd.findtext("ymin"))
-            xmax = float(bnd.findtext("xmax"))
-            ymax = float(bnd.findtext("ymax"))
-        except Exception:
-            continue
-        # VOC 坐标通常是 1-based 且包含像素；这里直接采用数值，不做 -1 修正，作为近似。
-        # 保证范围在图像内
-        xmin = max(0.0, min(xmin, w - 1))
-        ymin = max(0.0, min(ymin, h - 1))
-        xmax = max(0.0, min(xmax, w - 1))
-        ymax = max(0.0, min(ymax, h - 1))
-        if xmax <= xmin or ymax <= ymin:
-            continue
-        objects.append({
-            "name": name,
-            "bbox": (xmin, ymin, xmax, ymax),
-        })
-    return filename, w, h, objects
-
-
-def voc_bbox_to_yolo(xmin: float, ymin: float, xmax: float, ymax: float, w: int, h: int) -> Tuple[float, float, float, float]:
-    cx = (xmin + xmax) / 2.0 / w
-    cy = (ymin + ymax) / 2.0 / h
-    bw = (xmax - xmin) / w
-    bh = (ymax - ymin) / h
-    return cx, cy, bw, bh
+def format_yolo_lines(class_ids: List[int], boxes: np.ndarray, w: int, h: int) -> List[str]:
+    """向量化计算一张图全部框的 YOLO 归一化坐标并格式化为标签行."""
+    if not class_ids:
+        return []
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2.0 / w
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2.0 / h
+    bw = (boxes[:, 2] - boxes[:, 0]) / w
+    bh = (boxes[:, 3] - boxes[:, 1]) / h
+    return [f"{c} {x:.6f} {y:.6f} {bw_:.6f} {bh_:.6f}"
+            for c, x, y, bw_, bh_ in zip(class_ids, cx.tolist(), cy.tolist(), bw.tolist(), bh.tolist())]
 
 
 def ensure_output_dirs(base: Path, structure: str, overwrite: bool) -> Tuple[Path, Path]:
@@ -121,22 +83,17 @@ def ensure_output_dirs(base: Path, structure: str, overwrite: bool) -> Tuple[Pat
         return base, base  # images 与 labels 在同一路径
 
 
-def load_or_collect_classes(args: argparse.Namespace, xml_files: List[Path]) -> List[str]:
+def load_or_collect_classes(args: argparse.Namespace, records: List[VocRecord]) -> List[str]:
     classes: List[str] = []
     if args.classes_file:
         classes = read_class_names(args.classes_file)
         if not classes:
             log_warn(f"指定 classes 文件为空或读取失败: {args.classes_file}")
-    if not classes:  # 自动收集
+    if not classes:  # 从解析结果自动收集 (按首次出现顺序去重)
         seen: List[str] = []
         seen_set: Set[str] = set()
-        for xp in xml_files:
-            try:
-                _, _, _, objs = parse_voc_xml(xp, args.ignore_difficult)
-            except Exception:
-                continue
-            for o in objs:
-                nm = o["name"].strip()
+        for rec in records:
+            for nm in rec.names:
                 if nm and nm not in seen_set:
                     seen.append(nm)
                     seen_set.add(nm)
@@ -144,9 +101,10 @@ def load_or_collect_classes(args: argparse.Namespace, xml_files: List[Path]) ->
     return classes
 
 
-def main():
-    args = parse_args()
+def main(argv=None):
+    args = parse_args(argv)
     tee_stdout_stderr(script_basename=Path(sys.argv[0]).stem)
+    start_profiling(args)
 
     in_root = Path(args.input)
     if not in_root.exists():
@@ -154,15 +112,10 @@ def main():
         sys.exit(1)
 
     # 推断 XML 与 图片目录
-    xml_dir = Path(args.xml_dir) if args.xml_dir else (in_root / "Annotations")
-    img_dir = Path(args.img_dir) if args.img_dir else (in_root / "JPEGImages")
-    if not xml_dir.exists():
-        # 若指定目录不存在，尝试直接把 input 当作 xml 存放目录
-        if args.xml_dir:
-            log_error(f"XML 目录不存在: {xml_dir}")
-            sys.exit(1)
-        else:
-            xml_dir = in_root
+    xml_dir, img_dir = resolve_voc_dirs(in_root, args.xml_dir, args.img_dir)
+    if xml_dir is None:
+        log_error(f"XML 目录不存在: {args.xml_dir}")
+        sys.exit(1)
     if not img_dir.exists():
         # 不强制存在 (可能用户只想要 labels)
         log_warn(f"图片目录不存在: {img_dir}")
@@ -173,7 +126,17 @@ def main():
         sys.exit(1)
     log_info(f"发现 XML 标注文件: {len(xml_files)}")
 
-    classes = load_or_collect_classes(args, xml_files)
+    workers = args.workers or os.cpu_count() or 1
+    with span('parse'):
+        records = parse_all_xml(xml_files, args.ignore_difficult, workers)
+        count('files', len(xml_files))
+        count('boxes', sum(len(rec.boxes) for rec in records if not rec.error))
+    for rec in records:
+        if rec.error:
+            log_warn(f"跳过无法解析的 XML: {rec.xml_name}: {rec.error}")
+    records = [rec for rec in records if not rec.error]
+
+    classes = load_or_collect_classes(args, records)
     if not classes:
         log_error("未能获取类别集合 (classes)；请显式提供 --classes-file")
         sys.exit(1)
@@ -186,35 +149,24 @@ def main():
 
     image_exts = [e.lower() for e in (args.image_exts if args.image_exts else [x[1:] for x in get_image_extensions()])]
     image_exts = [f".{e}" if not e.startswith('.') else e for e in image_exts]
+    image_index = index_images(img_dir, image_exts)
 
-    copied = 0
-    converted = 0
+    # 按 XML 顺序确定类别ID (含 --allow-new-classes 追加) 与输出任务; 同一 stem 以最后一个 XML 为准
     missing_image = 0
     new_classes: List[str] = []
-
-    for idx, xp in enumerate(xml_files, 1):
-        try:
-            filename, w, h, objects = parse_voc_xml(xp, args.ignore_difficult)
-        except Exception as e:
-            log_warn(f"跳过无法解析的 XML: {xp.name}: {e}")
-            continue
-        stem = Path(filename).stem if filename else xp.stem
-        # 查找图片 (同名，不同扩展)
-        img_path = None
-        if img_dir.exists():
-            for ext in image_exts:
-                cand = img_dir / f"{stem}{ext}"
-                if cand.is_file():
-                    img_path = cand
-                    break
+    label_jobs: Dict[str, Tuple[List[int], VocRecord]] = {}
+    copy_jobs: Dict[Path, Path] = {}
+    for rec in records:
+        stem = Path(rec.filename).stem if rec.filename else Path(rec.xml_name).stem
+        img_path = image_index.get(stem)
         if img_path is None:
             missing_image += 1
             if args.verbose:
                 log_warn(f"未找到匹配图片: {stem}.* (跳过图片复制，但仍生成标注)")
 
-        yolo_lines: List[str] = []
-        for obj in objects:
-            name = obj["name"].strip()
+        class_ids: List[int] = []
+        keep: List[int] = []
+        for j, name in enumerate(rec.names):
             if name not in cls_to_id:
                 if args.allow_new_classes:
                     cls_to_id[name] = len(cls_to_id)
@@ -224,30 +176,30 @@ def main():
                     if args.verbose:
                         log_warn(f"未知类别 {name} (未启用 --allow-new-classes), 已跳过")
                     continue
-            xmin, ymin, xmax, ymax = obj["bbox"]
-            cx, cy, bw, bh = voc_bbox_to_yolo(xmin, ymin, xmax, ymax, w, h)
-            yolo_lines.append(f"{cls_to_id[name]} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}")
+            class_ids.append(cls_to_id[name])
+            keep.append(j)
+        label_jobs[stem] = (class_ids, rec._replace(boxes=rec.boxes[keep]))
 
-        # 写 label
-        lbl_fp = lbl_out_dir / f"{stem}.txt"
-        with open(lbl_fp, "w", encoding="utf-8") as f:
-            f.write("\n".join(yolo_lines) + ("\n" if yolo_lines else ""))
-        converted += 1
-
-        # 复制图片
         if img_path and not args.no_copy_images:
             target_img = img_out_dir / img_path.name
-            if not target_img.exists():  # 简单避免重复复制
-                try:
-                    # 使用二进制复制
-                    with open(img_path, "rb") as rf, open(target_img, "wb") as wf:
-                        wf.write(rf.read())
-                    copied += 1
-                except Exception as e:
-                    log_warn(f"复制图片失败 {img_path} -> {target_img}: {e}")
+            if target_img not in copy_jobs and not target_img.exists():  # 简单避免重复复制
+                copy_jobs[target_img] = img_path
 
-        if args.verbose and idx % 100 == 0:
-            log_info(f"进度: {idx}/{len(xml_files)} 已转换 {converted} 个标签")
+    def write_label(stem: str) -> None:
+        class_ids, rec = label_jobs[stem]
+        yolo_lines = format_yolo_lines(class_ids, rec.boxes, rec.width, rec.height)
+        with open(lbl_out_dir / f"{stem}.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(yolo_lines) + ("\n" if yolo_lines else ""))
+        count_file(lbl_out_dir / f"{stem}.txt")
+
+    # 写 label 为小文件 IO, 线程池并行
+    from tqdm import tqdm
+    with span('write'), ThreadPoolExecutor(max_workers=min(32, workers * 4)) as pool:
+        for _ in tqdm(pool.map(write_label, label_jobs), total=len(label_jobs), desc="写出标签"):
+            pass
+    with span('copy'):
+        copied = copy_images_parallel(copy_jobs, workers)
+    converted = len(records)
 
     # 写类别文件
     cls_out = out_root / ("data.yaml" if args.save_yaml else "classes.txt")
@@ -7,16 +7,15 @@
 默认: 未显式指定输出目录时按结构给出合理默认 JSON 存放路径
 """
 import os
-import cv2
 import json
 import argparse
 import tempfile
 import subprocess
 from pathlib import Path
-from tqdm import tqdm
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, profiled, span, count, count_file
 from utils.yolo_utils import discover_class_names
-_LOG_FILE = tee_stdout_stderr('logs')
+from utils.manifest import list_dir
 
 IMAGE_EXTS = ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp']
 
@@ -77,7 +76,7 @@ def load_classes(root_dir: str):
 
 def iter_images(images_dir: str):
     """遍历图片文件名(保持原始顺序/稳定可排序)。"""
-    files = [f for f in os.listdir(images_dir) if Path(f).suffix.lower() in IMAGE_EXTS]
+    files = [f for f in list_dir(images_dir) if Path(f).suffix.lower() in IMAGE_EXTS]
     files.sort()
     return files
 
@@ -96,8 +95,11 @@ def read_label_file(label_path):
         return []
 
 
+@profiled('convert')
 def convert_split(split_name, images_dir, labels_dir, classes):
     """将一个分割(或整个数据集)转换为 COCO dict。"""
+    import cv2
+    from tqdm import tqdm
     categories = build_categories(classes)
     coco = {
         'info': {'description': f'YOLO->COCO 转换 ({split_name})'},
@@ -108,10 +110,13 @@ def convert_split(split_name, images_dir, labels_dir, classes):
     }
     class_count = len(categories) if categories else None
     ann_id = 0
+    skipped_lines = 0
     image_files = iter_images(images_dir)
     for img_id, img_name in enumerate(tqdm(image_files, desc=f'转换 {split_name}')):
         img_path = os.path.join(images_dir, img_name)
-        img = cv2.imread(img_path)
+        with span('decode'):
+            img = cv2.imread(img_path)
+            count_file(img_path)
         if img is None:
             log_warn(f'无法读取图片 {img_path}, 跳过。')
             continue
@@ -127,10 +132,13 @@ def convert_split(split_name, images_dir, labels_dir, classes):
         label_path = os.path.join(labels_dir, stem + '.txt')
         if not os.path.exists(label_path):
             continue  # 无标签图片仍保留
-        lines = read_label_file(label_path)
+        with span('parse'):
+            lines = read_label_file(label_path)
+            count('files')
         for line in lines:
             parts = line.split()
             if len(parts) < 5:
+                skipped_lines += 1
                 continue
             try:
                 cls_id = int(float(parts[0]))
@@ -141,6 +149,7 @@ def convert_split(split_name, images_dir, labels_dir, classes):
                         coco['categories'].append({'id': new_id, 'name': f'class_{new_id}', 'supercategory': 'object'})
                 x, y, bw, bh = map(float, parts[1:5])
             except Exception:
+                skipped_lines += 1
                 continue
             # YOLO (cx,cy,w,h) 归一化 -> COCO (x,y,width,height)
             x1 = (x - bw / 2.0) * w
@@ -157,16 +166,22 @@ def convert_split(split_name, images_dir, labels_dir, classes):
                 'segmentation': [[x1, y1, x1 + box_w, y1, x1 + box_w, y1 + box_h, x1, y1 + box_h]]
             })
             ann_id += 1
+    if skipped_lines:
+        log_warn(f'{split_name}: 跳过 {skipped_lines} 行格式异常的标注 (可用 yolo_dataset_analyzer.py --validate 定位)')
+    count('boxes', ann_id)
     return coco
 
 
+@profiled('write')
 def save_coco(coco_dict, output_path):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(coco_dict, f, ensure_ascii=False)
+    count_file(output_path)
     log_info(f'保存: {output_path}')
 
 
+@profiled('split')
 def maybe_split(temp_dir, output_dir, args):
     """若用户指定 --split, 调用 coco_dataset_split.py 进行再划分。"""
     ratios = [args.train_ratio, args.val_ratio, args.test_ratio]
@@ -190,7 +205,7 @@ def maybe_split(temp_dir, output_dir, args):
     subprocess.run(cmd, check=False)
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description='YOLO 转 COCO 工具 (多结构支持)',
         formatter_class=argparse.RawTextHelpFormatter
@@ -206,11 +221,14 @@ def parse_args():
     parser.add_argument('--val_ratio', type=float, default=0.1, help='(可选) 划分验证集比例')
     parser.add_argument('--test_ratio', type=float, default=0.1, help='(可选) 划分测试集比例')
     parser.add_argument('--seed', type=int, default=42, help='随机种子(传递给划分脚本)')
-    return parser.parse_args()
+    add_profile_args(parser)
+    return parser.parse_args(argv)
 
 
-def main():
-    args = parse_args()
+def main(argv=None):
+    args = parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     dataset_dir = args.dataset_dir
     if not os.path.exists(dataset_dir):
         log_error(f'数据集目录不存在: {dataset_dir}')
@@ -268,16 +286,18 @@ def main():
             # 拷贝图片 (COCO 划分脚本需要 images/ 目录)
             images_out = tmp_path / 'images'
             images_out.mkdir(exist_ok=True)
-            for f in iter_images(img_dir):
-                src = Path(img_dir) / f
-                dst = images_out / f
-                try:
-                    if src != dst:
-                        # 复制图片
-                        with open(src, 'rb') as fr, open(dst, 'wb') as fw:
-                            fw.write(fr.read())
-                except Exception as e:
-                    log_warn(f'复制图片失败: {src} -> {dst}: {e}')
+            with span('copy'):
+                for f in iter_images(img_dir):
+                    src = Path(img_dir) / f
+                    dst = images_out / f
+                    try:
+                        if src != dst:
+                            # 复制图片
+                            with open(src, 'rb') as fr, open(dst, 'wb') as fw:
+                                fw.write(fr.read())
+                            count_file(dst)
+                    except Exception as e:
+                        log_warn(f'复制图片失败: {src} -> {dst}: {e}')
             # 同时保存 classes.txt (若存在)
             if classes:
                 with open(tmp_path / 'classes.txt', 'w', encoding='utf-8') as f:
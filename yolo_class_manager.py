@@ -11,7 +11,7 @@ import argparse
 from collections import defaultdict
 from datetime import datetime
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
-_LOG_FILE = tee_stdout_stderr('logs')
+from utils.profiling import add_profile_args, start_profiling, profiled, count, count_file
 from utils.yolo_utils import (
     detect_yolo_structure,
     yolo_label_dirs,
@@ -23,6 +23,7 @@ from utils.yolo_utils import (
     get_folder_size,
 )
 
+@profiled('backup')
 def _backup_label_files_only(base_dir: str, structure: str) -> str:
     """仅备份标注文件(.txt，且排除 classes.txt/data.yaml 等)到独立目录."""
     label_dirs = yolo_label_dirs(base_dir, structure)
@@ -49,6 +50,7 @@ def _backup_label_files_only(base_dir: str, structure: str) -> str:
             dst = os.path.join(dst_dir, fname)
             try:
                 shutil.copy2(src, dst)
+                count_file(dst)
                 copied += 1
             except Exception as e:
                 log_warn(f"备份失败: {src} -> {dst} - {e}")
@@ -56,6 +58,7 @@ def _backup_label_files_only(base_dir: str, structure: str) -> str:
     log_info(f"已创建标注备份: {backup_dir} (共 {copied} 个标签文件)")
     return backup_dir
 
+@profiled('parse')
 def analyze_dataset_classes(base_dir):
     """分析数据集中的类别使用情况
     Returns: (class_usage: dict[int,int], class_names: list[str])
@@ -88,6 +91,8 @@ def analyze_dataset_classes(base_dir):
                             total_annotations += 1
             except Exception as e:
                 log_warn(f"无法读取标签文件 {label_path}: {e}")
+            count('files')
+    count('boxes', total_annotations)
     
     # 发现并读取类别名称
     class_names, src = discover_class_names(base_dir)
@@ -104,6 +109,7 @@ def analyze_dataset_classes(base_dir):
     return class_usage, class_names
 
 
+@profiled('delete')
 def delete_classes(base_dir, explicit_class_ids=None, backup=True, min_samples=None, min_percentage=None, assume_yes=False, dry_run=False):
     """删除类别：支持显式ID、最小样本数阈值、最小占比阈值."""
     explicit_class_ids = set(explicit_class_ids or [])
@@ -202,6 +208,7 @@ def delete_classes(base_dir, explicit_class_ids=None, backup=True, min_samples=N
                     updated_files += 1
             except Exception as e:
                 log_error(f"无法处理标签文件 {label_path}: {e}")
+            count('files')
 
     # 更新类别文件
     class_files = list_possible_class_files(base_dir)
@@ -390,6 +397,7 @@ def show_dataset_info(base_dir):
 
 
 
+@profiled('reindex')
 def reindex_classes(base_dir, target_class_names, strict=False, backup=True, dry_run=True, require_same_set=False):
     """根据目标类别顺序重排数据集中所有标签文件的类别ID，并更新类别文件.
 
@@ -491,6 +499,8 @@ def reindex_classes(base_dir, target_class_names, strict=False, backup=True, dry
                 updated_files += 1
             except Exception as e:
                 log_error(f"无法处理标签文件 {label_path}: {e}")
+            count('files')
+    count('boxes', total_annotations)
 
     # 更新类别文件
     if not dry_run:
@@ -512,7 +522,7 @@ def reindex_classes(base_dir, target_class_names, strict=False, backup=True, dry
     return True
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="YOLO数据集类别管理工具")
     parser.add_argument("--dataset_dir", "-d", required=True,
                        help="数据集目录路径")
@@ -563,7 +573,10 @@ def main():
     delete_parser.add_argument("--execute", action="store_true", help="实际执行删除(与 --dry-run 互斥，默认预览)")
     delete_parser.add_argument("--yes", action="store_true", help="无需确认直接执行")
     
-    args = parser.parse_args()
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     
     if not args.command:
         parser.print_help()
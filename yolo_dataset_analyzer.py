@@ -3,17 +3,28 @@
 """YOLO 数据集分析脚本
 
 检测结构(format1/format2/simple/mixed) 并统计图片/标注缺失、类别分布 (--stats)
+扩展: --geometry 按类别统计框几何分布与中心点热力图 (向量化 + 流式分位数)
+扩展: --validate 并行校验标签格式与取值范围, 输出紧凑的逐文件错误报告
+扩展: --check-images 并行检查图片头尾标记, 仅可疑文件完整解码, 报告损坏/截断图片
+扩展: --dedup 感知哈希近重复检测 (多索引哈希 + 磁盘缓存), 报告跨分割泄漏
+扩展: --report 输出 JSON 摘要 + Parquet 逐图表格, 按数据集指纹缓存, 未变化时直接复用
 输出: 基本统计表 + 类别分布表 + 每分割缺失/冗余报告
 """
 import os
 from pathlib import Path
 import argparse
-import yaml
 import random
-from prettytable import PrettyTable
-from utils.yolo_utils import get_image_extensions, detect_yolo_structure, discover_class_names
+import shutil
+from utils.yolo_utils import get_image_extensions, detect_yolo_structure, discover_class_names, read_yolo_boxes, iter_label_files
+from utils.dataset_cache import ReportCache, dataset_fingerprint, default_cache_dir, now_iso
+from utils.manifest import list_dir
+from utils.label_validation import ERROR_CODES, validate_label_files, format_file_errors
+from utils.image_hash import HashCache, hash_images, find_near_duplicate_groups
+from utils.image_integrity import INTEGRITY_CODES, FATAL_CODES, check_images
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
-_LOG_FILE = tee_stdout_stderr('logs')
+from utils.profiling import add_profile_args, start_profiling, span, count
+
+REPORT_VERSION = 1
 
 
 def get_image_extensions_local():
@@ -51,6 +62,7 @@ def find_data_yaml(dataset_dir):
 
 def load_class_names(dataset_dir):
     """加载类别名称"""
+    import yaml
     # 优先查找data.yaml
     yaml_path = find_data_yaml(dataset_dir)
     if yaml_path:
@@ -118,7 +130,7 @@ def detect_dataset_structure(dataset_dir):
     img_files = []
     
     try:
-        for file in os.listdir(dataset_dir):
+        for file in list_dir(dataset_dir):
             file_path = os.path.join(dataset_dir, file)
             if os.path.isfile(file_path):
                 if Path(file).suffix.lower() in img_exts:
@@ -177,7 +189,7 @@ def check_yolo_dataset(img_dir, label_dir, img_exts=None):
     
     # 处理混合结构（图片和标签在同一目录）
     if img_dir == label_dir:
-        all_files = os.listdir(img_dir)
+        all_files = list_dir(img_dir)
         
         # 获取图片文件名集合（不含扩展名）
         img_stems = set()
@@ -194,9 +206,9 @@ def check_yolo_dataset(img_dir, label_dir, img_exts=None):
     else:
         # 处理分离结构（图片和标签在不同目录）
         # 获取文件名集合（不含扩展名）
-        img_stems = {Path(f).stem for f in os.listdir(img_dir)
+        img_stems = {Path(f).stem for f in list_dir(img_dir)
                      if Path(f).suffix.lower() in img_exts}
-        label_stems = {Path(f).stem for f in os.listdir(label_dir)
+        label_stems = {Path(f).stem for f in list_dir(label_dir)
                        if Path(f).suffix.lower() == '.txt' and f not in excluded_txts}
 
     # 计算差异集合
@@ -245,73 +257,66 @@ def generate_report(split_name, missing, redundant):
             log_info(f"  ...（还有{len(redundant)-5}个）")
 
 
-def analyze_annotation_statistics(img_dir, label_dir, split_name="", class_names=None):
-    """分析标注统计信息"""
+def _iter_split_images(img_dir, label_dir, img_exts):
+    """遍历一个分割内的图片, 产出 (图片文件名, 标签路径或 None)."""
+    mixed = img_dir == label_dir
+    # 先查目录清单, 避免逐图 stat; 未命中时再 stat (兼容大小写不敏感的文件系统)
+    label_names = set(list_dir(label_dir)) if os.path.isdir(label_dir) else set()
+    for f in list_dir(img_dir):
+        if Path(f).suffix.lower() not in img_exts:
+            continue
+        label_path = Path(label_dir) / (Path(f).stem + '.txt')
+        # 混合结构下确保不是类别文件
+        if mixed and label_path.name in ['classes.txt', 'obj.names', 'names.txt']:
+            yield f, None
+        elif label_path.name in label_names or label_path.exists():
+            yield f, label_path
+        else:
+            yield f, None
+
+
+def analyze_annotation_statistics(img_dir, label_dir, split_name="", class_names=None, geometry=None, records=None):
+    """分析标注统计信息
+
+    geometry 为 GeometryAccumulator 时, 同一次读取的框数组同时计入几何统计;
+    records 为列表时, 逐图追加 {split, image, labeled, boxes, classes} 记录.
+    """
+    import numpy as np
     img_exts = get_image_extensions()
     total_images = 0
     labeled_images = 0
     total_boxes = 0
     class_counts = {}
     box_counts_per_image = []
-    
-    # 处理混合结构（图片和标签在同一目录）
-    if img_dir == label_dir:
-        all_files = os.listdir(img_dir)
-        
-        for f in all_files:
-            if Path(f).suffix.lower() in img_exts:
-                total_images += 1
-                label_path = Path(img_dir) / (Path(f).stem + '.txt')
-                
-                # 确保不是类别文件
-                if (label_path.exists() and 
-                    label_path.name not in ['classes.txt', 'obj.names', 'names.txt']):
-                    labeled_images += 1
-                    boxes_in_image = 0
-                    
-                    try:
-                        with open(label_path, 'r') as file:
-                            for line in file:
-                                parts = line.strip().split()
-                                if len(parts) >= 5:
-                                    class_id = int(float(parts[0]))
-                                    boxes_in_image += 1
-                                    total_boxes += 1
-                                    class_counts[class_id] = class_counts.get(class_id, 0) + 1
-                    except:
-                        continue
-                    
-                    box_counts_per_image.append(boxes_in_image)
-    else:
-        # 处理分离结构（图片和标签在不同目录）
-        for f in os.listdir(img_dir):
-            if Path(f).suffix.lower() in img_exts:
-                total_images += 1
-                label_path = Path(label_dir) / (Path(f).stem + '.txt')
-                
-                if label_path.exists():
-                    labeled_images += 1
-                    boxes_in_image = 0
-                    
-                    try:
-                        with open(label_path, 'r') as file:
-                            for line in file:
-                                parts = line.strip().split()
-                                if len(parts) >= 5:
-                                    class_id = int(float(parts[0]))
-                                    boxes_in_image += 1
-                                    total_boxes += 1
-                                    class_counts[class_id] = class_counts.get(class_id, 0) + 1
-                    except:
-                        continue
-                    
-                    box_counts_per_image.append(boxes_in_image)
-    
+
+    for f, label_path in _iter_split_images(img_dir, label_dir, img_exts):
+        total_images += 1
+        if label_path is None:
+            if records is not None:
+                records.append({'split': split_name, 'image': f, 'labeled': False, 'boxes': 0, 'classes': ''})
+            continue
+        labeled_images += 1
+        boxes = read_yolo_boxes(label_path)
+        ids = []
+        if len(boxes):
+            ids, counts = np.unique(boxes[:, 0].astype(np.int64), return_counts=True)
+            ids = ids.tolist()
+            for class_id, count in zip(ids, counts.tolist()):
+                class_counts[class_id] = class_counts.get(class_id, 0) + count
+            total_boxes += len(boxes)
+            if geometry is not None:
+                geometry.add(boxes)
+        box_counts_per_image.append(len(boxes))
+        if records is not None:
+            records.append({'split': split_name, 'image': f, 'labeled': True, 'boxes': len(boxes),
+                            'classes': ','.join(str(c) for c in ids)})
+
     return total_images, labeled_images, total_boxes, class_counts
 
 
 def create_basic_stats_table(all_stats):
     """创建基本统计信息表格"""
+    from prettytable import PrettyTable
     table = PrettyTable()
     table.field_names = ["数据集", "总图片数", "有标注图片数", "背景图片数", "标注框总数", "平均框数/图"]
     
@@ -356,6 +361,7 @@ def create_basic_stats_table(all_stats):
 
 def create_class_distribution_table(all_stats, class_names):
     """创建类别分布表格"""
+    from prettytable import PrettyTable
     # 收集所有类别ID
     all_class_ids = set()
     for stats in all_stats.values():
@@ -417,12 +423,290 @@ def create_class_distribution_table(all_stats, class_names):
     print(str(table))
 
 
-def analyze_dataset(dataset_dir, show_stats=False):
-    """分析整个数据集"""
+def create_geometry_table(geometry_report, class_names):
+    """创建按类别的标注框几何分布表 (P5/P50/P95) 与中心点热力图.
+
+    geometry_report 为 build_geometry_report 的结果 (可直接来自缓存 JSON).
+    """
+    import numpy as np
+    from prettytable import PrettyTable
+    from utils.box_stats import GEOMETRY_METRICS, render_ascii_heatmap
+    summary = geometry_report['classes']
+    if not summary:
+        log_warn("没有可用于几何统计的标注框")
+        return
+
+    table = PrettyTable()
+    table.field_names = ["类别ID", "类别名称", "框数", "宽 P5/P50/P95", "高 P5/P50/P95",
+                         "面积 P5/P50/P95", "宽高比 P5/P50/P95"]
+    for class_id, item in summary.items():
+        class_id = int(class_id)
+        class_name = class_names.get(class_id, f"Class_{class_id}") if class_names else f"Class_{class_id}"
+        row = [class_id, class_name, item['count']]
+        for m in GEOMETRY_METRICS:
+            q = item[m]['q']
+            fmt = '.2f' if m == 'aspect' else '.4f'
+            row.append('/'.join(format(v, fmt) for v in q))
+        table.add_row(row)
+
+    print("")
+    log_info("标注框几何分布 (归一化坐标; 宽高比=w/h 基于归一化宽高):")
+    print(str(table))
+    if geometry_report['invalid']:
+        log_warn(f"几何统计忽略了 {geometry_report['invalid']} 个宽高非正或非有限的框")
+
+    art = render_ascii_heatmap(np.array(geometry_report['heatmap']))
+    if art:
+        print("")
+        log_info("中心点位置热力图 (全部类别, 上=图像顶部, 左=图像左侧):")
+        print('+' + '-' * (len(art[0]) - 2) + '+')
+        for line in art:
+            print(line)
+        print('+' + '-' * (len(art[0]) - 2) + '+')
+
+
+def run_label_validation(paths, num_classes=None, workers=None):
+    """逐分割并行校验全部标签文件 (含无对应图片的冗余标签), 返回 {split: 校验汇总}."""
+    validation = {}
+    for split_name, img_dir, label_dir in paths:
+        structure = 'mixed' if img_dir == label_dir else 'standard'
+        files = [os.path.join(label_dir, f) for f in iter_label_files(label_dir, structure)]
+        summary = validate_label_files(files, num_classes=num_classes, workers=workers)
+        log_info(f"{split_name}: 校验 {summary['files']} 个标签文件, {summary['lines']} 行, "
+                 f"问题文件 {len(summary['bad_files'])} 个")
+        validation[split_name] = summary
+    return validation
+
+
+def print_validation_report(validation, max_files=20):
+    """输出标签校验汇总表与前若干个问题文件的紧凑报告."""
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    splits = list(validation.keys())
+    table.field_names = ["错误类型", "说明"] + splits + ["总计"]
+    any_error = False
+    for code, desc in ERROR_CODES.items():
+        counts = [validation[sp]['counts'].get(code, 0) for sp in splits]
+        if sum(counts) == 0:
+            continue
+        any_error = True
+        table.add_row([code, desc] + counts + [sum(counts)])
+
+    print("")
+    if not any_error:
+        log_info("标签校验通过: 未发现格式或取值问题")
+        return
+    log_info("标签校验汇总 (按行计数):")
+    print(str(table))
+
+    bad = [res for sp in splits for res in validation[sp]['bad_files']]
+    log_warn(f"问题文件共 {len(bad)} 个, 显示前 {min(max_files, len(bad))} 个:")
+    for res in bad[:max_files]:
+        log_info(f"  - {res['file']}: {'; '.join(format_file_errors(res))}")
+    if len(bad) > max_files:
+        log_info(f"  ...（还有{len(bad) - max_files}个, 使用 --validate-out 导出完整报告）")
+
+
+def write_validation_report(validation, out_path):
+    """写出完整的逐文件校验报告 (每行: 分割<TAB>文件<TAB>错误摘要)."""
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for split_name, summary in validation.items():
+            for res in summary['bad_files']:
+                f.write(f"{split_name}\t{res['file']}\t{'; '.join(format_file_errors(res))}\n")
+    log_info(f"逐文件校验报告已保存: {out_path}")
+
+
+def _list_split_images(img_dir):
+    """列出一个分割目录下的全部图片路径 (排序)."""
+    img_exts = get_image_extensions()
+    return sorted(os.path.join(img_dir, f) for f in list_dir(img_dir) if Path(f).suffix.lower() in img_exts)
+
+
+def run_integrity_check(paths, workers=None, full_decode=False):
+    """逐分割并行检查图片完整性, 返回 {split: 检查汇总}."""
+    integrity = {}
+    for split_name, img_dir, _label_dir in paths:
+        summary = check_images(_list_split_images(img_dir), workers=workers, full_decode=full_decode,
+                               progress_desc=f"检查图片 {split_name}")
+        integrity[split_name] = summary
+    return integrity
+
+
+def print_integrity_report(integrity, max_files=20):
+    """输出图片完整性检查汇总表与前若干个问题文件."""
+    from prettytable import PrettyTable
+    splits = list(integrity.keys())
+    table = PrettyTable()
+    table.field_names = ["问题类型", "说明"] + splits + ["总计"]
+    for code, desc in INTEGRITY_CODES.items():
+        counts = [integrity[sp]['counts'].get(code, 0) for sp in splits]
+        if sum(counts):
+            table.add_row([code, desc] + counts + [sum(counts)])
+
+    print("")
+    total = sum(integrity[sp]['files'] for sp in splits)
+    bad = [(sp, p, code) for sp in splits for p, code in integrity[sp]['bad_files']]
+    if not bad:
+        log_info(f"图片完整性检查通过: {total} 张图片均正常")
+        return
+    log_info(f"图片完整性检查 (共 {total} 张):")
+    print(str(table))
+    fatal = sum(1 for _sp, _p, code in bad if code in FATAL_CODES)
+    if fatal:
+        log_error(f"{fatal} 张图片无法读取或解码, yolo2coco 转换与训练时会失败")
+    log_warn(f"问题图片共 {len(bad)} 张, 显示前 {min(max_files, len(bad))} 张:")
+    for sp, p, code in bad[:max_files]:
+        log_info(f"  - [{sp}] {p}: {code}")
+    if len(bad) > max_files:
+        log_info(f"  ...（还有{len(bad) - max_files}张, 使用 --integrity-out 导出完整列表）")
+
+
+def write_integrity_report(integrity, out_path):
+    """写出全部问题图片 (每行: 分割<TAB>问题类型<TAB>路径)."""
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for split_name, summary in integrity.items():
+            for p, code in summary['bad_files']:
+                f.write(f"{split_name}\t{code}\t{p}\n")
+    log_info(f"问题图片列表已保存: {out_path}")
+
+
+def run_duplicate_detection(paths, threshold=4, hash_cache=None, workers=None):
+    """计算全部图片的感知哈希并查找近重复簇, 标记跨分割 (train/val/test 之间泄漏) 的簇."""
+    split_of = {}
+    for split_name, img_dir, _label_dir in paths:
+        for p in _list_split_images(img_dir):
+            split_of[p] = split_name
+    all_paths = list(split_of.keys())
+
+    cache = HashCache(hash_cache) if hash_cache else None
+    try:
+        hashes, failed = hash_images(all_paths, cache=cache, workers=workers, progress_desc='计算感知哈希')
+    finally:
+        if cache is not None:
+            cache.close()
+    hashed_paths = [p for p in all_paths if p in hashes]
+    groups = find_near_duplicate_groups([hashes[p] for p in hashed_paths], threshold)
+
+    clusters = []
+    for g in groups:
+        members = [{'split': split_of[hashed_paths[i]], 'path': hashed_paths[i],
+                    'hash': format(hashes[hashed_paths[i]], '016x')} for i in g]
+        members.sort(key=lambda m: (m['split'], m['path']))
+        clusters.append({
+            'cross_split': len({m['split'] for m in members}) > 1,
+            'splits': sorted({m['split'] for m in members}),
+            'members': members,
+        })
+    # 跨分割簇优先, 其次按簇大小
+    clusters.sort(key=lambda c: (not c['cross_split'], -len(c['members'])))
+    return {
+        'threshold': threshold,
+        'images': len(all_paths),
+        'failed': failed,
+        'clusters': clusters,
+        'cross_split_clusters': sum(1 for c in clusters if c['cross_split']),
+        'duplicate_images': sum(len(c['members']) for c in clusters),
+    }
+
+
+def print_duplicate_report(dup, max_clusters=10):
+    """输出近重复/跨分割泄漏检测结果."""
+    print("")
+    log_info(f"近重复检测 (pHash 汉明距离 <= {dup['threshold']}): 共 {dup['images']} 张图片")
+    if dup['failed']:
+        log_warn(f"无法读取/计算哈希的图片: {len(dup['failed'])} 张")
+    log_info(f"重复簇: {len(dup['clusters'])} 个, 涉及图片 {dup['duplicate_images']} 张")
+    if dup['cross_split_clusters']:
+        log_warn(f"跨分割重复簇 (数据泄漏): {dup['cross_split_clusters']} 个")
+    else:
+        log_info("未发现跨分割重复")
+    for idx, c in enumerate(dup['clusters'][:max_clusters], 1):
+        tag = '跨分割' if c['cross_split'] else '同分割'
+        log_info(f"  簇{idx} [{tag}] {len(c['members'])} 张 ({'/'.join(c['splits'])}):")
+        for m in c['members'][:6]:
+            log_info(f"    - {m['split']}: {m['path']}")
+        if len(c['members']) > 6:
+            log_info(f"    ...（还有{len(c['members']) - 6}张）")
+    if len(dup['clusters']) > max_clusters:
+        log_info(f"  ...（还有{len(dup['clusters']) - max_clusters}个簇, 使用 --dedup-out 导出完整列表）")
+
+
+def write_duplicate_report(dup, out_path):
+    """写出全部重复簇 (TSV: 簇编号, 是否跨分割, 分割, 哈希, 路径)."""
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write("cluster\tcross_split\tsplit\thash\tpath\n")
+        for idx, c in enumerate(dup['clusters'], 1):
+            for m in c['members']:
+                f.write(f"{idx}\t{int(c['cross_split'])}\t{m['split']}\t{m['hash']}\t{m['path']}\n")
+    log_info(f"重复簇列表已保存: {out_path}")
+
+
+def build_geometry_report(geometry):
+    """把 GeometryAccumulator 汇总为可 JSON 序列化的 dict."""
+    summary = geometry.summary()
+    return {
+        'invalid': geometry.invalid,
+        'bins': geometry.bins,
+        'classes': {str(cid): item for cid, item in summary.items()},
+        'heatmap': geometry.heatmap().tolist(),
+    }
+
+
+def print_report(report, class_names, show_stats=False, geometry=False, validate=False, dedup=False,
+                 check_imgs=False):
+    """按固定顺序输出分析报告 (新扫描与缓存命中共用)."""
+    splits = report['splits']
+    all_stats = {
+        name: (sp['images'], sp['labeled'], sp['boxes'], {int(k): v for k, v in sp['class_counts'].items()})
+        for name, sp in splits.items() if 'images' in sp
+    }
+    # 输出顺序：1. 类别分布统计表（如果有统计）
+    if show_stats and all_stats:
+        create_class_distribution_table(all_stats, class_names)
+        
+        # 2. 数据集基本统计信息
+        create_basic_stats_table(all_stats)
+
+    if geometry and report.get('geometry'):
+        create_geometry_table(report['geometry'], class_names)
+
+    if validate and report.get('validation'):
+        print_validation_report(report['validation'])
+
+    if check_imgs and report.get('integrity'):
+        print_integrity_report(report['integrity'])
+
+    if dedup and report.get('duplicates'):
+        print_duplicate_report(report['duplicates'])
+
+    # 3. 总体摘要
+    print("")
+    log_info(f"{'='*30} 总体摘要 {'='*30}")
+    log_info(f"数据集分割数: {len(splits)}")
+    log_info(f"总缺失标注: {report['totals']['missing_labels']}")
+    log_info(f"总冗余标注: {report['totals']['redundant_labels']}")
+    
+    # 4. 检查报告（最后显示）
+    for split_name, sp in splits.items():
+        generate_report(split_name, sp['missing_labels'], sp['redundant_labels'])
+
+
+def analyze_dataset(dataset_dir, show_stats=False, geometry=False, geometry_out=None, geometry_bins=32,
+                    report_dir=None, cache_dir=None, use_cache=True,
+                    validate=False, num_classes=None, validate_out=None, workers=None,
+                    dedup=False, hash_threshold=4, hash_cache=None, dedup_out=None,
+                    check_imgs=False, full_decode=False, integrity_out=None):
+    """分析整个数据集, 返回结构化报告 dict.
+
+    report_dir 非空时输出 report.json + 逐图表格 (Parquet, 无 pyarrow 时为 CSV),
+    并按数据集指纹缓存; 指纹未变时直接复用缓存报告而不重新扫描标签.
+    """
+    from utils.box_stats import GeometryAccumulator
     log_info(f"开始分析数据集: {dataset_dir}")
     
     # 检测数据集结构
-    structure, paths = get_dataset_paths(dataset_dir)
+    with span('scan'):
+        structure, paths = get_dataset_paths(dataset_dir)
     
     if not paths:
         log_error("未找到有效的YOLO数据集结构")
@@ -431,7 +715,7 @@ def analyze_dataset(dataset_dir, show_stats=False):
         log_info("  2. 格式二: dataset/images/train/ + dataset/labels/train/ 等")
         log_info("  3. 简单结构: dataset/images/ + dataset/labels/")
         log_info("  4. 混合结构: 图片和txt标签文件在同一个文件夹中")
-        return
+        return None
     
     # 加载类别名称
     # 优先复用统一的类别名发现工具
@@ -452,59 +736,202 @@ def analyze_dataset(dataset_dir, show_stats=False):
         log_info(f"加载了 {len(class_names)} 个类别名称")
     else:
         log_warn("未找到类别名称文件 (classes.txt 或 data.yaml)")
+
+    # 指纹与缓存 (仅在需要结构化报告时启用, 不读取文件内容)
+    cache = None
+    fingerprint = None
+    if report_dir:
+        options = {'report_version': REPORT_VERSION, 'geometry': bool(geometry), 'geometry_bins': geometry_bins,
+                   'class_names': {str(k): v for k, v in class_names.items()},
+                   'validate': bool(validate), 'num_classes': num_classes,
+                   'dedup': bool(dedup), 'hash_threshold': hash_threshold,
+                   'check_images': bool(check_imgs), 'full_decode': bool(full_decode)}
+        with span('fingerprint'):
+            fingerprint = dataset_fingerprint(
+                [(f"{sp}/images", img) for sp, img, _lbl in paths] + [(f"{sp}/labels", lbl) for sp, _img, lbl in paths],
+                options,
+            )
+        cache = ReportCache(cache_dir or default_cache_dir(dataset_dir, 'analysis'))
+        log_info(f"数据集指纹: {fingerprint}")
+        cached = cache.load(fingerprint) if use_cache else None
+        if cached is not None:
+            log_info(f"指纹未变化, 复用缓存报告 (生成于 {cached.get('created')})")
+            print_report(cached, class_names, show_stats, geometry, validate, dedup, check_imgs)
+            if validate and validate_out and cached.get('validation'):
+                write_validation_report(cached['validation'], validate_out)
+            if dedup and dedup_out and cached.get('duplicates'):
+                write_duplicate_report(cached['duplicates'], dedup_out)
+            if check_imgs and integrity_out and cached.get('integrity'):
+                write_integrity_report(cached['integrity'], integrity_out)
+            cache.export(fingerprint, report_dir)
+            _copy_cached_geometry(cache, fingerprint, geometry_out)
+            log_info(f"结构化报告已输出: {report_dir}")
+            return cached
     
     # 分析每个数据集分割（收集统计信息但不显示检查报告）
     total_missing = 0
     total_redundant = 0
-    all_stats = {}
-    missing_reports = []
+    geometry_acc = GeometryAccumulator(bins=geometry_bins) if geometry else None
+    records = [] if report_dir else None
+    collect_stats = show_stats or geometry or bool(report_dir)
+    report = {
+        'version': REPORT_VERSION,
+        'tool': 'yolo_dataset_analyzer',
+        'fingerprint': fingerprint,
+        'created': now_iso(),
+        'dataset_dir': os.path.abspath(dataset_dir),
+        'structure': structure,
+        'class_names': {str(k): v for k, v in class_names.items()},
+        'splits': {},
+    }
     
     for split_name, img_dir, label_dir in paths:
         # 检查对应关系
-        missing, redundant = check_yolo_dataset(img_dir, label_dir)
-        missing_reports.append((split_name, missing, redundant))
+        with span('check'):
+            missing, redundant = check_yolo_dataset(img_dir, label_dir)
+        split_report = {'missing_labels': missing, 'redundant_labels': redundant}
         
         total_missing += len(missing)
         total_redundant += len(redundant)
         
-        # 统计分析
-        if show_stats:
-            stats = analyze_annotation_statistics(img_dir, label_dir, split_name, class_names)
-            all_stats[split_name] = stats
-    
-    # 输出顺序：1. 类别分布统计表（如果有统计）
-    if show_stats and all_stats:
-        create_class_distribution_table(all_stats, class_names)
-        
-        # 2. 数据集基本统计信息
-        create_basic_stats_table(all_stats)
-    
-    # 3. 总体摘要
-    print("")
-    log_info(f"{'='*30} 总体摘要 {'='*30}")
-    log_info(f"数据集分割数: {len(paths)}")
-    log_info(f"总缺失标注: {total_missing}")
-    log_info(f"总冗余标注: {total_redundant}")
-    
-    # 4. 检查报告（最后显示）
-    for split_name, missing, redundant in missing_reports:
-        generate_report(split_name, missing, redundant)
+        # 统计分析 (几何统计与逐图记录复用同一次标签读取)
+        if collect_stats:
+            with span('parse'):
+                imgs, labeled, boxes, class_counts = analyze_annotation_statistics(
+                    img_dir, label_dir, split_name, class_names, geometry_acc, records)
+                count('files', labeled)
+                count('boxes', boxes)
+            split_report.update({
+                'images': imgs,
+                'labeled': labeled,
+                'background': imgs - labeled,
+                'boxes': boxes,
+                'class_counts': {str(k): v for k, v in sorted(class_counts.items())},
+            })
+        report['splits'][split_name] = split_report
+
+    report['totals'] = {
+        'missing_labels': total_missing,
+        'redundant_labels': total_redundant,
+    }
+    if collect_stats:
+        for key in ('images', 'labeled', 'background', 'boxes'):
+            report['totals'][key] = sum(sp[key] for sp in report['splits'].values())
+    if geometry_acc is not None:
+        report['geometry'] = build_geometry_report(geometry_acc)
+    if validate:
+        # 未显式指定类别数时按类别文件推断; 无类别文件则只检查负数ID
+        n_cls = num_classes if num_classes else (len(class_names) or None)
+        log_info(f"开始并行校验标签 (类别数上限: {n_cls if n_cls else '未知'})")
+        with span('validate'):
+            report['validation'] = run_label_validation(paths, n_cls, workers)
+            count('files', sum(sp['files'] for sp in report['validation'].values()))
+
+    if check_imgs:
+        log_info("开始检查图片完整性" + (" (全部完整解码)" if full_decode else " (文件头/尾标记, 可疑文件完整解码)"))
+        with span('decode'):
+            report['integrity'] = run_integrity_check(paths, workers, full_decode)
+            count('files', sum(sp['files'] for sp in report['integrity'].values()))
+
+    if dedup:
+        hash_cache = hash_cache or default_cache_dir(dataset_dir, 'analysis') / 'phash.sqlite'
+        with span('dedup'):
+            report['duplicates'] = run_duplicate_detection(paths, hash_threshold, hash_cache, workers)
+            count('files', report['duplicates']['images'])
+
+    print_report(report, class_names, show_stats, geometry, validate, dedup, check_imgs)
+    if validate and validate_out:
+        write_validation_report(report['validation'], validate_out)
+    if dedup and dedup_out:
+        write_duplicate_report(report['duplicates'], dedup_out)
+    if check_imgs and integrity_out:
+        write_integrity_report(report['integrity'], integrity_out)
+
+    if geometry_acc is not None and geometry_out:
+        geometry_acc.save_npz(geometry_out)
+        log_info(f"几何统计已保存: {geometry_out}")
+
+    if cache is not None:
+        with span('write'):
+            entry = cache.save(fingerprint, report, records)
+            if geometry_acc is not None:
+                geometry_acc.save_npz(entry / 'geometry.npz')
+            cache.export(fingerprint, report_dir)
+        log_info(f"结构化报告已输出: {report_dir}")
+    return report
+
+
+def _copy_cached_geometry(cache, fingerprint, geometry_out):
+    """缓存命中时, 从缓存条目复制几何统计 npz 到指定位置."""
+    if not geometry_out:
+        return
+    src = cache.entry_dir(fingerprint) / 'geometry.npz'
+    if src.is_file():
+        shutil.copy2(src, geometry_out)
+        log_info(f"几何统计已保存: {geometry_out}")
+    else:
+        log_warn("缓存中没有几何统计 npz, 请配合 --no-cache 重新扫描")
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="YOLO数据集分析工具 - 支持多种数据集结构")
     parser.add_argument('--dataset_dir', '-d', required=True, 
                        help='数据集根目录路径')
     parser.add_argument('--stats', '-s', action='store_true', 
                        help='显示详细统计信息')
-    
-    args = parser.parse_args()
+    parser.add_argument('--geometry', '-g', action='store_true',
+                       help='按类别统计框宽/高/面积/宽高比分布与中心点热力图 (流式分位数, 内存固定)')
+    parser.add_argument('--geometry-out',
+                       help='将各类别热力图与分位数保存为 .npz 文件 (配合 --geometry)')
+    parser.add_argument('--geometry-bins', type=int, default=32,
+                       help='中心点热力图分辨率 (默认: 32x32)')
+    parser.add_argument('--validate', action='store_true',
+                       help='并行校验全部标签: 非数值/类别越界/坐标越界/宽高非正/重复行等')
+    parser.add_argument('--num-classes', type=int,
+                       help='校验时的类别数上限 (默认: 按类别文件推断)')
+    parser.add_argument('--validate-out',
+                       help='保存完整的逐文件校验报告 (TSV 文本)')
+    parser.add_argument('--check-images', action='store_true',
+                       help='并行检查图片完整性 (JPEG/PNG 头尾标记, 可疑文件完整解码), 按分割报告损坏图片')
+    parser.add_argument('--full-decode', action='store_true',
+                       help='配合 --check-images, 对所有图片做完整解码 (较慢)')
+    parser.add_argument('--integrity-out',
+                       help='保存全部问题图片列表 (TSV 文本)')
+    parser.add_argument('--dedup', action='store_true',
+                       help='感知哈希近重复检测, 报告跨 train/val/test 的重复簇 (数据泄漏)')
+    parser.add_argument('--hash-threshold', type=int, default=4,
+                       help='近重复判定的 pHash 汉明距离阈值 ∈ [0,64] (默认: 4, 0 为完全相同)')
+    parser.add_argument('--hash-cache',
+                       help='感知哈希缓存文件 (默认: 用户缓存目录下 medds/analysis/<数据集名>-<路径哈希>/phash.sqlite)')
+    parser.add_argument('--dedup-out',
+                       help='保存全部重复簇列表 (TSV 文本)')
+    parser.add_argument('--workers', type=int,
+                       help='并行进程数 (默认: CPU 核数)')
+    parser.add_argument('--report',
+                       help='输出结构化报告目录 (report.json + images.parquet), 并按数据集指纹缓存')
+    parser.add_argument('--cache-dir',
+                       help='报告缓存目录 (默认: 用户缓存目录下 medds/analysis/<数据集名>-<路径哈希>, 不写入数据集)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='忽略已有缓存, 强制重新扫描 (仍会写入新缓存)')
+    
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     
     if not os.path.exists(args.dataset_dir):
         log_error(f"错误: 数据集目录不存在: {args.dataset_dir}")
         return
     
-    analyze_dataset(args.dataset_dir, args.stats)
+    analyze_dataset(args.dataset_dir, args.stats, geometry=args.geometry,
+                    geometry_out=args.geometry_out, geometry_bins=args.geometry_bins,
+                    report_dir=args.report, cache_dir=args.cache_dir, use_cache=not args.no_cache,
+                    validate=args.validate, num_classes=args.num_classes,
+                    validate_out=args.validate_out, workers=args.workers,
+                    dedup=args.dedup, hash_threshold=args.hash_threshold,
+                    hash_cache=args.hash_cache, dedup_out=args.dedup_out,
+                    check_imgs=args.check_images, full_decode=args.full_decode,
+                    integrity_out=args.integrity_out)
 
 
 if __name__ == "__main__":
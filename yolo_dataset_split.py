@@ -5,13 +5,16 @@
 输入: standard(images/+labels/) 或 mixed(同目录混合) 结构
 输出: 可选 format1(train/val/test 子目录) 或 format2(images/train, labels/train)
 特性: 支持 2/3 集合比例、随机种子、类别文件复制与统计报告
+扩展: --stratify 基于 图片x类别 矩阵的迭代分层, 稀有类别不会在验证/测试集中缺失
+扩展: --hash-split 流式哈希划分 (按文件名/分组键的带种子哈希, 跨机器稳定, 内存恒定)
+扩展: --kfold K 一次计算全部折分配, 各折以图片列表/符号链接/硬链接物化, 不复制文件
+扩展: --save-plan/--plan 导出/导入划分方案 (stem->集合 + 指纹), 按方案一次复制/链接即可重建
+扩展: --group-regex/--group-csv 按患者/体数据分组划分, 防止切片跨集合泄漏
 """
 import os
 import shutil
 import random
 import argparse
-from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
-_LOG_FILE = tee_stdout_stderr('logs')
 from collections import defaultdict
 from utils.yolo_utils import (
     get_image_extensions,
@@ -19,16 +22,28 @@ from utils.yolo_utils import (
     read_class_names,
     discover_class_names,
 )
+from utils.split_utils import (
+    pairs_to_csr, iterative_stratify, load_group_csv, resolve_group_keys, hash_group_index, group_stratify,
+    make_group_key_fn, hash_split_index, save_split_plan, load_split_plan,
+)
+from utils.dataset_cache import dataset_fingerprint
+from utils.manifest import list_dir
+from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, profiled, count, count_file
 
 
 def get_image_extensions_local():
     return get_image_extensions()
 
 
-def find_corresponding_image(label_file, images_dir, structure='standard'):
-    """根据标签文件找到对应的图片文件"""
+def find_corresponding_image(label_file, images_dir, structure='standard', image_names=None):
+    """根据标签文件找到对应的图片文件; image_names 为图片目录清单时先查清单, 未命中再逐扩展名 stat"""
     base_name = os.path.splitext(label_file)[0]
     image_extensions = get_image_extensions()
+    if image_names is not None:
+        for ext in image_extensions:
+            if base_name + ext in image_names:
+                return base_name + ext
     
     if structure == 'mixed':
         # 混合结构：图片和标签在同一目录
@@ -65,7 +80,7 @@ def detect_input_structure(base_dir):
     img_files = []
     
     try:
-        for file in os.listdir(base_dir):
+        for file in list_dir(base_dir):
             file_path = os.path.join(base_dir, file)
             if os.path.isfile(file_path):
                 if os.path.splitext(file)[1].lower() in img_exts:
@@ -82,61 +97,126 @@ def detect_input_structure(base_dir):
     return 'unknown', None, None
 
 
-def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=True):
+def build_image_class_matrix(image_files, image_to_classes):
+    """构建 图片 x 类别 的稀疏矩阵 (CSR, 值为是否包含该类别)
+
+    Returns:
+        tuple: (indptr, indices, class_ids), 第 i 张图片的类别为 class_ids[indices[indptr[i]:indptr[i+1]]]
     """
-    按指定比例划分数据集，确保各类别在训练、验证、测试集中尽可能均衡
+    import numpy as np
+    class_ids = sorted({c for classes in image_to_classes.values() for c in classes})
+    col_of = {c: j for j, c in enumerate(class_ids)}
+    rows, cols = [], []
+    for i, image_file in enumerate(image_files):
+        for c in image_to_classes.get(image_file, ()):
+            rows.append(i)
+            cols.append(col_of[c])
+    indptr, indices, _data = pairs_to_csr(np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64),
+                                          len(image_files), binary=True)
+    return indptr, indices, class_ids
+
+
+def group_assignment(image_files, image_to_classes, ratios, group_regex=None, group_csv=None, seed=42,
+                     split_names=None):
+    """按分组计算每张图片的集合下标 (同组必定相同), 并按类别对分组做分层
+
+    split_names 仅用于日志输出各集合的分组数.
+
+    Returns:
+        np.ndarray: 与 image_files 对齐的集合下标
+    """
+    import numpy as np
+    mapping = load_group_csv(group_csv) if group_csv else None
+    keys, unmatched = resolve_group_keys(image_files, regex=group_regex, mapping=mapping)
+    if unmatched:
+        log_warn(f"{unmatched} 张图片未匹配到分组, 各自作为独立分组")
+    group_of, groups = hash_group_index(keys)
+    log_info(f"分组划分: {len(groups)} 个分组, 平均每组 {len(image_files) / max(1, len(groups)):.1f} 张图片")
+
+    indptr, indices, _class_ids = build_image_class_matrix(image_files, image_to_classes)
+    assignment = group_stratify(indptr, indices, group_of, ratios, seed=seed)
+    group_split = np.full(len(groups), -1, dtype=np.int8)
+    group_split[group_of] = assignment
+    split_names = split_names or [str(k) for k in range(len(ratios))]
+    log_info("各集合分组数: " + ', '.join(f"{sp} {int((group_split == k).sum())}" for k, sp in enumerate(split_names)))
+    return assignment
+
+
+@profiled('assign')
+def group_split_files(image_files, image_to_classes, splits, split_ratios, group_regex=None, group_csv=None,
+                      seed=42):
+    """按分组 (患者/体数据) 划分图片, 同组图片必定落在同一集合, 并按类别对分组做分层
+
+    Returns:
+        dict: {split: [image_file, ...]}
+    """
+    assignment = group_assignment(image_files, image_to_classes, [split_ratios[sp] for sp in splits],
+                                  group_regex, group_csv, seed, split_names=splits)
+    return {sp: [f for f, a in zip(image_files, assignment.tolist()) if a == k] for k, sp in enumerate(splits)}
+
+
+@profiled('assign')
+def stratified_split_files(image_files, image_to_classes, splits, split_ratios, seed=42):
+    """按类别迭代分层划分图片, 使各类别 (尤其是稀有类别) 在各集合中的比例接近目标比例
+
+    Returns:
+        dict: {split: [image_file, ...]}
+    """
+    indptr, indices, _class_ids = build_image_class_matrix(image_files, image_to_classes)
+    assignment = iterative_stratify(indptr, indices, [split_ratios[sp] for sp in splits], seed=seed)
+    return {sp: [f for f, a in zip(image_files, assignment.tolist()) if a == k] for k, sp in enumerate(splits)}
+
+
+def count_class_split_matrix(image_to_classes, split_index, num_splits):
+    """单次遍历 image_to_classes 累计 类别 x 集合 的图片计数矩阵, 复杂度 O(标注的类别条目数)
 
     Args:
-        base_dir (str): 数据集的根目录，支持标准结构(images/+labels/)或混合结构(图片和txt在同一文件夹)
-        output_dir (str): 输出数据集的根目录
-        split_ratios (dict): 数据集划分比例，例如 {"train": 0.8, "val": 0.2} 或 {"train": 0.8, "val": 0.1, "test": 0.1}
-        output_format (int): 输出格式，1为格式一，2为格式二 (默认: 1)
-        use_test (bool): 是否使用测试集，False时只划分为train/val两个集合 (默认: True)
+        image_to_classes (dict): {image_file: set(class_id)}
+        split_index (dict): {image_file: 集合下标}
+        num_splits (int): 集合数
+
+    Returns:
+        tuple: (class_ids, counts[类别, 集合], 各集合有标签图片数)
     """
-    # 检测输入结构
-    structure, images_dir, labels_dir = detect_input_structure(base_dir)
-    
-    if structure == 'unknown':
-        log_error("错误: 未找到有效的数据集结构")
-        log_info("支持的输入结构:")
-        log_info("  1. 标准结构: dataset/images/ + dataset/labels/")
-        log_info("  2. 混合结构: 图片和txt标签文件在同一个文件夹中")
-        return
-    
-    structure_name = {
-        'standard': '标准结构 (images/ + labels/)',
-        'mixed': '混合结构 (图片和标签在同一文件夹)'
-    }.get(structure, '未知结构')
-    
-    log_info(f"检测到输入结构: {structure_name}")
-    
-    # 查找类别文件
-    class_files = find_class_files(base_dir)
-    if class_files:
-        log_info(f"找到类别文件: {', '.join(class_files)}")
-    
-    # 确定要创建的分割集合
-    splits = ["train", "val"]
-    if use_test:
-        splits.append("test")
-    
-    log_info(f"划分模式: {len(splits)}个集合 ({', '.join(splits)})")
+    import numpy as np
+    class_ids = sorted({c for classes in image_to_classes.values() for c in classes})
+    row_of = {c: i for i, c in enumerate(class_ids)}
+    flat = []
+    labeled = np.zeros(num_splits, dtype=np.int64)
+    for image_file, classes in image_to_classes.items():
+        k = split_index.get(image_file)
+        if k is None:
+            continue
+        labeled[k] += 1
+        flat.extend(row_of[c] * num_splits + k for c in classes)
+    counts = np.bincount(np.array(flat, dtype=np.int64), minlength=len(class_ids) * num_splits)
+    return class_ids, counts.reshape(len(class_ids), num_splits), labeled
 
+
+def prepare_output_dirs(output_dir, splits, output_format=1):
+    """创建输出目录: 格式一 <out>/<split>/images|labels, 格式二 <out>/images|labels/<split>"""
     if output_format == 1:
         # 格式一: yolo/train/images/, yolo/train/labels/, etc.
-        # 创建输出目录
         for split in splits:
             split_dir = os.path.join(output_dir, split)
             os.makedirs(os.path.join(split_dir, "images"), exist_ok=True)
             os.makedirs(os.path.join(split_dir, "labels"), exist_ok=True)
     else:
         # 格式二: yolo_dataset/images/train/, yolo_dataset/labels/train/, etc.
-        # 创建输出目录
         for data_type in ["images", "labels"]:
             for split in splits:
                 os.makedirs(os.path.join(output_dir, data_type, split), exist_ok=True)
-    
-    # 复制类别文件到输出目录根目录（优先根目录，缺失则尝试 labels/）
+
+
+def split_output_dirs(output_dir, split, output_format=1):
+    """返回某集合的 (图片输出目录, 标签输出目录)"""
+    if output_format == 1:
+        return os.path.join(output_dir, split, "images"), os.path.join(output_dir, split, "labels")
+    return os.path.join(output_dir, "images", split), os.path.join(output_dir, "labels", split)
+
+
+def copy_class_files(base_dir, output_dir, structure, labels_dir, class_files):
+    """复制类别文件到输出目录根目录（优先根目录，缺失则尝试 labels/）"""
     labels_dir_for_copy = None
     if structure == 'standard':
         labels_dir_for_copy = labels_dir
@@ -158,10 +238,64 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
                 shutil.copy(p, os.path.join(output_dir, candidate))
                 log_info(f"复制类别文件: {candidate}")
 
+
+def split_yaml_paths(output_format, splits):
+    """data.yaml 中各集合图片目录 (相对于输出根目录)"""
+    if output_format == 1:
+        return {split: f"{split}/images" for split in splits}
+    return {split: f"images/{split}" for split in splits}
+
+
+def resolve_class_names(base_dir, structure, labels_dir, class_ids=()):
+    """读取类别名（统一工具）; 找不到类别文件时按出现的最大类别ID生成占位名"""
+    names, _src = discover_class_names(base_dir, structure=structure, labels_dir=labels_dir)
+    if not names and class_ids:
+        names = [f"Class_{i}" for i in range(max(class_ids) + 1)]
+    return names or []
+
+
+def write_data_yaml(output_dir, names, split_paths, yaml_name='data.yaml'):
+    """生成标准 data.yaml (手写 YAML，避免依赖外部库)
+
+    Args:
+        output_dir (str): 输出根目录 (写入 path 字段)
+        names (list): 类别名
+        split_paths (dict): {split: 图片目录或图片列表文件 (相对 path)}
+        yaml_name (str): 文件名 (默认: data.yaml)
+    """
+    def q(s: str) -> str:
+        s = str(s).replace('\\', '/')
+        if any(ch in s for ch in [':', '#', '"', '\'', ',', '[', ']', '{', '}', ' ']):
+            return '"' + s.replace('"', '\\"') + '"'
+        return s
+    lines = [f"path: {q(os.path.normpath(output_dir).replace(os.sep, '/'))}"]
+    for split in ("train", "val", "test"):
+        if split in split_paths:
+            lines.append(f"{split}: {q(split_paths[split])}")
+    lines.append(f"nc: {len(names)}")
+    if names:
+        names_quoted = ', '.join(q(n) for n in names)
+        lines.append(f"names: [{names_quoted}]")
+    else:
+        lines.append("names: []")
+    out_yaml_path = os.path.join(output_dir, yaml_name)
+    with open(out_yaml_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    log_info(f"已生成标准 data.yaml -> {out_yaml_path}")
+    return out_yaml_path
+
+
+@profiled('parse')
+def collect_image_labels(images_dir, labels_dir, structure):
+    """扫描标签与图片目录
+
+    Returns:
+        tuple: (all_image_files, image_to_classes {image_file: set(class)}, class_to_images {class: [image_file]})
+    """
     # 获取所有标签文件
     if structure == 'mixed':
         # 混合结构：排除类别文件
-        all_files = os.listdir(labels_dir)
+        all_files = list_dir(labels_dir)
         label_files = [
             f for f in all_files
             if f.endswith(".txt") and f not in ['classes.txt', 'obj.names', 'names.txt']
@@ -169,11 +303,12 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
     else:
         # 标准结构：labels目录下的所有txt文件
         label_files = [
-            f for f in os.listdir(labels_dir)
+            f for f in list_dir(labels_dir)
             if f.endswith(".txt") and f not in ['classes.txt', 'obj.names', 'names.txt']
         ]
         
     # 构建图片-类别映射
+    image_names = set(list_dir(images_dir))
     image_to_classes = {}  # {image_file: [class1, class2, ...]}
     class_to_images = defaultdict(list)  # {class: [image_files]}
 
@@ -181,10 +316,10 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
         label_path = os.path.join(labels_dir, label_file)
         with open(label_path, "r") as f:
             lines = f.readlines()
-            classes = set(int(line.split()[0]) for line in lines)  # 提取所有类别
+            classes = set(int(float(line.split()[0])) for line in lines if line.strip())  # 提取所有类别
             
             # 查找对应的图片文件
-            corresponding_image = find_corresponding_image(label_file, images_dir, structure)
+            corresponding_image = find_corresponding_image(label_file, images_dir, structure, image_names)
             if corresponding_image is None:
                 log_warn(f"找不到标签文件 {label_file} 对应的图片文件")
                 continue
@@ -196,15 +331,402 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
     if structure == 'mixed':
         # 混合结构：从同一目录获取图片文件
         all_image_files = [
-            f for f in os.listdir(images_dir)
+            f for f in list_dir(images_dir)
             if os.path.splitext(f)[1].lower() in get_image_extensions()
         ]
     else:
         # 标准结构：从images目录获取图片文件
         all_image_files = [
-            f for f in os.listdir(images_dir)
+            f for f in list_dir(images_dir)
             if os.path.splitext(f)[1].lower() in get_image_extensions()
         ]
+
+    count('files', len(label_files))
+    return all_image_files, image_to_classes, class_to_images
+
+
+def iter_image_files(images_dir):
+    """用 os.scandir 流式产出目录中的图片文件名 (不排序, 不整体载入内存)"""
+    img_exts = get_image_extensions()
+    with os.scandir(images_dir) as it:
+        for entry in it:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in img_exts:
+                yield entry.name
+
+
+@profiled('stream_split')
+def stream_hash_split(base_dir, output_dir, split_ratios, output_format=1, use_test=True, seed=42,
+                      group_regex=None, group_csv=None):
+    """
+    流式哈希划分: 边扫描目录边按 (种子, stem 或分组键) 的哈希决定集合并复制
+
+    同一文件在任何机器、任何次运行中都落在同一集合; 新增文件不会改变已有文件的归属.
+    除类别计数外不保存逐文件状态, 内存占用与数据集规模无关.
+
+    Args:
+        base_dir (str): 数据集根目录 (标准结构或混合结构)
+        output_dir (str): 输出数据集根目录
+        split_ratios (dict): 划分比例
+        output_format (int): 输出格式，1为格式一，2为格式二 (默认: 1)
+        use_test (bool): 是否使用测试集 (默认: True)
+        seed (int): 哈希种子, 改变种子即得到另一种划分 (默认: 42)
+        group_regex (str): 分组正则, 同组文件按分组键哈希 (可选)
+        group_csv (str): 文件名->分组 映射CSV (可选)
+    """
+    import numpy as np
+    from tqdm import tqdm
+    from utils.label_validation import parse_label_lines
+    structure, images_dir, labels_dir = detect_input_structure(base_dir)
+    if structure == 'unknown':
+        log_error("错误: 未找到有效的数据集结构")
+        return
+
+    splits = ["train", "val"] + (["test"] if use_test else [])
+    cum_ratios = np.cumsum([split_ratios[sp] for sp in splits]).tolist()
+    prepare_output_dirs(output_dir, splits, output_format)
+    copy_class_files(base_dir, output_dir, structure, labels_dir, find_class_files(base_dir))
+    out_dirs = [split_output_dirs(output_dir, sp, output_format) for sp in splits]
+    key_fn = make_group_key_fn(group_regex, load_group_csv(group_csv) if group_csv else None)
+    log_info(f"流式哈希划分: 种子 {seed}, 划分键 {'分组键' if (group_regex or group_csv) else '文件名 stem'}")
+
+    image_counts = [0] * len(splits)
+    labeled_counts = [0] * len(splits)
+    class_counts = defaultdict(lambda: [0] * len(splits))  # {class_id: [各集合图片数]}
+    unmatched = 0
+    bad_lines = 0
+    bad_files = 0
+    for image_file in tqdm(iter_image_files(images_dir), desc="流式划分", unit="张"):
+        stem = os.path.splitext(image_file)[0]
+        key = key_fn(image_file) if (group_regex or group_csv) else stem
+        if key is None:
+            unmatched += 1
+            key = stem
+        k = hash_split_index(key, cum_ratios, seed)
+        dst_images, dst_labels = out_dirs[k]
+        shutil.copy(os.path.join(images_dir, image_file), os.path.join(dst_images, image_file))
+        image_counts[k] += 1
+        count_file(os.path.join(dst_images, image_file))
+
+        label_path = os.path.join(labels_dir, stem + ".txt")
+        try:
+            shutil.copyfile(label_path, os.path.join(dst_labels, stem + ".txt"))
+        except FileNotFoundError:
+            continue
+        count('files')
+        with open(label_path, "r", encoding="utf-8", errors="replace") as f:
+            arr, _, _, issues = parse_label_lines(f.read().splitlines())
+        if issues:
+            bad_lines += sum(len(v) for v in issues.values())
+            bad_files += 1
+        classes = set(arr[:, 0].astype(np.int64).tolist())
+        if classes:
+            labeled_counts[k] += 1
+        for c in classes:
+            class_counts[c][k] += 1
+
+    if unmatched:
+        log_warn(f"{unmatched} 张图片未匹配到分组, 按文件名 stem 哈希")
+    if bad_lines:
+        log_warn(f"{bad_files} 个标签文件中有 {bad_lines} 行格式错误 (已原样复制, 不计入类别统计), "
+                 f"可用 yolo_dataset_analyzer.py --validate 查看")
+    total = sum(image_counts)
+    log_info(f"流式划分完成！原始总图片数: {total}")
+    for k, split in enumerate(splits):
+        log_info(f"{split}集: {image_counts[k]} 张图片 ({image_counts[k] / total * 100 if total else 0:.1f}%), "
+                 f"标签图片 {labeled_counts[k]}")
+    if class_counts:
+        print()
+        log_info(f"类别分布统计:")
+        for class_id in sorted(class_counts):
+            counts = class_counts[class_id]
+            stats = [f"{split}集{counts[k]}" for k, split in enumerate(splits)]
+            log_info(f"类别 {class_id}: {', '.join(stats)}, 总计{sum(counts)}")
+    try:
+        names = resolve_class_names(base_dir, structure, labels_dir, sorted(class_counts))
+        write_data_yaml(output_dir, names, split_yaml_paths(output_format, splits))
+    except Exception as e:
+        log_warn(f"生成 data.yaml 失败: {e}")
+
+
+KFOLD_MODES = ('list', 'symlink', 'hardlink')
+LINK_MODES = ('copy', 'symlink', 'hardlink')
+
+
+def assign_folds(image_files, image_to_classes, k, group_regex=None, group_csv=None, seed=42, stratify=False):
+    """一次性计算每张图片所属的折 (0..k-1): 分组模式按分组分层, 分层模式按类别分层, 否则随机均分
+
+    Returns:
+        np.ndarray: 与 image_files 对齐的折下标
+    """
+    import numpy as np
+    ratios = [1.0 / k] * k
+    fold_names = [f"fold{i}" for i in range(k)]
+    if group_regex or group_csv:
+        return group_assignment(image_files, image_to_classes, ratios, group_regex, group_csv, seed,
+                                split_names=fold_names)
+    if stratify:
+        indptr, indices, _class_ids = build_image_class_matrix(image_files, image_to_classes)
+        return iterative_stratify(indptr, indices, ratios, seed=seed)
+    folds = np.empty(len(image_files), dtype=np.int8)
+    folds[np.random.default_rng(seed).permutation(len(image_files))] = np.arange(len(image_files)) % k
+    return folds
+
+
+def _link_file(src, dst, mode):
+    """按 mode 复制或建立 dst -> src 的链接; 硬链接跨设备失败时退回复制, 返回实际方式"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == 'copy':
+        shutil.copy2(src, dst)
+        return mode
+    if mode == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+        return mode
+    try:
+        os.link(src, dst)
+        return mode
+    except OSError:
+        shutil.copy2(src, dst)
+        return 'copy'
+
+
+@profiled('kfold')
+def kfold_split(base_dir, output_dir, k=5, mode='list', output_format=1, group_regex=None, group_csv=None,
+                seed=42, stratify=False, save_plan=None):
+    """
+    K 折交叉验证: 折分配只计算一次, 第 i 折以 fold i 为 val、其余为 train
+
+    各折不复制文件: list 模式写 train.txt/val.txt (图片绝对路径, 标签由训练框架按 images->labels 推导),
+    symlink/hardlink 模式按输出格式建立目录并链接原图片与标签. 每折生成独立的 data.yaml,
+    输出根目录另写 folds.csv (图片, 折) 记录分配结果; 指定 save_plan 时另存为划分方案 (分割名 fold_<i>).
+
+    Args:
+        base_dir (str): 数据集根目录 (标准结构或混合结构)
+        output_dir (str): 输出根目录, 各折写入 <output_dir>/fold_<i>/
+        k (int): 折数 (默认: 5)
+        mode (str): 'list' | 'symlink' | 'hardlink' (默认: list)
+        output_format (int): 链接模式下的目录格式，1为格式一，2为格式二 (默认: 1)
+        group_regex (str): 分组正则, 同组图片落在同一折 (可选)
+        group_csv (str): 文件名->分组 映射CSV (可选)
+        seed (int): 随机种子 (默认: 42)
+        stratify (bool): 按类别分层分配各折 (默认: False)
+        save_plan (str): 折分配另存为划分方案文件 (可选)
+    """
+    import numpy as np
+    structure, images_dir, labels_dir = detect_input_structure(base_dir)
+    if structure == 'unknown':
+        log_error("错误: 未找到有效的数据集结构")
+        return
+
+    all_image_files, image_to_classes, _class_to_images = collect_image_labels(images_dir, labels_dir, structure)
+    image_files = sorted(all_image_files)
+    if len(image_files) < k:
+        log_error(f"错误: 图片数 {len(image_files)} 少于折数 {k}")
+        return
+    folds = assign_folds(image_files, image_to_classes, k, group_regex, group_csv, seed, stratify)
+
+    os.makedirs(output_dir, exist_ok=True)
+    copy_class_files(base_dir, output_dir, structure, labels_dir, find_class_files(base_dir))
+    with open(os.path.join(output_dir, "folds.csv"), "w", encoding="utf-8") as f:
+        f.write("file_name,fold\n")
+        f.writelines(f"{name},{fold}\n" for name, fold in zip(image_files, folds.tolist()))
+
+    split_index = dict(zip(image_files, folds.tolist()))
+    class_ids, class_fold_counts, labeled_counts = count_class_split_matrix(image_to_classes, split_index, k)
+    names = resolve_class_names(base_dir, structure, labels_dir, class_ids)
+    if save_plan:
+        mode_name = 'group' if (group_regex or group_csv) else ('stratify' if stratify else 'random')
+        save_split_plan(save_plan,
+                        {f"fold_{i}": [os.path.splitext(f)[0] for f, fd in split_index.items() if fd == i]
+                         for i in range(k)},
+                        fingerprint=dataset_fingerprint([('images', images_dir), ('labels', labels_dir)]),
+                        meta={'tool': 'yolo_dataset_split', 'mode': 'kfold', 'kfold': k, 'fold_mode': mode_name,
+                              'seed': seed, 'names': names})
+        log_info(f"已保存 K 折方案 -> {save_plan}")
+
+    image_paths = [os.path.abspath(os.path.join(images_dir, f)) for f in image_files]
+    fold_list = folds.tolist()
+    fallback_copies = 0
+    for i in range(k):
+        fold_dir = os.path.join(output_dir, f"fold_{i}")
+        members = {"train": [j for j, fd in enumerate(fold_list) if fd != i],
+                   "val": [j for j, fd in enumerate(fold_list) if fd == i]}
+        os.makedirs(fold_dir, exist_ok=True)
+        if mode == 'list':
+            for split, idx in members.items():
+                with open(os.path.join(fold_dir, f"{split}.txt"), "w", encoding="utf-8") as f:
+                    f.writelines(image_paths[j] + "\n" for j in idx)
+            split_paths = {"train": "train.txt", "val": "val.txt"}
+        else:
+            prepare_output_dirs(fold_dir, ["train", "val"], output_format)
+            for split, idx in members.items():
+                dst_images, dst_labels = split_output_dirs(fold_dir, split, output_format)
+                for j in idx:
+                    image_file = image_files[j]
+                    if _link_file(image_paths[j], os.path.join(dst_images, image_file), mode) == 'copy':
+                        fallback_copies += 1
+                    label_file = os.path.splitext(image_file)[0] + ".txt"
+                    src_label_path = os.path.join(labels_dir, label_file)
+                    if os.path.exists(src_label_path):
+                        _link_file(src_label_path, os.path.join(dst_labels, label_file), mode)
+            split_paths = split_yaml_paths(output_format, ["train", "val"])
+        try:
+            write_data_yaml(fold_dir, names, split_paths)
+        except Exception as e:
+            log_warn(f"生成 fold_{i}/data.yaml 失败: {e}")
+    if fallback_copies:
+        log_warn(f"{fallback_copies} 张图片无法硬链接 (可能跨文件系统), 已改为复制")
+
+    mode_desc = {'list': '图片列表 (train.txt/val.txt)', 'symlink': '符号链接', 'hardlink': '硬链接'}[mode]
+    log_info(f"K 折划分完成！{k} 折, 物化方式: {mode_desc}, 总图片数: {len(image_files)}")
+    fold_sizes = np.bincount(folds.astype(np.int64), minlength=k)
+    for i in range(k):
+        log_info(f"fold_{i}: val {int(fold_sizes[i])} 张 / train {len(image_files) - int(fold_sizes[i])} 张, "
+                 f"val 标签图片 {int(labeled_counts[i])}")
+    if class_ids:
+        print()
+        log_info(f"各折类别分布 (val 图片数):")
+        for row, class_id in enumerate(class_ids):
+            stats = [f"fold{i} {int(class_fold_counts[row, i])}" for i in range(k)]
+            log_info(f"类别 {class_id}: {', '.join(stats)}, 总计{int(class_fold_counts[row].sum())}")
+
+
+@profiled('apply_plan')
+def apply_split_plan(base_dir, output_dir, plan_path, output_format=1, mode='copy'):
+    """
+    按已保存的划分方案重新生成数据集: 只列目录并按 stem 查表复制/链接, 不解析标签, 不重新计算划分
+
+    方案由 --save-plan 生成 (两个划分工具通用, 以文件 stem 为键), 因此格式转换后的同一数据集也可复用.
+    数据集指纹不一致时仅警告; 方案外的图片跳过, 方案中找不到的 stem 计数提示.
+    K 折方案 (meta.mode == 'kfold') 与 kfold_split 一致: 第 i 折写入 <output_dir>/fold_<i>/,
+    以 fold_<i> 为 val、其余各折为 train, 每折生成独立的 data.yaml.
+
+    Args:
+        base_dir (str): 数据集根目录 (标准结构或混合结构)
+        output_dir (str): 输出数据集根目录 (K 折方案为输出根目录)
+        plan_path (str): 划分方案文件
+        output_format (int): 输出格式，1为格式一，2为格式二 (默认: 1)
+        mode (str): 'copy' | 'symlink' | 'hardlink' (默认: copy)
+    """
+    from tqdm import tqdm
+    structure, images_dir, labels_dir = detect_input_structure(base_dir)
+    if structure == 'unknown':
+        log_error("错误: 未找到有效的数据集结构")
+        return
+    plan, split_of = load_split_plan(plan_path)
+    splits = list(plan['splits'])
+    meta = plan.get('meta', {})
+    log_info(f"加载划分方案: {plan_path} (创建于 {plan.get('created', '未知')}, "
+             f"来源 {meta.get('tool', '未知')}, 方式 {meta.get('mode', '未知')}, 共 {len(split_of)} 个 stem)")
+    fingerprint = dataset_fingerprint([('images', images_dir), ('labels', labels_dir)])
+    if plan.get('fingerprint') and plan['fingerprint'] != fingerprint:
+        log_warn("数据集指纹与方案不一致 (文件已变化或格式已转换), 继续按文件 stem 匹配")
+
+    kfold = meta.get('mode') == 'kfold'
+    if kfold:
+        # 每张图片写入所属折的 val, 以及其余各折的 train
+        fold_dirs = {split: os.path.join(output_dir, split) for split in splits}
+        for fold_dir in fold_dirs.values():
+            prepare_output_dirs(fold_dir, ["train", "val"], output_format)
+        out_dirs = {split: [split_output_dirs(fold_dirs[other], "val" if other == split else "train", output_format)
+                            for other in splits]
+                    for split in splits}
+    else:
+        prepare_output_dirs(output_dir, splits, output_format)
+        out_dirs = {split: [split_output_dirs(output_dir, split, output_format)] for split in splits}
+    copy_class_files(base_dir, output_dir, structure, labels_dir, find_class_files(base_dir))
+    label_names = {f for f in list_dir(labels_dir) if f.endswith(".txt")}
+
+    counts = dict.fromkeys(splits, 0)
+    unplanned = 0
+    fallback_copies = 0
+    for image_file in tqdm(iter_image_files(images_dir), desc="按方案生成", unit="张"):
+        stem = os.path.splitext(image_file)[0]
+        split = split_of.get(stem)
+        if split is None:
+            unplanned += 1
+            continue
+        label_file = stem + ".txt"
+        for dst_images, dst_labels in out_dirs[split]:
+            if _link_file(os.path.join(images_dir, image_file), os.path.join(dst_images, image_file), mode) != mode:
+                fallback_copies += 1
+            if label_file in label_names:
+                _link_file(os.path.join(labels_dir, label_file), os.path.join(dst_labels, label_file), mode)
+        counts[split] += 1
+        count('files')
+
+    total = sum(counts.values())
+    log_info(f"按方案生成完成！共 {total} 张图片")
+    for split in splits:
+        log_info(f"{split}集: {counts[split]} 张图片 ({counts[split] / total * 100 if total else 0:.1f}%)")
+    if unplanned:
+        log_warn(f"{unplanned} 张图片不在划分方案中, 已跳过")
+    if total < len(split_of):
+        log_warn(f"划分方案中有 {len(split_of) - total} 个 stem 在输入目录中找不到对应图片")
+    if fallback_copies:
+        log_warn(f"{fallback_copies} 张图片无法硬链接 (可能跨文件系统), 已改为复制")
+    try:
+        names = meta.get('names') or resolve_class_names(base_dir, structure, labels_dir)
+        if kfold:
+            for fold_dir in fold_dirs.values():
+                write_data_yaml(fold_dir, names, split_yaml_paths(output_format, ["train", "val"]))
+        else:
+            write_data_yaml(output_dir, names, split_yaml_paths(output_format, splits))
+    except Exception as e:
+        log_warn(f"生成 data.yaml 失败: {e}")
+
+
+def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=True,
+                  group_regex=None, group_csv=None, seed=42, stratify=False, save_plan=None):
+    """
+    按指定比例划分数据集，确保各类别在训练、验证、测试集中尽可能均衡
+
+    Args:
+        base_dir (str): 数据集的根目录，支持标准结构(images/+labels/)或混合结构(图片和txt在同一文件夹)
+        output_dir (str): 输出数据集的根目录
+        split_ratios (dict): 数据集划分比例，例如 {"train": 0.8, "val": 0.2} 或 {"train": 0.8, "val": 0.1, "test": 0.1}
+        output_format (int): 输出格式，1为格式一，2为格式二 (默认: 1)
+        use_test (bool): 是否使用测试集，False时只划分为train/val两个集合 (默认: True)
+        group_regex (str): 按文件名正则提取分组键 (如患者ID), 同组图片不跨集合 (可选)
+        group_csv (str): 文件名->分组 映射CSV (可选)
+        seed (int): 分组/分层划分使用的随机种子 (默认: 42)
+        stratify (bool): 按类别分层划分, 避免稀有类别在某集合中缺失 (默认: False)
+        save_plan (str): 划分方案输出路径, 记录 stem->集合 与数据集指纹, 供 --plan 复用 (可选)
+    """
+    # 检测输入结构
+    structure, images_dir, labels_dir = detect_input_structure(base_dir)
+    
+    if structure == 'unknown':
+        log_error("错误: 未找到有效的数据集结构")
+        log_info("支持的输入结构:")
+        log_info("  1. 标准结构: dataset/images/ + dataset/labels/")
+        log_info("  2. 混合结构: 图片和txt标签文件在同一个文件夹中")
+        return
+    
+    structure_name = {
+        'standard': '标准结构 (images/ + labels/)',
+        'mixed': '混合结构 (图片和标签在同一文件夹)'
+    }.get(structure, '未知结构')
+    
+    log_info(f"检测到输入结构: {structure_name}")
+    
+    # 查找类别文件
+    class_files = find_class_files(base_dir)
+    if class_files:
+        log_info(f"找到类别文件: {', '.join(class_files)}")
+    
+    # 确定要创建的分割集合
+    splits = ["train", "val"]
+    if use_test:
+        splits.append("test")
+    
+    log_info(f"划分模式: {len(splits)}个集合 ({', '.join(splits)})")
+
+    prepare_output_dirs(output_dir, splits, output_format)
+    copy_class_files(base_dir, output_dir, structure, labels_dir, class_files)
+
+    # 构建图片-类别映射并获取所有图片文件（包括有标签和无标签的）
+    all_image_files, image_to_classes, class_to_images = collect_image_labels(images_dir, labels_dir, structure)
     
     # 随机打乱所有图片
     random.shuffle(all_image_files)
@@ -212,7 +734,14 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
     # 按比例划分
     total_files = len(all_image_files)
     
-    if use_test:
+    if group_regex or group_csv:
+        # 分组模式: 同一患者/体数据的切片整体分配, 避免跨集合泄漏 (排序保证结果只由种子决定)
+        split_files = group_split_files(sorted(all_image_files), image_to_classes, splits, split_ratios,
+                                        group_regex, group_csv, seed)
+    elif stratify:
+        # 分层模式: 在 图片 x 类别 矩阵上迭代分层
+        split_files = stratified_split_files(sorted(all_image_files), image_to_classes, splits, split_ratios, seed)
+    elif use_test:
         # 三个集合：train/val/test
         train_count = int(total_files * split_ratios["train"])
         val_count = int(total_files * split_ratios["val"])
@@ -241,6 +770,7 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
         }
 
     # 复制文件到对应目录
+    @profiled('copy')
     def copy_files(file_list, split):
         for image_file in file_list:
             # 图片文件路径
@@ -267,8 +797,10 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
             
             if os.path.exists(src_image_path):  # 确保图片存在
                 shutil.copy(src_image_path, dst_image_path)
+                count_file(dst_image_path)
             if os.path.exists(src_label_path):  # 只复制有标签的图片的标签
                 shutil.copy(src_label_path, dst_label_path)
+                count_file(dst_label_path)
 
     # 复制所有分割的文件
     for split in splits:
@@ -295,99 +827,45 @@ def split_dataset(base_dir, output_dir, split_ratios, output_format=1, use_test=
     else:
         log_warn(f"数据不完整，丢失了 {total_original - total_split} 张图片")
     
+    # 单次遍历累计 类别 x 集合 计数矩阵, 标签图片数与类别分布均由矩阵得到
+    split_index = {img: k for k, split in enumerate(splits) for img in split_files[split]}
+    class_ids, class_split_counts, labeled_counts = count_class_split_matrix(image_to_classes, split_index, len(splits))
+
     # 统计各集合中有标签的图片数量
     print()
     log_info(f"标签图片分布:")
-    for split in splits:
-        labeled_count = sum(1 for img in split_files[split] if img in image_to_classes)
-        log_info(f"{split}集标签图片: {labeled_count}")
+    for k, split in enumerate(splits):
+        log_info(f"{split}集标签图片: {int(labeled_counts[k])}")
     log_info(f"总标签图片: {len(image_to_classes)}")
     
     # 统计各类别在不同集合中的分布
-    if image_to_classes:
+    if class_ids:
         print()
         log_info(f"类别分布统计:")
-        all_classes = set()
-        for classes in image_to_classes.values():
-            all_classes.update(classes)
-        
-        for class_id in sorted(all_classes):
-            class_stats = []
-            total_class_count = 0
-            
-            for split in splits:
-                count = sum(1 for img in split_files[split] if img in image_to_classes and class_id in image_to_classes[img])
-                class_stats.append(f"{split}集{count}")
-                total_class_count += count
-            
-            total_class = len(class_to_images[class_id])
-            class_stats.append(f"总计{total_class}")
+        for row, class_id in enumerate(class_ids):
+            class_stats = [f"{split}集{int(class_split_counts[row, k])}" for k, split in enumerate(splits)]
+            class_stats.append(f"总计{len(class_to_images[class_id])}")
             log_info(f"类别 {class_id}: {', '.join(class_stats)}")
 
     # 生成标准 data.yaml
+    names = []
     try:
-        # 构造 paths（相对于输出根目录）
-        if output_format == 1:
-            train_rel = 'train/images'
-            val_rel = 'val/images'
-            test_rel = 'test/images'
-        else:  # format 2
-            train_rel = 'images/train'
-            val_rel = 'images/val'
-            test_rel = 'images/test'
-
-        data_yaml = {
-            'path': os.path.normpath(output_dir).replace('\\', '/'),
-            'train': train_rel,
-            'val': val_rel,
-        }
-        if use_test:
-            data_yaml['test'] = test_rel
-
-        # 推断/读取类别名（统一工具）
-        names, _src = discover_class_names(base_dir, structure=structure, labels_dir=labels_dir)
-
-        # 若仍无 names，则根据出现的类别ID生成占位名
-        if not names:
-            if image_to_classes:
-                all_ids = set()
-                for s in image_to_classes.values():
-                    all_ids.update(s)
-                max_id = max(all_ids) if all_ids else -1
-                names = [f"Class_{i}" for i in range(max_id + 1)]
-            else:
-                names = []
-
-        data_yaml['nc'] = len(names)
-        data_yaml['names'] = names
-
-        out_yaml_path = os.path.join(output_dir, 'data.yaml')
-        # 手写 YAML，避免依赖外部库
-        def q(s: str) -> str:
-            s = str(s).replace('\\', '/')
-            if any(ch in s for ch in [':', '#', '"', '\'', ',', '[', ']', '{', '}', ' ']):
-                return '"' + s.replace('"', '\\"') + '"'
-            return s
-        lines = []
-        lines.append(f"path: {q(data_yaml['path'])}")
-        lines.append(f"train: {q(data_yaml['train'])}")
-        lines.append(f"val: {q(data_yaml['val'])}")
-        if 'test' in data_yaml:
-            lines.append(f"test: {q(data_yaml['test'])}")
-        lines.append(f"nc: {len(names)}")
-        if names:
-            names_quoted = ', '.join(q(n) for n in names)
-            lines.append(f"names: [{names_quoted}]")
-        else:
-            lines.append("names: []")
-        with open(out_yaml_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(lines) + '\n')
-        log_info(f"已生成标准 data.yaml -> {out_yaml_path}")
+        names = resolve_class_names(base_dir, structure, labels_dir, class_ids)
+        write_data_yaml(output_dir, names, split_yaml_paths(output_format, splits))
     except Exception as e:
         log_warn(f"生成 data.yaml 失败: {e}")
 
+    if save_plan:
+        mode = 'group' if (group_regex or group_csv) else ('stratify' if stratify else 'random')
+        save_split_plan(save_plan,
+                        {split: [os.path.splitext(f)[0] for f in split_files[split]] for split in splits},
+                        fingerprint=dataset_fingerprint([('images', images_dir), ('labels', labels_dir)]),
+                        meta={'tool': 'yolo_dataset_split', 'mode': mode, 'seed': seed,
+                              'ratios': {split: split_ratios[split] for split in splits}, 'names': names})
+        log_info(f"已保存划分方案 -> {save_plan}")
 
-def main():
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="YOLO数据集划分工具")
     parser.add_argument("--input_dir", "-i", required=True, 
                        help="输入数据集目录 (支持images/+labels/结构或混合结构)")
@@ -405,11 +883,63 @@ def main():
                        help="输出格式: 1=格式一(train/images/), 2=格式二(images/train/) (默认: 1)")
     parser.add_argument("--no-test", action="store_true",
                        help="只划分为train/val两个集合，不创建test集合")
+    parser.add_argument("--hash-split", action="store_true",
+                       help="流式哈希划分: 按 (种子, 文件名stem/分组键) 的哈希决定集合, 结果跨机器稳定, 内存占用恒定")
+    parser.add_argument("--kfold", type=int, metavar="K",
+                       help="K 折交叉验证: 一次计算全部折分配, 各折写入 fold_<i>/ (忽略 train/val/test 比例)")
+    parser.add_argument("--kfold-mode", choices=KFOLD_MODES, default="list",
+                       help="K 折物化方式: list=train.txt/val.txt 图片列表, symlink=符号链接, hardlink=硬链接 (默认: list)")
+    parser.add_argument("--save-plan", metavar="PATH",
+                       help="保存划分方案 (stem->集合 + 数据集指纹, JSON), 供 --plan 在其他机器或格式转换后复用")
+    parser.add_argument("--plan", metavar="PATH",
+                       help="按已保存的划分方案重新生成数据集 (不解析标签、不重新计算, 忽略比例/种子/分层/分组参数)")
+    parser.add_argument("--plan-mode", choices=LINK_MODES, default="copy",
+                       help="--plan 的文件物化方式: copy/symlink/hardlink (默认: copy)")
+    parser.add_argument("--stratify", action="store_true",
+                       help="按类别迭代分层划分, 使各类别在各集合中的比例接近目标比例 (分组模式下自动分层)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--group-regex",
+                       help="按文件名正则提取分组键 (如 '^(RibFrac\\d+)-'), 同组图片不跨集合; 有捕获组时取第1组")
+    group.add_argument("--group-csv",
+                       help="文件名->分组 映射CSV (列名如 file_name,patient_id; 无表头时取前两列)")
     
-    args = parser.parse_args()
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     
     use_test = not args.no_test
     
+    if args.plan:
+        if not os.path.exists(args.input_dir):
+            log_error(f"错误: 输入目录 {args.input_dir} 不存在")
+            return
+        try:
+            apply_split_plan(args.input_dir, args.output_dir, args.plan, args.output_format, args.plan_mode)
+        except (OSError, ValueError) as e:
+            log_error(f"错误: 无法应用划分方案 {args.plan}: {e}")
+        return
+    
+    if args.kfold is not None:
+        if args.kfold < 2:
+            log_error(f"错误: --kfold 至少为 2，当前为{args.kfold}")
+            return
+        if args.hash_split:
+            log_error("错误: --kfold 与 --hash-split 不能同时使用")
+            return
+        if not os.path.exists(args.input_dir):
+            log_error(f"错误: 输入目录 {args.input_dir} 不存在")
+            return
+        log_info(f"开始 K 折划分: K={args.kfold}, 物化方式 {args.kfold_mode}, 随机种子 {args.seed}")
+        if args.group_regex or args.group_csv:
+            log_info(f"分组方式: {'正则 ' + args.group_regex if args.group_regex else 'CSV ' + args.group_csv}")
+        elif args.stratify:
+            log_info("划分方式: 按类别迭代分层")
+        kfold_split(args.input_dir, args.output_dir, args.kfold, args.kfold_mode, args.output_format,
+                    group_regex=args.group_regex, group_csv=args.group_csv, seed=args.seed,
+                    stratify=args.stratify, save_plan=args.save_plan)
+        return
+    
     # 验证比例总和
     if use_test:
         total_ratio = args.train_ratio + args.val_ratio + args.test_ratio
@@ -470,10 +1000,25 @@ def main():
         log_info(f"验证集比例: {args.val_ratio}")
     
     log_info(f"随机种子: {args.seed}")
+    if args.group_regex or args.group_csv:
+        log_info(f"分组方式: {'正则 ' + args.group_regex if args.group_regex else 'CSV ' + args.group_csv}")
+    elif args.stratify:
+        log_info("划分方式: 按类别迭代分层")
     log_info("-" * 50)
     
+    if args.hash_split:
+        if args.stratify:
+            log_warn("--hash-split 为无状态流式划分, 忽略 --stratify")
+        if args.save_plan:
+            log_warn("--hash-split 的划分只由种子与文件名决定, 无需保存方案, 忽略 --save-plan")
+        stream_hash_split(args.input_dir, args.output_dir, split_ratios, args.output_format, use_test,
+                          seed=args.seed, group_regex=args.group_regex, group_csv=args.group_csv)
+        return
+    
     # 执行数据集划分
-    split_dataset(args.input_dir, args.output_dir, split_ratios, args.output_format, use_test)
+    split_dataset(args.input_dir, args.output_dir, split_ratios, args.output_format, use_test,
+                  group_regex=args.group_regex, group_csv=args.group_csv, seed=args.seed,
+                  stratify=args.stratify, save_plan=args.save_plan)
 
 
 if __name__ == "__main__":
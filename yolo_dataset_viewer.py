@@ -5,23 +5,29 @@
 功能: 按键浏览/随机/统计/筛选类别, 支持 format1/format2 结构
 显示: 通过 matplotlib overlays 绘制 YOLO 标注框
 """
+from __future__ import annotations
+
 import os
 import sys
-import cv2
 import argparse
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, profiled, span, count, count_file
 from utils.yolo_utils import discover_class_names, read_class_names
-_LOG_FILE = tee_stdout_stderr('logs')
-import numpy as np
+from utils.dataset_cache import default_cache_dir
 from pathlib import Path
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.widgets import Button
+from typing import TYPE_CHECKING
 import random
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _pyplot():
+    """按需导入 matplotlib.pyplot (仅 GUI 模式需要) 并设置中文字体."""
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
 
 
 class YOLODatasetViewer:
@@ -76,6 +82,7 @@ class YOLODatasetViewer:
 
         log_warn("未找到类别名称文件，将显示类别ID")
     
+    @profiled('scan')
     def scan_dataset(self):
         """扫描数据集，找到所有有标注的图片"""
         log_info("扫描数据集...")
@@ -132,7 +139,8 @@ class YOLODatasetViewer:
         # 按路径排序
         self.image_files.sort(key=lambda x: x['image_path'])
     
-    def load_annotations(self, label_path):
+    @staticmethod
+    def load_annotations(label_path):
         """读取YOLO格式标注文件"""
         annotations = []
         try:
@@ -159,6 +167,7 @@ class YOLODatasetViewer:
     
     def draw_annotations(self, ax, image_shape, annotations):
         """在图片上绘制标注框"""
+        import matplotlib.patches as patches
         h, w = image_shape[:2]
         
         for i, ann in enumerate(annotations):
@@ -198,9 +207,12 @@ class YOLODatasetViewer:
         
         Args:
             filter_classes: 筛选的类别列表 (类别ID或名称)
+
+        Returns:
+            bool: 是否筛选到图片 (未筛选到时保持原列表不变)
         """
         if not filter_classes:
-            return
+            return True
         
         log_info(f"按类别筛选: {filter_classes}")
         
@@ -227,7 +239,7 @@ class YOLODatasetViewer:
         
         if not filtered_files:
             log_warn("未找到包含指定类别的图片！")
-            return
+            return False
         
         self.image_files = filtered_files
         self.current_index = 0
@@ -236,6 +248,7 @@ class YOLODatasetViewer:
         # 如果GUI已经创建，更新窗口标题
         if hasattr(self, 'fig'):
             self.update_window_title()
+        return True
 
     def update_window_title(self):
         """更新窗口标题"""
@@ -247,6 +260,8 @@ class YOLODatasetViewer:
 
     def setup_gui(self):
         """设置GUI界面"""
+        from matplotlib.widgets import Button
+        plt = _pyplot()
         self.fig, self.ax = plt.subplots(figsize=(12, 8))
         plt.subplots_adjust(bottom=0.15)
         
@@ -293,6 +308,8 @@ class YOLODatasetViewer:
     
     def show_current_image(self):
         """显示当前图片"""
+        import cv2
+        plt = _pyplot()
         if not self.image_files:
             return
         
@@ -455,6 +472,7 @@ class YOLODatasetViewer:
 
     def on_key_press(self, event):
         """处理键盘事件"""
+        plt = _pyplot()
         if event.key == 'left' or event.key == 'a':
             self.prev_image(None)
         elif event.key == 'right' or event.key == 'd':
@@ -470,6 +488,7 @@ class YOLODatasetViewer:
     
     def start(self):
         """启动查看器"""
+        plt = _pyplot()
         log_info(f"\n{'='*60}")
         log_info(f"{'YOLO数据集查看器':^56}")
         log_info(f"{'='*60}")
@@ -494,6 +513,8 @@ def batch_view_mode(dataset_path, class_names_file=None, num_samples=9, filter_c
         num_samples: 显示样本数量
         filter_classes: 筛选的类别列表 (类别ID或名称)
     """
+    import cv2
+    plt = _pyplot()
     log_info(f"批量查看模式: 显示 {num_samples} 张图片")
     
     # 创建临时查看器来扫描数据集（不创建GUI）
@@ -599,7 +620,423 @@ def batch_view_mode(dataset_path, class_names_file=None, num_samples=9, filter_c
     log_info(f"已展示 {len(samples)} 个样本的可视化结果")
 
 
-def main():
+# OpenCV 绘制用 BGR 颜色, 与 YOLODatasetViewer.colors 一一对应
+_BGR_COLORS = [
+    (0, 0, 255), (255, 0, 0), (0, 128, 0), (0, 255, 255), (128, 0, 128), (0, 165, 255),
+    (255, 255, 0), (255, 0, 255), (42, 42, 165), (203, 192, 255), (0, 255, 0), (128, 128, 0)
+]
+_CAPTION_HEIGHT = 18
+_HEADER_HEIGHT = 28
+# 格子边长下限: 标题栏之外至少留 32px 绘制图片
+MIN_TILE_SIZE = _CAPTION_HEIGHT + 32
+
+
+def _parse_grid(grid: str) -> tuple[int, int]:
+    """解析 '列x行' 形式的网格参数, 如 '4x4'."""
+    try:
+        cols, rows = (int(v) for v in grid.lower().split('x', 1))
+    except ValueError:
+        raise ValueError(f"无效的网格参数: {grid} (应为 列x行, 如 4x4)")
+    if cols <= 0 or rows <= 0:
+        raise ValueError(f"无效的网格参数: {grid} (行列数需为正整数)")
+    return cols, rows
+
+
+def check_export_args(grid: str, tile_size: int, quality: int) -> tuple[int, int]:
+    """检查拼图导出参数, 返回 (列数, 行数); 参数无效时抛出 ValueError."""
+    cols, rows = _parse_grid(grid)
+    if tile_size < MIN_TILE_SIZE:
+        raise ValueError(f"无效的格子边长: {tile_size} (至少 {MIN_TILE_SIZE}px, 其中标题栏占 {_CAPTION_HEIGHT}px)")
+    if not 1 <= quality <= 100:
+        raise ValueError(f"无效的 JPEG 质量: {quality} (应在 1-100 之间)")
+    return cols, rows
+
+
+def _render_tile(image_path: str, label_path: str, class_names: dict, tile_size: int,
+                 annotations: list | None = None) -> tuple[np.ndarray, int]:
+    """用 OpenCV 将单张图片等比缩放进方形格子并绘制标注框, 返回 (格子图像, 标注框数).
+
+    annotations 为 load_annotations 格式的标注列表 (已在内存中时传入), 省略时读取 label_path.
+    """
+    import cv2
+    import numpy as np
+    tile = np.full((tile_size, tile_size, 3), 255, dtype=np.uint8)
+    area_h = tile_size - _CAPTION_HEIGHT
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if annotations is None:
+        annotations = YOLODatasetViewer.load_annotations(label_path)
+    name = Path(image_path).name
+    if img is None:
+        cv2.putText(tile, 'read failed', (6, area_h // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 1, cv2.LINE_AA)
+    else:
+        h, w = img.shape[:2]
+        scale = min(tile_size / w, area_h / h)
+        new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+        resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        off_x, off_y = (tile_size - new_w) // 2, (area_h - new_h) // 2
+        tile[off_y:off_y + new_h, off_x:off_x + new_w] = resized
+        for ann in annotations:
+            color = _BGR_COLORS[ann['class_id'] % len(_BGR_COLORS)]
+            x1 = int(off_x + (ann['x_center'] - ann['width'] / 2) * new_w)
+            y1 = int(off_y + (ann['y_center'] - ann['height'] / 2) * new_h)
+            x2 = int(off_x + (ann['x_center'] + ann['width'] / 2) * new_w)
+            y2 = int(off_y + (ann['y_center'] + ann['height'] / 2) * new_h)
+            cv2.rectangle(tile, (x1, y1), (x2, y2), color, 1 if tile_size < 256 else 2)
+            # cv2.putText 仅支持 ASCII, 非 ASCII 类别名退化为类别ID
+            label = str(class_names.get(ann['class_id'], ann['class_id']))
+            if not label.isascii():
+                label = str(ann['class_id'])
+            cv2.putText(tile, label, (x1, max(10, y1 - 3)), cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1, cv2.LINE_AA)
+    caption = name if len(name) <= 40 else name[:37] + '...'
+    if not caption.isascii():
+        caption = caption.encode('ascii', 'replace').decode('ascii')
+    cv2.putText(tile, f"{caption} ({len(annotations)})", (4, tile_size - 5),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.38, (0, 0, 0), 1, cv2.LINE_AA)
+    cv2.rectangle(tile, (0, 0), (tile_size - 1, tile_size - 1), (200, 200, 200), 1)
+    return tile, len(annotations)
+
+
+def _render_mosaic_page(task: dict) -> tuple[str, int, int]:
+    """进程池任务: 渲染一页拼图并写盘, 返回 (输出路径, 图片数, 标注框数)."""
+    import cv2
+    import numpy as np
+    cols, rows, tile_size = task['cols'], task['rows'], task['tile_size']
+    sheet = np.full((_HEADER_HEIGHT + rows * tile_size, cols * tile_size, 3), 255, dtype=np.uint8)
+    cv2.putText(sheet, task['header'], (6, _HEADER_HEIGHT - 9), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 1, cv2.LINE_AA)
+    total_boxes = 0
+    for slot, item in enumerate(task['items']):
+        tile, n_boxes = _render_tile(item['image_path'], item['label_path'], task['class_names'], tile_size,
+                                     item.get('annotations'))
+        r, c = divmod(slot, cols)
+        y0 = _HEADER_HEIGHT + r * tile_size
+        sheet[y0:y0 + tile_size, c * tile_size:(c + 1) * tile_size] = tile
+        total_boxes += n_boxes
+    params = [cv2.IMWRITE_JPEG_QUALITY, task['quality']] if task['out_path'].endswith('.jpg') else []
+    if not cv2.imwrite(task['out_path'], sheet, params):
+        raise RuntimeError(f"写入拼图失败: {task['out_path']}")
+    return task['out_path'], len(task['items']), total_boxes
+
+
+def export_mosaic_mode(dataset_path, output_dir, class_names_file=None, filter_classes=None,
+                       grid='4x4', tile_size=256, image_format='jpg', quality=90,
+                       max_images=None, workers=None):
+    """无界面拼图导出模式 - 将(筛选后的)全部图片分页渲染为带标注框的拼图并写盘.
+
+    说明: 使用 OpenCV 绘制, 按页分发到进程池并行渲染; 同时写出 index.csv (页 -> 图片路径) 便于回查.
+    """
+    viewer = YOLODatasetViewer(dataset_path, class_names_file, setup_gui=False)
+    if filter_classes and not viewer.filter_by_classes(filter_classes):
+        return
+    export_mosaic_items(viewer.image_files, viewer.class_names, output_dir, viewer.dataset_path.name,
+                        filter_classes, grid, tile_size, image_format, quality, max_images, workers)
+
+
+def export_mosaic_items(items, class_names, output_dir, dataset_name, filter_classes=None,
+                        grid='4x4', tile_size=256, image_format='jpg', quality=90,
+                        max_images=None, workers=None):
+    """把图片条目 ({set_name, image_path, label_path[, annotations]}) 分页渲染为拼图并写出 index.csv.
+
+    filter_classes 只用于页眉说明, 筛选由调用方完成.
+    """
+    import csv
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from tqdm import tqdm
+
+    cols, rows = check_export_args(grid, tile_size, quality)
+    if max_images is not None and max_images > 0:
+        items = items[:max_images]
+    per_page = cols * rows
+    num_pages = (len(items) + per_page - 1) // per_page
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ext = 'jpg' if image_format.lower() in ('jpg', 'jpeg') else 'png'
+
+    log_info(f"拼图导出: {len(items)} 张图片 -> {num_pages} 页 ({cols}x{rows}, 格子 {tile_size}px, {ext})")
+    tasks = []
+    for page in range(num_pages):
+        page_items = items[page * per_page:(page + 1) * per_page]
+        header = f"{dataset_name} | page {page + 1}/{num_pages}"
+        if filter_classes:
+            header += f" | filter: {','.join(str(c) for c in filter_classes)}"
+        tasks.append({
+            'items': page_items,
+            'class_names': class_names,
+            'cols': cols,
+            'rows': rows,
+            'tile_size': tile_size,
+            'quality': quality,
+            'header': header if header.isascii() else header.encode('ascii', 'replace').decode('ascii'),
+            'out_path': str(out_dir / f"sheet_{page + 1:05d}.{ext}"),
+        })
+
+    # 索引文件: 每张图片所在页与格子位置
+    index_path = out_dir / 'index.csv'
+    with open(index_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['sheet', 'slot', 'set_name', 'image_path', 'label_path'])
+        for task in tasks:
+            sheet_name = Path(task['out_path']).name
+            for slot, item in enumerate(task['items']):
+                writer.writerow([sheet_name, slot, item['set_name'], item['image_path'], item['label_path']])
+
+    total_images = 0
+    total_boxes = 0
+    failed = 0
+    # 解码 / 绘制 / 编码 / 写盘均在 worker 进程内, 主进程按页计时与计数
+    with span('render'), ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_mosaic_page, t) for t in tasks]
+        for fut in tqdm(as_completed(futures), total=len(futures), desc='渲染拼图'):
+            try:
+                path, n_images, n_boxes = fut.result()
+                total_images += n_images
+                total_boxes += n_boxes
+                count_file(path)
+                count('boxes', n_boxes)
+            except Exception as e:
+                failed += 1
+                log_warn(f"拼图页渲染失败: {e}")
+
+    log_info(f"拼图导出完成: {num_pages - failed}/{num_pages} 页, {total_images} 张图片, {total_boxes} 个标注框")
+    log_info(f"输出目录: {out_dir}")
+    log_info(f"索引文件: {index_path}")
+
+THUMB_LEVELS = (160, 640)
+
+
+def _generate_thumbnails(task: tuple) -> tuple[int, int]:
+    """进程池任务: 每张原图只解码一次, 依次生成各级缩略图, 返回 (生成数, 失败数)."""
+    cache_dir, levels, quality, image_paths = task
+    cache = ThumbnailCache(cache_dir, levels, quality)
+    generated = 0
+    failed = 0
+    for image_path in image_paths:
+        stale = [lv for lv in levels if not cache.is_fresh(image_path, lv)]
+        if not stale:
+            continue
+        try:
+            ok = cache.build(image_path, stale)
+        except OSError:
+            ok = False
+        if ok:
+            generated += 1
+        else:
+            failed += 1
+    return generated, failed
+
+
+class ThumbnailCache:
+    """磁盘缩略图金字塔缓存.
+
+    每张图片按 levels 生成若干级 (最长边像素) JPEG 缩略图; 缓存文件 mtime 与原图对齐,
+    原图被修改后 mtime 不一致即视为失效并重新生成. 每次写入使用独立的临时文件再原子替换,
+    多个线程/进程同时生成同一缩略图时互不影响.
+    """
+
+    def __init__(self, cache_dir, levels=THUMB_LEVELS, quality=85):
+        self.cache_dir = Path(cache_dir)
+        self.levels = tuple(sorted(levels))
+        self.quality = quality
+
+    def path_for(self, image_path: str, level: int) -> Path:
+        import hashlib
+        key = hashlib.sha1(str(Path(image_path).resolve()).encode('utf-8')).hexdigest()
+        return self.cache_dir / str(level) / key[:2] / f"{key}.jpg"
+
+    def is_fresh(self, image_path: str, level: int) -> bool:
+        try:
+            return self.path_for(image_path, level).stat().st_mtime_ns == os.stat(image_path).st_mtime_ns
+        except OSError:
+            return False
+
+    def build(self, image_path: str, levels=None) -> bool:
+        """解码原图一次并写出指定各级缩略图 (从大到小逐级缩放); 写缓存失败时抛出 OSError."""
+        import tempfile
+        import cv2
+        levels = sorted(levels or self.levels, reverse=True)
+        img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if img is None:
+            return False
+        src_stat = os.stat(image_path)
+        for level in levels:
+            h, w = img.shape[:2]
+            scale = level / max(h, w)
+            if scale < 1.0:
+                img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+            out = self.path_for(image_path, level)
+            out.parent.mkdir(parents=True, exist_ok=True)
+            ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                return False
+            fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=out.parent)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(buf.tobytes())
+                os.utime(tmp, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+                os.replace(tmp, out)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+        return True
+
+    def get(self, image_path: str, level: int) -> bytes | None:
+        """读取缓存缩略图, 缺失或失效时即时生成; 生成或读取失败时返回 None."""
+        try:
+            if not self.is_fresh(image_path, level) and not self.build(image_path, [level]):
+                return None
+            return self.path_for(image_path, level).read_bytes()
+        except OSError:
+            return None
+
+    @profiled('thumbnails')
+    def build_all(self, image_paths: list[str], workers=None, chunk_size=64) -> None:
+        """并行预生成全部缩略图 (已是最新的自动跳过)."""
+        from concurrent.futures import ProcessPoolExecutor
+        from tqdm import tqdm
+
+        chunks = [image_paths[i:i + chunk_size] for i in range(0, len(image_paths), chunk_size)]
+        tasks = [(str(self.cache_dir), self.levels, self.quality, c) for c in chunks]
+        generated = 0
+        failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for g, f in tqdm(pool.map(_generate_thumbnails, tasks), total=len(tasks), desc='生成缩略图'):
+                generated += g
+                failed += f
+                count('files', g)
+        log_info(f"缩略图缓存: 新生成 {generated} 张, 失败 {failed} 张, 缓存目录 {self.cache_dir}")
+
+
+_BROWSE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>YOLO Browser</title>
+<style>
+body{font-family:sans-serif;margin:0;background:#f4f4f4}
+#bar{position:sticky;top:0;background:#333;color:#fff;padding:8px;z-index:2}
+#bar button{margin:0 4px}
+#grid{display:flex;flex-wrap:wrap;gap:6px;padding:8px}
+.cell{background:#fff;padding:4px;font-size:11px;width:__SMALL__px}
+.cell canvas{display:block;cursor:pointer}
+#big{display:none;position:fixed;inset:0;background:rgba(0,0,0,.85);z-index:3;align-items:center;justify-content:center}
+</style></head><body>
+<div id="bar"><span id="title"></span>
+<button onclick="go(-1)">&lt; prev</button><span id="pg"></span><button onclick="go(1)">next &gt;</button></div>
+<div id="grid"></div><div id="big" onclick="this.style.display='none'"><canvas id="bigc"></canvas></div>
+<script>
+const COLORS=['red','blue','green','yellow','purple','orange','cyan','magenta','brown','pink','lime','teal'];
+let meta=null,page=0;
+function draw(cv,src,anns){const im=new Image();im.onload=()=>{cv.width=im.width;cv.height=im.height;
+const c=cv.getContext('2d');c.drawImage(im,0,0);c.lineWidth=Math.max(1,im.width/200);c.font='11px sans-serif';
+for(const a of anns){const col=COLORS[a[0]%COLORS.length];c.strokeStyle=col;c.fillStyle=col;
+const x=(a[1]-a[3]/2)*im.width,y=(a[2]-a[4]/2)*im.height;c.strokeRect(x,y,a[3]*im.width,a[4]*im.height);
+c.fillText(meta.class_names[a[0]]??a[0],x,Math.max(10,y-2));}};im.src=src;}
+async function load(){const r=await fetch('/api/page?page='+page);const d=await r.json();
+document.getElementById('pg').textContent=' '+(page+1)+'/'+d.pages+' ';const g=document.getElementById('grid');g.innerHTML='';
+for(const it of d.items){const div=document.createElement('div');div.className='cell';const cv=document.createElement('canvas');
+div.appendChild(cv);div.appendChild(document.createTextNode(it.set_name+'/'+it.name+' ('+it.annotations.length+')'));g.appendChild(div);
+draw(cv,'/thumb/'+it.idx+'/'+meta.levels[0],it.annotations);
+cv.onclick=()=>{document.getElementById('big').style.display='flex';draw(document.getElementById('bigc'),'/thumb/'+it.idx+'/'+meta.levels[meta.levels.length-1],it.annotations);};}}
+function go(d){const p=page+d;if(p>=0&&p<meta.pages){page=p;load();window.scrollTo(0,0);}}
+fetch('/api/meta').then(r=>r.json()).then(m=>{meta=m;document.getElementById('title').textContent=m.dataset+' | '+m.count+' images ';load();});
+</script></body></html>"""
+
+
+def serve_mode(dataset_path, class_names_file=None, filter_classes=None, host='127.0.0.1', port=8765,
+               cache_dir=None, page_size=60, workers=None, prebuild=True):
+    """本地 HTTP 浏览服务 - 复用 YOLODatasetViewer 的扫描与标注读取, 分页浏览磁盘缓存缩略图.
+
+    说明: 标注以 JSON 下发, 由浏览器端在缩略图上绘制; 缩略图按 mtime 失效, 可预先并行生成.
+    """
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+
+    viewer = YOLODatasetViewer(dataset_path, class_names_file, setup_gui=False)
+    if filter_classes and not viewer.filter_by_classes(filter_classes):
+        return
+    items = viewer.image_files
+    cache = ThumbnailCache(cache_dir or default_cache_dir(viewer.dataset_path, 'thumbnails'))
+    if prebuild:
+        cache.build_all([it['image_path'] for it in items], workers=workers)
+
+    num_pages = max(1, (len(items) + page_size - 1) // page_size)
+    meta = {
+        'dataset': viewer.dataset_path.name,
+        'count': len(items),
+        'pages': num_pages,
+        'page_size': page_size,
+        'levels': list(cache.levels),
+        'class_names': {int(k): v for k, v in viewer.class_names.items()},
+    }
+    html = _BROWSE_PAGE.replace('__SMALL__', str(cache.levels[0])).encode('utf-8')
+
+    class BrowseHandler(BaseHTTPRequestHandler):
+        def _send(self, code, body: bytes, content_type: str, cacheable=False):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if cacheable:
+                self.send_header('Cache-Control', 'max-age=3600')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, obj):
+            self._send(200, json.dumps(obj, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split('/') if p]
+            try:
+                if not parts:
+                    self._send(200, html, 'text/html; charset=utf-8')
+                elif parts == ['api', 'meta']:
+                    self._send_json(meta)
+                elif parts == ['api', 'page']:
+                    query = parse_qs(url.query)
+                    page = min(max(0, int(query.get('page', ['0'])[0])), num_pages - 1)
+                    page_items = []
+                    for idx in range(page * page_size, min(len(items), (page + 1) * page_size)):
+                        it = items[idx]
+                        anns = YOLODatasetViewer.load_annotations(it['label_path'])
+                        page_items.append({
+                            'idx': idx,
+                            'name': Path(it['image_path']).name,
+                            'set_name': it['set_name'],
+                            'annotations': [[a['class_id'], a['x_center'], a['y_center'], a['width'], a['height']] for a in anns],
+                        })
+                    self._send_json({'page': page, 'pages': num_pages, 'items': page_items})
+                elif len(parts) == 3 and parts[0] == 'thumb':
+                    idx, level = int(parts[1]), int(parts[2])
+                    if not (0 <= idx < len(items)) or level not in cache.levels:
+                        self._send(404, b'not found', 'text/plain')
+                        return
+                    data = cache.get(items[idx]['image_path'], level)
+                    if data is None:
+                        self._send(500, b'thumbnail failed', 'text/plain')
+                    else:
+                        self._send(200, data, 'image/jpeg', cacheable=True)
+                else:
+                    self._send(404, b'not found', 'text/plain')
+            except (ValueError, IndexError):
+                self._send(400, b'bad request', 'text/plain')
+            except OSError as e:
+                log_warn(f"请求处理失败: {self.path}: {e}")
+                self._send(500, b'internal error', 'text/plain')
+
+        def log_message(self, format, *args):
+            # 访问日志过于频繁, 不写入控制台/日志文件
+            pass
+
+    server = ThreadingHTTPServer((host, port), BrowseHandler)
+    log_info(f"浏览服务已启动: http://{host}:{port}/ ({len(items)} 张图片, {num_pages} 页, Ctrl+C 退出)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log_info("浏览服务已停止")
+    finally:
+        server.server_close()
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="YOLO数据集遍历查看器 - 显示图片标注框和类名",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -617,6 +1054,13 @@ def main():
   # 按类别筛选批量查看
   python yolo_dataset_viewer.py -d /path/to/dataset --batch --filter-classes 0,1,2
   python yolo_dataset_viewer.py -d /path/to/dataset --batch --filter-classes person,car
+
+  # 无界面拼图导出 (服务器 QA, 分页写出 PNG/JPEG)
+  python yolo_dataset_viewer.py -d /path/to/dataset --export qa_sheets --grid 5x4 --tile-size 320
+  python yolo_dataset_viewer.py -d /path/to/dataset --export qa_sheets --filter-classes 0,2 --format png
+
+  # 本地 HTTP 浏览服务 (远程 QA, 通过端口转发在浏览器中分页浏览缩略图)
+  python yolo_dataset_viewer.py -d /path/to/dataset --serve --port 8765
   
   # 支持的数据集结构:
   # 1. dataset/images + dataset/labels
@@ -646,14 +1090,80 @@ def main():
         '--filter-classes',
         help='筛选指定类别的图片，用逗号分隔 (支持类别ID或名称，如: 0,1,2 或 person,car)'
     )
+    parser.add_argument(
+        '--export', metavar='DIR',
+        help='无界面拼图导出模式：将全部(筛选后)图片分页渲染为拼图写入 DIR'
+    )
+    parser.add_argument(
+        '--grid', default='4x4',
+        help='导出模式每页网格 列x行 (默认: 4x4)'
+    )
+    parser.add_argument(
+        '--tile-size', type=int, default=256,
+        help=f'导出模式每个格子的边长像素, 至少 {MIN_TILE_SIZE} (默认: 256)'
+    )
+    parser.add_argument(
+        '--format', choices=['jpg', 'png'], default='jpg',
+        help='导出拼图格式 (默认: jpg)'
+    )
+    parser.add_argument(
+        '--quality', type=int, default=90,
+        help='导出 JPEG 质量 ∈ [1,100] (默认: 90)'
+    )
+    parser.add_argument(
+        '--max-images', type=int,
+        help='导出模式最多导出的图片数 (默认: 全部)'
+    )
+    parser.add_argument(
+        '--workers', type=int,
+        help='导出/缩略图生成并行进程数 (默认: CPU 核数)'
+    )
+    parser.add_argument(
+        '--serve', action='store_true',
+        help='启动本地 HTTP 浏览服务 (缩略图缓存 + 浏览器端绘制标注框)'
+    )
+    parser.add_argument(
+        '--host', default='127.0.0.1',
+        help='浏览服务监听地址 (默认: 127.0.0.1)'
+    )
+    parser.add_argument(
+        '--port', type=int, default=8765,
+        help='浏览服务端口 (默认: 8765)'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='缩略图缓存目录 (默认: 用户缓存目录下 medds/thumbnails/<数据集名>-<路径哈希>, 不写入数据集)'
+    )
+    parser.add_argument(
+        '--page-size', type=int, default=60,
+        help='浏览服务每页图片数 (默认: 60)'
+    )
+    parser.add_argument(
+        '--no-prebuild', action='store_true',
+        help='启动时不预生成缩略图，改为按需生成'
+    )
     
-    args = parser.parse_args()
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     
     # 检查数据集路径
     if not os.path.exists(args.dataset):
         log_error(f"数据集路径不存在: {args.dataset}")
         sys.exit(1)
     
+    # 导出参数在扫描数据集与渲染之前检查
+    if args.export:
+        try:
+            check_export_args(args.grid, args.tile_size, args.quality)
+        except ValueError as e:
+            log_error(str(e))
+            sys.exit(1)
+    if args.serve and args.page_size < 1:
+        log_error(f"错误: --page-size 必须 >= 1, 当前为 {args.page_size}")
+        sys.exit(1)
+
     # 解析筛选类别
     filter_classes = None
     if args.filter_classes:
@@ -661,7 +1171,21 @@ def main():
         log_info(f"将筛选类别: {filter_classes}")
     
     try:
-        if args.batch:
+        if args.serve:
+            # 本地 HTTP 浏览服务
+            serve_mode(
+                args.dataset, args.classes, filter_classes, host=args.host, port=args.port,
+                cache_dir=args.cache_dir, page_size=args.page_size, workers=args.workers,
+                prebuild=not args.no_prebuild,
+            )
+        elif args.export:
+            # 无界面拼图导出模式
+            export_mosaic_mode(
+                args.dataset, args.export, args.classes, filter_classes,
+                grid=args.grid, tile_size=args.tile_size, image_format=args.format,
+                quality=args.quality, max_images=args.max_images, workers=args.workers,
+            )
+        elif args.batch:
             # 批量查看模式
             batch_view_mode(args.dataset, args.classes, args.num_samples, filter_classes)
         else:
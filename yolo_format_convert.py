@@ -1,30 +1,40 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""YOLO 格式重排工具: format1 <-> format2
+"""YOLO 格式重排工具: format1 / format2 / standard / mixed 互转
 
-功能：不修改任何文件内容；支持复制(默认)或移动(--move).
-备注：可通过 --to 指定目标结构(1 或 2)，不指定则自动选择相反结构.
+功能：不修改任何文件内容；支持复制(默认)或移动(--move), 逐文件操作使用线程池并行.
+备注：可通过 --to 指定目标结构(1/2/standard/mixed)，不指定则自动选择相反结构 (format1<->format2, standard<->mixed).
+      已划分 -> 未划分时合并各 split 并写出 split_plan.json; 未划分 -> 已划分时按 --plan 或 --split-name 分配.
+扩展：--move 且同一文件系统时按 split 整目录重命名 (O(split 数)), 重命名前写日志,
+      失败自动回滚, 中断后可用 --rollback 恢复; 跨设备或目录含其他文件时退回逐文件移动.
 """
 from __future__ import annotations
 
 import argparse
+import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from utils.logging_utils import tee_stdout_stderr, log_info, log_warn, log_error
+from utils.profiling import add_profile_args, start_profiling, profiled, span, count, count_file
 from utils.yolo_utils import (
     get_image_extensions,
     list_possible_class_files,
     detect_yolo_structure,
 )
+from utils.split_utils import load_split_plan, save_split_plan
 
-_LOG_FILE = tee_stdout_stderr('logs')
 
 
 SPLITS = ["train", "val", "test"]
 CLASS_TXT_NAMES = {"classes.txt", "obj.names", "names.txt"}
 CLASS_YAML_NAMES = {"data.yaml", "data.yml", "dataset.yaml", "dataset.yml"}
+JOURNAL_NAME = ".format_convert_journal.jsonl"
+MERGE_PLAN_NAME = "split_plan.json"
+SPLIT_STRUCTURES = ("format1", "format2")
+TARGET_CHOICES = {'1': 'format1', '2': 'format2', 'standard': 'standard', 'mixed': 'mixed'}
 
 
 def detect_splits_format1(root: Path) -> list[str]:
@@ -45,33 +55,199 @@ def detect_splits_format2(root: Path) -> list[str]:
     return found
 
 
-def ensure_format2_dirs(out_root: Path, splits: list[str]) -> tuple[Path, Path]:
-    """创建 format2 目录结构，返回 (images_root, labels_root)"""
-    images_root = out_root / 'images'
-    labels_root = out_root / 'labels'
-    for sp in splits:
-        (images_root / sp).mkdir(parents=True, exist_ok=True)
-        (labels_root / sp).mkdir(parents=True, exist_ok=True)
-    return images_root, labels_root
+def layout_dir(root: Path, structure: str, kind: str, split: str | None = None) -> Path:
+    """结构中某 split 的 images 或 labels 目录 (standard/mixed 无 split; mixed 图片与标签同目录)"""
+    if structure == 'format1':
+        return root / split / kind
+    if structure == 'format2':
+        return root / kind / split
+    if structure == 'standard':
+        return root / kind
+    return root
 
 
-def ensure_format1_dirs(out_root: Path, splits: list[str]) -> list[Path]:
-    """创建 format1 目录结构，返回每个 split 的根路径列表"""
-    roots = []
-    for sp in splits:
-        sp_root = out_root / sp
-        (sp_root / 'images').mkdir(parents=True, exist_ok=True)
-        (sp_root / 'labels').mkdir(parents=True, exist_ok=True)
-        roots.append(sp_root)
-    return roots
+def class_file_dirs(root: Path, structure: str, splits: list[str | None]) -> list[Path]:
+    """可能存放 classes.txt / data.yaml 的目录 (根目录优先)"""
+    dirs = [root]
+    if structure in ('format2', 'standard'):
+        dirs.append(root / 'labels')
+    elif structure == 'format1':
+        # 有些数据集把 classes.txt 放在其中一个 split 的 labels 下
+        dirs.extend(root / sp / 'labels' for sp in splits)
+    return [d for d in dirs if d.exists()]
 
 
 def copy_or_move(src: Path, dst: Path, move: bool) -> None:
-    dst.parent.mkdir(parents=True, exist_ok=True)
     if move:
         shutil.move(str(src), str(dst))
     else:
         shutil.copy2(str(src), str(dst))
+    count_file(dst)
+
+
+def transfer_files(jobs: list[tuple[Path, Path]], move: bool, workers: int | None = None) -> None:
+    """并行复制/移动 (源, 目标) 文件 (目标目录需已存在); 复制与跨设备移动为 IO, 线程池可显著提速"""
+    if workers == 1 or len(jobs) < 64:
+        for src, dst in jobs:
+            copy_or_move(src, dst, move)
+        return
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        # list() 使任何异常在此处抛出
+        list(pool.map(lambda job: copy_or_move(job[0], job[1], move), jobs))
+
+
+class RenameJournal:
+    """目录重命名日志: 每次重命名前先把 (src, dst) 落盘, 出错时按逆序回滚, 全部成功后删除日志."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: list[tuple[Path, Path]] = []
+        self._f = None
+
+    def rename(self, src: Path, dst: Path) -> None:
+        if self._f is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._f = open(self.path, 'a', encoding='utf-8')
+        self._f.write(json.dumps({'src': str(src.resolve()), 'dst': str(dst.parent.resolve() / dst.name)},
+                                 ensure_ascii=False) + '\n')
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        os.rename(src, dst)
+        self.done.append((src, dst))
+
+    def _close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if self.path.exists():
+            self.path.unlink()
+
+    def commit(self) -> None:
+        self._close()
+
+    def rollback(self) -> int:
+        for src, dst in reversed(self.done):
+            os.rename(dst, src)
+        n = len(self.done)
+        self.done.clear()
+        self._close()
+        return n
+
+    @staticmethod
+    def replay_rollback(path: Path) -> int:
+        """按日志逆序恢复中断的重命名 (最后一条可能未执行, 按路径是否存在判断), 返回恢复数."""
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        restored = 0
+        for e in reversed(entries):
+            src, dst = Path(e['src']), Path(e['dst'])
+            if dst.exists() and not src.exists():
+                src.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(dst, src)
+                restored += 1
+        path.unlink()
+        return restored
+
+
+def _scan_transfer_dir(src_dir: Path, kind: str) -> tuple[list[str], bool]:
+    """列出 split 目录中需要转移的文件 (images: 图片; labels: 非类别文件的 .txt).
+
+    返回 (排序后的文件名, 是否只含这些文件); 只含这些文件时整目录重命名与逐文件移动结果相同.
+    """
+    img_exts = set(get_image_extensions())
+    names = []
+    clean = True
+    with os.scandir(src_dir) as it:
+        for e in it:
+            if not e.is_file():
+                clean = False
+                continue
+            suffix = os.path.splitext(e.name)[1].lower()
+            if kind == 'images':
+                ok = suffix in img_exts
+            else:
+                ok = suffix == '.txt' and e.name not in CLASS_TXT_NAMES
+            if ok:
+                names.append(e.name)
+            else:
+                clean = False
+    names.sort()
+    return names, clean
+
+
+def _can_rename_dir(src_dir: Path, dst_dir: Path) -> bool:
+    """目标不存在或为空目录, 不在源目录之内, 且与源位于同一设备时可直接重命名."""
+    if dst_dir.exists() and (not dst_dir.is_dir() or any(dst_dir.iterdir())):
+        return False
+    src_abs = src_dir.resolve()
+    if src_abs == dst_dir.resolve() or src_abs in dst_dir.resolve().parents:
+        return False
+    anchor = dst_dir
+    while not anchor.exists():
+        anchor = anchor.parent
+    try:
+        return os.stat(src_dir).st_dev == os.stat(anchor).st_dev
+    except OSError:
+        return False
+
+
+def transfer_split_dir(src_dir: Path, dst_dir: Path, kind: str, move: bool,
+                       journal: RenameJournal | None = None, prefix: str = '', workers: int | None = None,
+                       names: list[str] | None = None, clean: bool = False,
+                       remove_empty_src: bool = True) -> tuple[int, bool]:
+    """转移一个 images 或 labels 目录, 返回 (文件数, 是否走了目录重命名快速路径)
+
+    prefix 非空时目标文件名加前缀 (合并多个 split 时避免重名), 此时只能逐文件转移.
+    names/clean 为预先扫描的结果 (缺省时现场扫描).
+    """
+    if names is None:
+        names, clean = _scan_transfer_dir(src_dir, kind)
+    if move and journal is not None and clean and not prefix and _can_rename_dir(src_dir, dst_dir):
+        if dst_dir.exists():
+            dst_dir.rmdir()
+        dst_dir.parent.mkdir(parents=True, exist_ok=True)
+        journal.rename(src_dir, dst_dir)
+        count('files', len(names))
+        return len(names), True
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    transfer_files([(src_dir / name, dst_dir / (prefix + name)) for name in names], move, workers)
+    if move and remove_empty_src:
+        _remove_empty_dirs([src_dir])
+    return len(names), False
+
+
+@profiled('transfer')
+def transfer_all(steps: list[tuple], move: bool, out_root: Path, workers: int | None = None,
+                 remove_empty_src: bool = True) -> tuple[int, int, int]:
+    """按 (源目录, 目标目录, images|labels, 前缀, 文件名列表, 是否可整目录重命名) 依次转移,
+    返回 (图片数, 标签数, 重命名目录数).
+
+    移动模式下目录重命名记录在 out_root 下的日志中; 任一步失败时回滚已完成的重命名后重新抛出.
+    """
+    journal = RenameJournal(out_root / JOURNAL_NAME) if move else None
+    counts = {'images': 0, 'labels': 0}
+    renamed = 0
+    try:
+        for src_dir, dst_dir, kind, prefix, names, clean in steps:
+            n, fast = transfer_split_dir(src_dir, dst_dir, kind, move, journal, prefix, workers,
+                                         names, clean, remove_empty_src)
+            counts[kind] += n
+            renamed += int(fast)
+    except Exception:
+        if journal is not None and journal.done:
+            log_warn(f"转移失败, 回滚 {journal.rollback()} 个目录重命名 (逐文件移动的部分不回滚)")
+        raise
+    if journal is not None:
+        journal.commit()
+    return counts['images'], counts['labels'], renamed
+
+
+def _remove_empty_dirs(dirs: list[Path]) -> None:
+    for d in dirs:
+        try:
+            d.rmdir()
+        except OSError:
+            pass
 
 
 def _copy_class_and_config_files(src_dirs: list[Path], out_root: Path) -> None:
@@ -84,6 +260,9 @@ def _copy_class_and_config_files(src_dirs: list[Path], out_root: Path) -> None:
         for name in list_possible_class_files(src_base):
             p = src_base / name
             if p.is_file() and name not in seen:
+                if p.resolve() == (out_root / name).resolve():
+                    seen.add(name)
+                    continue
                 try:
                     shutil.copy2(str(p), str(out_root / name))
                     log_info(f"复制类别/配置: {name}")
@@ -97,6 +276,9 @@ def _copy_class_and_config_files(src_dirs: list[Path], out_root: Path) -> None:
             if name in seen:
                 continue
             if p.is_file():
+                if p.resolve() == (out_root / name).resolve():
+                    seen.add(name)
+                    continue
                 try:
                     shutil.copy2(str(p), str(out_root / name))
                     log_info(f"复制类别/配置: {name}")
@@ -105,150 +287,171 @@ def _copy_class_and_config_files(src_dirs: list[Path], out_root: Path) -> None:
                     log_warn(f"复制类别/配置失败: {p} -> {out_root/name}: {e}")
 
 
-def convert_format1_to_format2(in_root: Path, out_root: Path, move: bool = False, overwrite: bool = False) -> None:
-    # 安全检查
-    if not in_root.exists():
-        log_error(f"输入目录不存在: {in_root}")
-        return
-    if in_root.resolve() == out_root.resolve():
-        log_error("不支持在同一目录就地重排，请指定不同的 --output_dir；如确需原地移动，请先指定新的输出后再手动替换。")
-        return
-    if out_root.exists() and any(out_root.iterdir()) and not overwrite:
-        log_error(f"输出目录已存在且非空: {out_root}，若要覆盖，请添加 --overwrite")
-        return
-    out_root.mkdir(parents=True, exist_ok=True)
+def detect_source_splits(in_root: Path, structure: str) -> list[str | None]:
+    if structure == 'format1':
+        return detect_splits_format1(in_root)
+    if structure == 'format2':
+        return detect_splits_format2(in_root)
+    return [None]
 
-    splits = detect_splits_format1(in_root)
-    if not splits:
-        log_error("未检测到格式一结构 (train/val/test 下含 images 与 labels)。")
-        return
-    log_info(f"检测到分割集合: {', '.join(splits)}")
 
-    # 创建目标结构
-    images_root, labels_root = ensure_format2_dirs(out_root, splits)
+def convert_structure(in_root: Path, out_root: Path, structure: str, target: str, move: bool = False,
+                      overwrite: bool = False, plan: str | None = None, split_name: str = 'train',
+                      prefix_split: bool = False, workers: int | None = None) -> None:
+    """
+    在 format1 / format2 / standard / mixed 之间重排
 
-    img_exts = set(get_image_extensions())
-    copied_imgs = 0
-    copied_lbls = 0
-
-    for sp in splits:
-        src_img_dir = in_root / sp / 'images'
-        src_lbl_dir = in_root / sp / 'labels'
-        dst_img_dir = images_root / sp
-        dst_lbl_dir = labels_root / sp
-
-        # 图片
-        for name in sorted(os.listdir(src_img_dir)):
-            p = src_img_dir / name
-            if p.is_file() and p.suffix.lower() in img_exts:
-                copy_or_move(p, dst_img_dir / name, move)
-                copied_imgs += 1
-
-        # 标签（排除类别/配置文件）
-        for name in sorted(os.listdir(src_lbl_dir)):
-            p = src_lbl_dir / name
-            if not p.is_file():
-                continue
-            if p.suffix.lower() != '.txt':
-                continue
-            if name in CLASS_TXT_NAMES:
-                continue
-            copy_or_move(p, dst_lbl_dir / name, move)
-            copied_lbls += 1
-
-    # 复制类别/配置文件到输出根目录（若存在）
-    src_dirs = [in_root]
-    # 也尝试各 split/labels 目录（有些数据集把 classes.txt 放在其中一个 split 下）
-    for sp in splits:
-        p = in_root / sp / 'labels'
-        if p.exists():
-            src_dirs.append(p)
-    _copy_class_and_config_files(src_dirs, out_root)
-
-    log_info("===== 重排完成 =====")
-    log_info(f"图片: {copied_imgs} | 标签: {copied_lbls}")
-    log_info(f"输出: {out_root}")
-
-
-def convert_format2_to_format1(in_root: Path, out_root: Path, move: bool = False, overwrite: bool = False) -> None:
+    - 已划分 -> 已划分: 各 split 一一对应, 满足条件时整目录重命名
+    - 已划分 -> 未划分: 合并全部 split; 跨 split 重名时报错 (或 --prefix-split 加 "<split>_" 前缀),
+      并在输出根目录写出 split_plan.json, 可用 yolo_dataset_split.py --plan 还原划分
+    - 未划分 -> 已划分: 按划分方案 (stem -> split) 分配, 无方案时全部放入 split_name
+    - standard <-> mixed: 逐文件转移
+    """
     # 安全检查
     if not in_root.exists():
         log_error(f"输入目录不存在: {in_root}")
         return
-    if in_root.resolve() == out_root.resolve():
-        log_error("不支持在同一目录就地重排，请指定不同的 --output_dir；如确需原地移动，请先指定新的输出后再手动替换。")
+    in_place = in_root.resolve() == out_root.resolve()
+    if in_place and not move:
+        log_error("复制模式不支持在同一目录就地重排，请指定不同的 --output_dir，或使用 --move 原地重排。")
         return
-    if out_root.exists() and any(out_root.iterdir()) and not overwrite:
+    if not in_place and out_root.exists() and any(out_root.iterdir()) and not overwrite:
         log_error(f"输出目录已存在且非空: {out_root}，若要覆盖，请添加 --overwrite")
         return
-    out_root.mkdir(parents=True, exist_ok=True)
 
-    splits = detect_splits_format2(in_root)
-    if not splits:
-        log_error("未检测到格式二结构 (images/labels 下含 train/val/test)。")
+    src_splits = detect_source_splits(in_root, structure)
+    if not src_splits:
+        log_error(f"未检测到{structure}结构下的分割集合 (train/val/test 且同时含 images 与 labels)。")
         return
-    log_info(f"检测到分割集合: {', '.join(splits)}")
-
-    # 创建目标结构
-    ensure_format1_dirs(out_root, splits)
+    if structure in SPLIT_STRUCTURES:
+        log_info(f"检测到分割集合: {', '.join(src_splits)}")
+
+    split_of = None
+    if structure not in SPLIT_STRUCTURES and target in SPLIT_STRUCTURES:
+        if plan:
+            try:
+                _plan, split_of = load_split_plan(plan)
+            except (OSError, ValueError) as e:
+                log_error(f"无法读取划分方案 {plan}: {e}")
+                return
+            log_info(f"按划分方案分配: {plan} ({len(split_of)} 个 stem)")
+        else:
+            log_info(f"未提供划分方案, 全部放入 {split_name} 集合")
+
+    # 预扫描: 合并时检查重名, 按方案分配时分组
+    scans = {}
+    with span('scan'):
+        for sp in src_splits:
+            for kind in ('images', 'labels'):
+                scans[(sp, kind)] = _scan_transfer_dir(layout_dir(in_root, structure, kind, sp), kind)
+    merging = structure in SPLIT_STRUCTURES and target not in SPLIT_STRUCTURES
+    if merging and len(src_splits) > 1 and not prefix_split:
+        for kind in ('images', 'labels'):
+            seen, dup = set(), 0
+            for sp in src_splits:
+                for name in scans[(sp, kind)][0]:
+                    dup += name in seen
+                    seen.add(name)
+            if dup:
+                log_error(f"合并各 split 时有 {dup} 个{'图片' if kind == 'images' else '标签'}文件重名，"
+                          f"请添加 --prefix-split 以 '<split>_' 前缀区分")
+                return
 
-    img_exts = set(get_image_extensions())
-    copied_imgs = 0
-    copied_lbls = 0
-
-    for sp in splits:
-        src_img_dir = in_root / 'images' / sp
-        src_lbl_dir = in_root / 'labels' / sp
-        dst_img_dir = out_root / sp / 'images'
-        dst_lbl_dir = out_root / sp / 'labels'
-
-        # 图片
-        for name in sorted(os.listdir(src_img_dir)):
-            p = src_img_dir / name
-            if p.is_file() and p.suffix.lower() in img_exts:
-                copy_or_move(p, dst_img_dir / name, move)
-                copied_imgs += 1
-
-        # 标签（排除类别/配置文件）
-        for name in sorted(os.listdir(src_lbl_dir)):
-            p = src_lbl_dir / name
-            if not p.is_file():
-                continue
-            if p.suffix.lower() != '.txt':
-                continue
-            if name in CLASS_TXT_NAMES:
+    out_root.mkdir(parents=True, exist_ok=True)
+    # 复制类别/配置文件到输出根目录（若存在）; 先于转移执行, 避免 labels 目录被整体重命名后找不到
+    _copy_class_and_config_files(class_file_dirs(in_root, structure, src_splits), out_root)
+
+    steps = []
+    unplanned = 0
+    for sp in src_splits:
+        for kind in ('images', 'labels'):
+            src_dir = layout_dir(in_root, structure, kind, sp)
+            names, clean = scans[(sp, kind)]
+            if split_of is not None:
+                # 未划分 -> 已划分 (按方案): 按目标 split 分组后逐文件转移
+                groups: dict[str, list[str]] = {}
+                for name in names:
+                    dst_sp = split_of.get(os.path.splitext(name)[0])
+                    if dst_sp is None:
+                        unplanned += kind == 'images'
+                        continue
+                    groups.setdefault(dst_sp, []).append(name)
+                for dst_sp, group in groups.items():
+                    steps.append((src_dir, layout_dir(out_root, target, kind, dst_sp), kind, '', group, False))
                 continue
-            copy_or_move(p, dst_lbl_dir / name, move)
-            copied_lbls += 1
-
-    # 复制类别/配置文件到输出根目录（若存在）
-    src_dirs = [in_root, in_root / 'labels']
-    _copy_class_and_config_files(src_dirs, out_root)
+            if target not in SPLIT_STRUCTURES:
+                dst_sp = None
+            else:
+                dst_sp = sp if structure in SPLIT_STRUCTURES else split_name
+            prefix = f"{sp}_" if merging and prefix_split else ''
+            steps.append((src_dir, layout_dir(out_root, target, kind, dst_sp), kind, prefix, names, clean))
+    if unplanned:
+        log_warn(f"{unplanned} 张图片不在划分方案中, 保留在原位置")
+
+    try:
+        # mixed 的源目录即数据集根目录, 移动后不删除
+        copied_imgs, copied_lbls, renamed = transfer_all(steps, move, out_root, workers,
+                                                         remove_empty_src=structure != 'mixed')
+    except OSError as e:
+        log_error(f"重排失败: {e}")
+        return
+    if move:
+        if structure == 'format1':
+            _remove_empty_dirs([in_root / sp for sp in src_splits])
+        elif structure == 'format2':
+            _remove_empty_dirs([in_root / 'images', in_root / 'labels'])
+
+    if merging:
+        img_exts = set(get_image_extensions())
+        members = {sp: [os.path.splitext((f"{sp}_" if prefix_split else '') + name)[0]
+                        for name in scans[(sp, 'images')][0] if os.path.splitext(name)[1].lower() in img_exts]
+                   for sp in src_splits}
+        save_split_plan(str(out_root / MERGE_PLAN_NAME), members,
+                        meta={'tool': 'yolo_format_convert', 'mode': 'merge', 'source': structure})
+        log_info(f"已记录原划分 -> {out_root / MERGE_PLAN_NAME} (可用 yolo_dataset_split.py --plan 还原)")
 
     log_info("===== 重排完成 =====")
-    log_info(f"图片: {copied_imgs} | 标签: {copied_lbls}")
+    log_info(f"{structure} -> {target}")
+    log_info(f"图片: {copied_imgs} | 标签: {copied_lbls}" + (f" | 整目录重命名: {renamed}/{len(steps)}" if move else ""))
     log_info(f"输出: {out_root}")
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     p = argparse.ArgumentParser(
-        description="YOLO 格式重排: format1 -> format2 (复制或移动)",
+        description="YOLO 格式重排: format1 / format2 / standard / mixed 互转 (复制或移动)",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
-    p.add_argument('-d', '--dataset_dir', required=True, help='输入数据集根目录 (格式一或格式二)')
+    p.add_argument('-d', '--dataset_dir', required=True, help='输入数据集根目录 (format1/format2/standard/mixed)')
     p.add_argument('-o', '--output_dir', required=True, help='输出数据集根目录 (目标结构)')
-    p.add_argument('--to', choices=['1', '2', 'auto'], default='auto', help='目标结构: 1=format1, 2=format2, auto=与输入相反')
+    p.add_argument('--to', choices=['1', '2', 'standard', 'mixed', 'auto'], default='auto',
+                   help='目标结构: 1=format1, 2=format2, standard, mixed, auto=与输入相反 (format1<->format2, standard<->mixed)')
     p.add_argument('--move', action='store_true', help='移动文件而非复制 (默认复制)')
     p.add_argument('--overwrite', action='store_true', help='允许写入已存在的非空输出目录')
-    return p.parse_args()
-
-
-def main():
-    args = parse_args()
+    p.add_argument('--plan', default=None, help='未划分 -> format1/format2 时按划分方案 (yolo_dataset_split --save-plan) 分配')
+    p.add_argument('--split-name', default='train', help='未划分 -> format1/format2 且无 --plan 时全部放入的集合名')
+    p.add_argument('--prefix-split', action='store_true', help='合并各 split 为 standard/mixed 时给文件名加 "<split>_" 前缀避免重名')
+    p.add_argument('--workers', type=int, default=None, help='逐文件复制/移动的线程数 (默认 CPU 核数x4, 最多 32; 1=串行)')
+    p.add_argument('--rollback', action='store_true', help='按输出目录中的重命名日志恢复被中断的 --move 重排 (忽略其他参数)')
+    add_profile_args(p)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tee_stdout_stderr('logs')
+    start_profiling(args)
     in_root = Path(args.dataset_dir)
     out_root = Path(args.output_dir)
 
-    log_info("YOLO 格式重排 (format1 <-> format2)")
+    if args.rollback:
+        journal_path = out_root / JOURNAL_NAME
+        if not journal_path.exists():
+            log_error(f"未找到重命名日志: {journal_path}")
+            return
+        log_info(f"按日志回滚: 恢复 {RenameJournal.replay_rollback(journal_path)} 个目录")
+        return
+
+    log_info("YOLO 格式重排 (format1 / format2 / standard / mixed)")
     log_info(f"输入:  {in_root}")
     log_info(f"输出:  {out_root}")
     log_info(f"模式:  {'移动' if args.move else '复制'}")
@@ -257,26 +460,24 @@ def main():
 
     # 检测输入结构
     structure, _img, _lbl = detect_yolo_structure(in_root)
-    if structure not in ('format1', 'format2'):
-        log_error(f"仅支持 format1/format2 互转，检测到结构: {structure}")
+    if structure == 'unknown':
+        log_error("无法识别输入结构 (需为 format1/format2/standard/mixed)")
         return
 
     # 解析目标结构
-    to = args.to
-    if to == 'auto':
-        target = 'format2' if structure == 'format1' else 'format1'
+    if args.to == 'auto':
+        target = {'format1': 'format2', 'format2': 'format1', 'standard': 'mixed', 'mixed': 'standard'}[structure]
     else:
-        target = 'format1' if to == '1' else 'format2'
+        target = TARGET_CHOICES[args.to]
 
     if structure == target:
         log_error(f"输入已是目标结构: {target}，无需转换")
-        log_info("若需复制到新目录，请指定与输入相反的 --to 或使用文件系统复制")
+        log_info("若需复制到新目录，请指定与输入不同的 --to 或使用文件系统复制")
         return
 
-    if structure == 'format1' and target == 'format2':
-        convert_format1_to_format2(in_root, out_root, move=args.move, overwrite=args.overwrite)
-    elif structure == 'format2' and target == 'format1':
-        convert_format2_to_format1(in_root, out_root, move=args.move, overwrite=args.overwrite)
+    convert_structure(in_root, out_root, structure, target, move=args.move, overwrite=args.overwrite,
+                      plan=args.plan, split_name=args.split_name, prefix_split=args.prefix_split,
+                      workers=args.workers)
 
 
 if __name__ == '__main__':